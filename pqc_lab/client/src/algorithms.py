@@ -0,0 +1,234 @@
+from types import MappingProxyType
+
+# Single registry of key exchange (KEM) and signature parameter sets, and of
+# the suites (KEM + signature + certificate chain) the physics engine simulates.
+# pqc_engine, lab_controller, the capture tools and the dashboard all derive
+# sizes, relative CPU costs, OpenSSL group names and labels from here, so a
+# new parameter set is one register_* call.
+
+CERT_OVERHEAD = 800 # Metadata overhead per certificate (bytes)
+
+class KEM:
+    """
+    Key exchange parameter set. `pk` travels in the ClientHello key share and
+    `ct` in the ServerHello; keygen/encaps are relative CPU costs in units of
+    pqc_engine.compute_workload. `group` is the OpenSSL -groups name and
+    `algorithm` the name used in result rows (legacy names for the lab groups).
+    """
+    __slots__ = ("name", "group", "algorithm", "label", "pk", "ct", "keygen", "encaps",
+                 "codepoint", "aliases", "family", "level", "components")
+
+    def __init__(self, name, group, pk, ct, keygen, encaps, algorithm=None, label=None,
+                 codepoint=None, aliases=(), family="", level=None, components=()):
+        self.name = name
+        self.group = group
+        self.algorithm = algorithm or group
+        self.label = label or name
+        self.pk = pk
+        self.ct = ct
+        self.keygen = keygen
+        self.encaps = encaps
+        self.codepoint = codepoint
+        self.aliases = tuple(aliases)
+        self.family = family
+        self.level = level
+        self.components = tuple(components)
+
+    def __repr__(self):
+        return f"KEM({self.name!r})"
+
+class Signature:
+    """
+    Signature parameter set: public key and signature sizes, relative verify cost.
+    """
+    __slots__ = ("name", "pk", "sig", "verify", "aliases", "family", "level")
+
+    def __init__(self, name, pk, sig, verify, aliases=(), family="", level=None):
+        self.name = name
+        self.pk = pk
+        self.sig = sig
+        self.verify = verify
+        self.aliases = tuple(aliases)
+        self.family = family
+        self.level = level
+
+    def __repr__(self):
+        return f"Signature({self.name!r})"
+
+class Suite:
+    """
+    What the physics engine simulates: a KEM, the server signature and its
+    certificate chain (`chain_certs` certificates, or a fixed `chain_size`).
+    """
+    __slots__ = ("name", "kem", "signature", "chain_certs", "chain_size", "label")
+
+    def __init__(self, name, kem, signature, chain_certs=3, chain_size=None, label=None):
+        self.name = name
+        self.kem = kem
+        self.signature = signature
+        self.chain_certs = chain_certs
+        self.chain_size = chain_size
+        self.label = label or name
+
+    @property
+    def cert_chain_size(self):
+        if self.chain_size is not None:
+            return self.chain_size
+        return self.chain_certs * (self.signature.pk + self.signature.sig + CERT_OVERHEAD)
+
+    @property
+    def complexity(self):
+        return {"keygen": self.kem.keygen, "encaps": self.kem.encaps, "verify": self.signature.verify}
+
+    def __repr__(self):
+        return f"Suite({self.name!r})"
+
+_KEMS = {}
+_SIGNATURES = {}
+_SUITES = {}
+_KEM_INDEX = {}        # Lower-cased name / group / algorithm / alias -> KEM
+_SIGNATURE_INDEX = {}
+_SUITE_BY_KEM = {}     # KEM name -> first suite registered with it
+_KEM_BY_CODEPOINT = {}
+
+# Read-only views for callers
+KEMS = MappingProxyType(_KEMS)
+SIGNATURES = MappingProxyType(_SIGNATURES)
+SUITES = MappingProxyType(_SUITES)
+
+def register_kem(name, group, pk, ct, keygen, encaps, **kwargs):
+    kem = KEM(name, group, pk, ct, keygen, encaps, **kwargs)
+    _KEMS[name] = kem
+    for key in (name, group, kem.algorithm, *kem.aliases):
+        _KEM_INDEX[key.lower()] = kem
+    if kem.codepoint is not None:
+        _KEM_BY_CODEPOINT[kem.codepoint] = kem
+    return kem
+
+def register_hybrid(name, group, components, **kwargs):
+    """
+    Hybrid key exchange: shares are concatenated and both halves computed.
+    """
+    parts = [get_kem(component) for component in components]
+    return register_kem(
+        name, group,
+        pk=sum(part.pk for part in parts), ct=sum(part.ct for part in parts),
+        keygen=sum(part.keygen for part in parts), encaps=sum(part.encaps for part in parts),
+        components=tuple(part.name for part in parts), **kwargs
+    )
+
+def register_signature(name, pk, sig, verify, **kwargs):
+    signature = Signature(name, pk, sig, verify, **kwargs)
+    _SIGNATURES[name] = signature
+    for key in (name, *signature.aliases):
+        _SIGNATURE_INDEX[key.lower()] = signature
+    return signature
+
+def register_suite(name, kem, signature, **kwargs):
+    suite = Suite(name, get_kem(kem), get_signature(signature), **kwargs)
+    _SUITES[name] = suite
+    _SUITE_BY_KEM.setdefault(suite.kem.name, suite)
+    return suite
+
+def get_kem(name):
+    """
+    KEM by name, OpenSSL group, result-row algorithm or alias (case-insensitive).
+    Raises KeyError if unknown; see find_kem for a lenient lookup.
+    """
+    return _KEM_INDEX[name.lower()]
+
+def find_kem(name):
+    return _KEM_INDEX.get(name.lower()) if name else None
+
+def get_signature(name):
+    return _SIGNATURE_INDEX[name.lower()]
+
+def get_suite(name):
+    return _SUITES[name]
+
+def suite_for_algorithm(name):
+    """
+    Default suite simulated for a group/algorithm name (None if no suite uses it).
+    """
+    kem = find_kem(name)
+    return _SUITE_BY_KEM.get(kem.name) if kem else None
+
+def kem_for_codepoint(codepoint):
+    return _KEM_BY_CODEPOINT.get(codepoint)
+
+def group_mapping():
+    """
+    {result-row algorithm name: OpenSSL group name} for every registered KEM.
+    """
+    return {kem.algorithm: kem.group for kem in _KEMS.values()}
+
+def complexity_table():
+    return {name: suite.complexity for name, suite in _SUITES.items()}
+
+# --- KEY EXCHANGE ---
+# Classical ECDH
+register_kem("X25519", "X25519", pk=32, ct=32, keygen=0.5, encaps=0.5,
+             label="Clásico (ECDH)", codepoint=0x001D, family="ECDH")
+register_kem("X448", "X448", pk=56, ct=56, keygen=1.0, encaps=1.0,
+             label="Clásico (ECDH X448)", codepoint=0x001E, family="ECDH")
+register_kem("secp256r1", "secp256r1", pk=65, ct=65, keygen=0.8, encaps=0.8,
+             label="Clásico (ECDH P-256)", codepoint=0x0017, aliases=("P-256", "prime256v1"), family="ECDH")
+register_kem("secp384r1", "secp384r1", pk=97, ct=97, keygen=1.5, encaps=1.5,
+             label="Clásico (ECDH P-384)", codepoint=0x0018, aliases=("P-384",), family="ECDH")
+register_kem("secp521r1", "secp521r1", pk=133, ct=133, keygen=3.0, encaps=3.0,
+             label="Clásico (ECDH P-521)", codepoint=0x0019, aliases=("P-521",), family="ECDH")
+
+# ML-KEM (FIPS 203). "kyber768" is the lab's legacy name for ML-KEM-768.
+register_kem("ML-KEM-512", "mlkem512", pk=800, ct=768, keygen=1.4, encaps=1.4,
+             label="PQC Puro (ML-KEM-512)", codepoint=0x0200, aliases=("kyber512",), family="ML-KEM", level=1)
+register_kem("ML-KEM-768", "mlkem768", pk=1184, ct=1088, keygen=2.0, encaps=2.0, algorithm="kyber768",
+             label="PQC Puro (ML-KEM-768)", codepoint=0x0201, family="ML-KEM", level=3)
+register_kem("ML-KEM-1024", "mlkem1024", pk=1568, ct=1568, keygen=2.8, encaps=2.8,
+             label="PQC Puro (ML-KEM-1024)", codepoint=0x0202, aliases=("kyber1024",), family="ML-KEM", level=5)
+
+# Other post-quantum KEMs (OQS group names, as listed by the scanner)
+register_kem("FrodoKEM-640-AES", "frodo640aes", pk=9616, ct=9720, keygen=12.0, encaps=12.0,
+             label="PQC Puro (FrodoKEM-640)", family="FrodoKEM", level=1)
+register_kem("BIKE-L1", "bikel1", pk=1541, ct=1573, keygen=10.0, encaps=1.5,
+             label="PQC Puro (BIKE-L1)", family="BIKE", level=1)
+
+# Hybrids. "x25519_kyber768" is the lab's legacy name for X25519MLKEM768.
+register_hybrid("X25519MLKEM768", "X25519MLKEM768", ("X25519", "ML-KEM-768"), algorithm="x25519_kyber768",
+                label="Híbrido (X25519+Kyber768)", codepoint=0x11EC, family="Hybrid", level=3)
+register_hybrid("SecP256r1MLKEM768", "SecP256r1MLKEM768", ("secp256r1", "ML-KEM-768"),
+                label="Híbrido (P-256+ML-KEM-768)", codepoint=0x11EB,
+                aliases=("p256_kyber768", "p256_mlkem768"), family="Hybrid", level=3)
+register_hybrid("SecP384r1MLKEM1024", "SecP384r1MLKEM1024", ("secp384r1", "ML-KEM-1024"),
+                label="Híbrido (P-384+ML-KEM-1024)", codepoint=0x11ED,
+                aliases=("p384_mlkem1024",), family="Hybrid", level=5)
+register_hybrid("P384-Kyber768", "p384_kyber768", ("secp384r1", "ML-KEM-768"),
+                label="Híbrido (P-384+Kyber768)", family="Hybrid", level=3)
+
+# --- SIGNATURES ---
+register_signature("Ed25519", pk=32, sig=64, verify=1.0, family="EdDSA")
+register_signature("ECDSA-P256", pk=65, sig=72, verify=1.5, aliases=("ecdsa_secp256r1_sha256",), family="ECDSA")
+register_signature("ECDSA-P384", pk=97, sig=104, verify=2.5, aliases=("ecdsa_secp384r1_sha384",), family="ECDSA")
+# ML-DSA (FIPS 204). ML-DSA-65 keeps the round-3 Dilithium3 signature size the lab has always used.
+register_signature("ML-DSA-44", pk=1312, sig=2420, verify=3.5, aliases=("dilithium2", "mldsa44"), family="ML-DSA", level=2)
+register_signature("ML-DSA-65", pk=1952, sig=3293, verify=5.0, aliases=("dilithium3", "mldsa65"), family="ML-DSA", level=3)
+register_signature("ML-DSA-87", pk=2592, sig=4627, verify=7.0, aliases=("dilithium5", "mldsa87"), family="ML-DSA", level=5)
+# SLH-DSA (FIPS 205): tiny keys, very large signatures
+register_signature("SLH-DSA-SHA2-128s", pk=32, sig=7856, verify=8.0, aliases=("sphincssha2128ssimple",), family="SLH-DSA", level=1)
+register_signature("SLH-DSA-SHA2-128f", pk=32, sig=17088, verify=20.0, aliases=("sphincssha2128fsimple",), family="SLH-DSA", level=1)
+
+# --- SUITES ---
+# The three lab scenarios (pqc_engine.CryptoSuite). Classical chains use a fixed web-PKI size.
+register_suite("CLASSIC", "X25519", "Ed25519", chain_size=2500, label="Clásico (ECDH)")
+register_suite("HYBRID", "X25519MLKEM768", "Ed25519", chain_size=2500, label="Híbrido (X25519+Kyber768)")
+register_suite("PURE", "ML-KEM-768", "ML-DSA-65", chain_certs=3, label="PQC Puro")
+
+register_suite("CLASSIC_P256", "secp256r1", "ECDSA-P256", chain_size=2500, label="Clásico (P-256)")
+register_suite("HYBRID_P256", "SecP256r1MLKEM768", "ECDSA-P256", chain_size=2500, label="Híbrido (P-256+ML-KEM-768)")
+register_suite("HYBRID_P384", "SecP384r1MLKEM1024", "ECDSA-P384", chain_size=2500, label="Híbrido (P-384+ML-KEM-1024)")
+register_suite("HYBRID_P384_KYBER768", "P384-Kyber768", "ECDSA-P384", chain_size=2500, label="Híbrido (P-384+Kyber768)")
+register_suite("PURE_L1", "ML-KEM-512", "ML-DSA-44", label="PQC Puro (Nivel 1)")
+register_suite("PURE_L5", "ML-KEM-1024", "ML-DSA-87", label="PQC Puro (Nivel 5)")
+register_suite("PURE_SLH_128S", "ML-KEM-768", "SLH-DSA-SHA2-128s", label="PQC Puro (SLH-DSA-128s)")
+register_suite("PURE_SLH_128F", "ML-KEM-768", "SLH-DSA-SHA2-128f", label="PQC Puro (SLH-DSA-128f)")
+register_suite("FRODO", "FrodoKEM-640-AES", "ML-DSA-65", label="PQC Puro (FrodoKEM-640)")
+register_suite("BIKE", "BIKE-L1", "ML-DSA-65", label="PQC Puro (BIKE-L1)")
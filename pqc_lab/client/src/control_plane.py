@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+
+# Canal de control dashboard -> controlador. La configuración (modo, pausa) se
+# publica de forma atómica en lab_config.json (tmp + os.replace: nunca se lee a
+# medias) y a continuación se avisa al controlador con un datagrama a un socket
+# Unix local (UDP en 127.0.0.1 donde no hay AF_UNIX, p.ej. Windows). El
+# controlador bloquea en el socket sin consumir CPU y aplica el cambio en
+# milisegundos. Cada segundo sin avisos comprueba además el mtime del fichero
+# (ediciones a mano, un dashboard antiguo, un aviso perdido); si no puede abrir
+# el socket, solo vigila el mtime.
+
+CONFIG_FILE = "lab_config.json"
+CONTROL_SOCKET = os.environ.get("PQC_CONTROL_SOCKET", "captures/control.sock")
+CONTROL_PORT = int(os.environ.get("PQC_CONTROL_PORT", "47801"))
+FILE_WATCH_INTERVAL = 0.25 # s, solo en el modo de respaldo
+FILE_CHECK_INTERVAL = 1.0  # s sin avisos tras los que el socket mira el mtime
+NOTIFY_MESSAGE = b"reload"
+
+def control_address():
+    """
+    ("unix", ruta) si la plataforma tiene sockets Unix de datagramas, ("udp", (host, puerto)) si no.
+    """
+    if hasattr(socket, "AF_UNIX") and os.name != "nt" and "PQC_CONTROL_PORT" not in os.environ:
+        return ("unix", CONTROL_SOCKET)
+    return ("udp", ("127.0.0.1", CONTROL_PORT))
+
+def read_config(path=CONFIG_FILE):
+    """
+    Configuración publicada ({} si no existe). Como se publica con os.replace,
+    un fichero ilegible es un error real, no una escritura en curso.
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        return None
+
+def publish_config(config, path=CONFIG_FILE, address=None):
+    """
+    Escribe la configuración de forma atómica y avisa al controlador. Devuelve
+    True si el aviso se entregó (False: no hay controlador escuchando; la leerá al arrancar).
+    """
+    config = dict(config, updated_at=time.time())
+    directory = os.path.dirname(path) or "."
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp-{os.getpid()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return notify(address)
+
+def config_mtime(path=CONFIG_FILE):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def notify(address=None):
+    kind, target = address or control_address()
+    family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.sendto(NOTIFY_MESSAGE, target)
+        return True
+    except OSError:
+        return False
+
+class ControlChannel:
+    """
+    Lado del controlador: un hilo bloqueado en el socket (o vigilando el
+    fichero) relee la configuración al recibir un aviso o al cambiar el mtime
+    del fichero y despierta a quien espere en `wait`. `version` crece con cada
+    cambio efectivo.
+    """
+    def __init__(self, path=CONFIG_FILE, address=None):
+        self.path = path
+        self.address = address or control_address()
+        self.mtime = config_mtime(path) # Antes de leer: una escritura intermedia se verá como cambio
+        self.config = read_config(path) or {}
+        self.version = 0
+        self.transport = None
+        self.condition = threading.Condition()
+        self.closed = threading.Event()
+        self.sock = None
+
+    def start(self):
+        try:
+            self.sock = self._bind()
+            self.transport = self.address[0].upper()
+            target = self._listen
+        except OSError:
+            self.transport = "FILE"
+            target = self._watch_file
+        threading.Thread(target=target, name="control-plane", daemon=True).start()
+        return self
+
+    def _bind(self):
+        kind, target = self.address
+        if kind == "unix":
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            try:
+                os.unlink(target) # Socket huérfano de una ejecución anterior
+            except FileNotFoundError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(target)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _listen(self):
+        self.sock.settimeout(FILE_CHECK_INTERVAL)
+        while not self.closed.is_set():
+            try:
+                self.sock.recv(64)
+            except socket.timeout:
+                self._check_file() # Cambios escritos sin aviso
+                continue
+            except OSError:
+                return # Socket cerrado en close()
+            self.mtime = config_mtime(self.path)
+            self.reload()
+
+    def _watch_file(self):
+        while not self.closed.is_set():
+            self._check_file()
+            self.closed.wait(FILE_WATCH_INTERVAL)
+
+    def _check_file(self):
+        mtime = config_mtime(self.path)
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.reload()
+
+    def reload(self):
+        config = read_config(self.path)
+        if config is None:
+            return
+        with self.condition:
+            if config != self.config:
+                self.config = config
+                self.version += 1
+                self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return self.version, dict(self.config)
+
+    def wait(self, since, timeout=None):
+        """
+        Espera a una configuración más nueva que la versión `since` (o a
+        `timeout` s). Devuelve (version, config).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != since or self.closed.is_set(), timeout)
+            return self.version, dict(self.config)
+
+    def close(self):
+        self.closed.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.sock is not None:
+            self.sock.close()
+            if self.address[0] == "unix":
+                try:
+                    os.unlink(self.address[1])
+                except OSError:
+                    pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publicar la configuración del laboratorio y avisar al controlador")
+    parser.add_argument("--mode", choices=["PHYSICS", "REAL"])
+    state = parser.add_mutually_exclusive_group()
+    state.add_argument("--start", action="store_true")
+    state.add_argument("--stop", action="store_true")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    args = parser.parse_args(argv)
+
+    config = read_config(args.config) or {}
+    config.pop("updated_at", None)
+    if args.mode:
+        config["mode"] = args.mode
+    if args.start or args.stop:
+        config["paused"] = args.stop
+    delivered = publish_config(config, args.config)
+    print(f"[OK] {json.dumps(config)} ({'controlador avisado' if delivered else 'sin controlador escuchando'})")
+
+if __name__ == "__main__":
+    main()
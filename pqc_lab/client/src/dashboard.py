@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
-import json
+import numpy as np
 import os
+import sys
 import time
 import random
+import threading
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit.components.v1 as components
+import pqc_engine
+import algorithms
+from pqc_engine import CryptoSuite
+from results_store import ResultsStore, IncrementalReader
+from latency_stats import StatsTable, FrameBuffer
+import load_generator
+import control_plane
+import profiling
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -16,6 +26,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- PERFILADO OPCIONAL (PQC_PROFILE o `streamlit run dashboard.py -- --profile`) ---
+@st.cache_resource
+def get_profiler():
+    # Uno por proceso, compartido por las sesiones: cada rerun es una captura en
+    # captures/profiles/dashboard-* (si coincide con la de otra sesión, se salta)
+    return profiling.Profiler.from_env("dashboard", "--profile" in sys.argv[1:])
+
+profiler = get_profiler()
+if profiler is not None:
+    profiler.start("rerun")
+
 # --- ESTILOS CSS (MODO OSCURO PROFESIONAL) ---
 st.markdown("""
 <style>
@@ -60,23 +81,122 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- CONSTANTES ---
-DATA_FILE = "captures/real_scan_results.json"
-CONFIG_FILE = "lab_config.json"
+DATA_DIR = "captures/results" # Almacén append-only del controlador (segmentos NDJSON)
+DEBUG_DUMP_FILE = "captures/debug_data_dump.json"
+CONFIG_FILE = control_plane.CONFIG_FILE # Se publica con control_plane.publish_config
+
+# Escenarios de la Anatomía de Red respaldados por una suite del registro de algoritmos
+SCENARIO_SUITES = {
+    algorithms.get_suite(suite).label: suite
+    for suite in (CryptoSuite.CLASSIC, CryptoSuite.HYBRID, CryptoSuite.PURE)
+}
+# Escenario -> etiqueta de los datos reales de su KEM (ver map_algo_name)
+SCENARIO_ALGO_LABELS = {label: algorithms.get_suite(suite).kem.label for label, suite in SCENARIO_SUITES.items()}
+
+# Escenarios de la Pestaña 4 -> algoritmo medido por `lab_controller.py loadgen`
+LOADGEN_SCENARIOS = [
+    (short_label, algorithms.get_suite(suite).kem.algorithm)
+    for short_label, suite in [("Clásico", CryptoSuite.CLASSIC), ("Híbrido", CryptoSuite.HYBRID), ("PQC Puro", CryptoSuite.PURE)]
+]
 
 # --- CARGA DE DATOS ---
+store = ResultsStore(DATA_DIR)
+
+@st.cache_resource
+def get_data_cache():
+    # Compartido entre reruns y sesiones: lector incremental + DataFrame acumulado
+    return {"reader": IncrementalReader(store), "frames": FrameBuffer(), "stats": StatsTable(), "lock": threading.Lock()}
+
 def load_data():
-    if not os.path.exists(DATA_FILE):
-        return pd.DataFrame()
-    try:
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-            if not data: return pd.DataFrame()
-            df = pd.DataFrame(data)
-            if 'timestamp' in df.columns:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-            return df
-    except Exception:
-        return pd.DataFrame()
+    """
+    Solo parsea las filas publicadas desde la última lectura y las añade al
+    búfer en caché (sin copiar el histórico); tras un reset del almacén vuelve
+    a empezar de cero.
+    """
+    cache = get_data_cache()
+    with cache["lock"]:
+        try:
+            rows, reset = cache["reader"].poll()
+        except Exception:
+            return cache["frames"].frame()
+        if reset:
+            cache["frames"].clear()
+            cache["stats"] = StatsTable()
+        if rows:
+            new_rows = pd.DataFrame(rows)
+            if 'timestamp' in new_rows.columns:
+                new_rows['timestamp'] = pd.to_datetime(new_rows['timestamp'])
+            cache["stats"].update(new_rows) # Agregados: solo las filas nuevas
+            cache["frames"].append(new_rows)
+        return cache["frames"].frame()
+
+def load_stats():
+    """
+    Estadísticas por algoritmo precalculadas (misma versión de datos que load_data).
+    """
+    return get_data_cache()["stats"]
+
+# Red inestable de la pestaña 3 (simulador TCP de pqc_engine)
+UNSTABLE_RTT_MS = 100
+UNSTABLE_LOSS_RATE = 0.02
+HANDSHAKE_DEADLINE_MS = 1500 # Un handshake más lento cuenta como fallo (timeout de la aplicación)
+FAILURE_SIMULATIONS = 20000
+
+@st.cache_data
+def simulate_failure(client_bytes, server_bytes):
+    """
+    Fallo y latencia de cola del handshake bajo pérdida: slow start desde IW10,
+    retransmisiones rápidas/RTO y reintentos de SYN (simulación vectorizada).
+    """
+    mss = pqc_engine.MAX_MSS
+    result = pqc_engine.simulate_tcp_handshake(
+        np.full(FAILURE_SIMULATIONS, -(-client_bytes // mss)), -(-server_bytes // mss),
+        UNSTABLE_RTT_MS, UNSTABLE_LOSS_RATE, rng=np.random.default_rng(0)
+    )
+    failed = result["failed"] | (result["network_ms"] > HANDSHAKE_DEADLINE_MS)
+    return {
+        "failure_pct": float(failed.mean() * 100),
+        "p99_ms": float(np.percentile(result["network_ms"], 99)),
+        "timeout_pct": float((result["timeouts"] > 0).mean() * 100)
+    }
+
+# Reconexión de la pestaña 4 (modelo de reanudación PSK de pqc_engine)
+MOBILE_RTT_MS = 80
+RESUMPTION_MIX = 0.7   # Fracción de conexiones que reanudan sesión
+EARLY_DATA_MIX = 0.3   # De las reanudadas, cuántas envían 0-RTT
+
+@st.cache_resource
+def get_cost_model():
+    # Mismo perfil de CPU calibrado y en disco que el controlador y los barridos
+    return pqc_engine.CostModel.load_or_calibrate()
+
+@st.cache_data
+def simulate_session_recovery():
+    """
+    Por escenario: latencia de una reanudación 1-RTT y 0-RTT en red móvil,
+    tamaño del ticket y coste de CPU/bytes de la mezcla de conexiones frente
+    a hacer siempre el handshake completo.
+    """
+    cost_model = get_cost_model()
+    recovery = {}
+    for short_label, suite in [("Clásico", CryptoSuite.CLASSIC), ("Híbrido", CryptoSuite.HYBRID), ("PQC Puro", CryptoSuite.PURE)]:
+        kinds = np.array([pqc_engine.HANDSHAKE_RESUMED, pqc_engine.HANDSHAKE_EARLY_DATA], dtype=object)
+        latency = pqc_engine.run_resumption_simulation_batch(suite, kinds, MOBILE_RTT_MS, cost_model=cost_model)["total_latency_ms"]
+        mix = pqc_engine.simulate_connection_mix([suite], 10000, RESUMPTION_MIX, EARLY_DATA_MIX, cost_model=cost_model, seed=0)[suite]
+        full = pqc_engine.simulate_connection_mix([suite], 10000, 0.0, cost_model=cost_model, seed=0)[suite]
+        recovery[short_label] = {
+            "resumed_ms": float(latency[0]),
+            "early_data_ms": float(latency[1]),
+            "ticket_bytes": pqc_engine.get_resumption_profile(suite)["new_session_ticket_size"],
+            "cpu_saving": 1 - mix["cpu_ms_per_connection"] / full["cpu_ms_per_connection"],
+            "bytes_saving": 1 - mix["bytes_per_connection"] / full["bytes_per_connection"]
+        }
+    return recovery
+
+# Mapeo de nombres para visualización (etiqueta del registro de algoritmos)
+def map_algo_name(name):
+    kem = algorithms.find_kem(name)
+    return kem.label if kem else name
 
 # --- BARRA LATERAL ---
 with st.sidebar:
@@ -91,13 +211,10 @@ with st.sidebar:
     current_mode = "PHYSICS"
     is_running = False # Mapeamos 'paused' a 'not is_running'
     
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                current_mode = config.get("mode", "PHYSICS")
-                is_running = not config.get("paused", True) # Default paused=True (Stopped)
-        except: pass
+    config = control_plane.read_config(CONFIG_FILE)
+    if config:
+        current_mode = config.get("mode", "PHYSICS")
+        is_running = not config.get("paused", True) # Default paused=True (Stopped)
 
     # Selector de Modo (Deshabilitado si está corriendo)
     mode_options = ["PHYSICS", "REAL"]
@@ -118,21 +235,18 @@ with st.sidebar:
     if is_running:
         if st.button("⏹️ DETENER SIMULACIÓN", type="primary", use_container_width=True):
             # ACCIÓN: PARAR
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump({"mode": selected_mode, "paused": True}, f)
+            control_plane.publish_config({"mode": selected_mode, "paused": True}, CONFIG_FILE)
             st.rerun()
     else:
         if st.button(f"▶️ INICIAR {selected_mode}", type="primary", use_container_width=True):
             # ACCIÓN: INICIAR (Y LIMPIAR)
             # 1. Borrar datos viejos
-            if os.path.exists(DATA_FILE):
-                os.remove(DATA_FILE)
-            if os.path.exists("captures/debug_data_dump.json"):
-                os.remove("captures/debug_data_dump.json")
+            store.reset()
+            if os.path.exists(DEBUG_DUMP_FILE):
+                os.remove(DEBUG_DUMP_FILE)
             
-            # 2. Actualizar config
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump({"mode": selected_mode, "paused": False}, f)
+            # 2. Publicar config (atómica) y avisar al controlador
+            control_plane.publish_config({"mode": selected_mode, "paused": False}, CONFIG_FILE)
             
             st.success(f"Iniciando en modo {selected_mode}...")
             time.sleep(0.5)
@@ -150,6 +264,7 @@ with st.sidebar:
     
     # Detectar Fuente de Datos
     df = load_data()
+    stats = load_stats()
     source = "ESPERANDO DATOS..."
     
     if not df.empty and 'source' in df.columns:
@@ -173,11 +288,9 @@ with st.sidebar:
     st.markdown("---")
     if st.button("🗑️ RESETEAR PRUEBA", type="primary", help="Borra todos los datos capturados y reinicia el análisis."):
         try:
-            if os.path.exists(DATA_FILE):
-                os.remove(DATA_FILE)
-            debug_file = "captures/debug_data_dump.json"
-            if os.path.exists(debug_file):
-                os.remove(debug_file)
+            store.reset()
+            if os.path.exists(DEBUG_DUMP_FILE):
+                os.remove(DEBUG_DUMP_FILE)
             st.success("¡Datos purgados! Reiniciando...")
             time.sleep(1)
             st.rerun()
@@ -214,60 +327,44 @@ else:
     with tab1:
         c1, c2, c3, c4 = st.columns(4)
         
-        total_scans = len(df_filtered)
-        success_rate = (df_filtered['supported'].sum() / total_scans * 100) if total_scans > 0 else 0
-        avg_latency = df_filtered['handshake_latency_ms'].mean() if total_scans > 0 else 0
+        selected_stats = stats.combined(set(selected_algos))
+        total_scans = selected_stats.count
+        success_rate = selected_stats.success_rate
+        avg_latency = selected_stats.mean_latency_ms
         
         c1.metric("Total Handshakes", f"{total_scans}")
         c2.metric("Tasa de Éxito", f"{success_rate:.1f}%", delta_color="normal")
         c3.metric("Latencia Global (P50)", f"{avg_latency:.1f} ms", help="Promedio de todos los algoritmos seleccionados")
         
         # Amplification Factor Calculation
-        # Approx: (ServerHello + Certs + Verify) / ClientHello
-        # Classic: ~3KB / 0.3KB ~ 10x
-        # PQC: ~15KB / 1KB ~ 15x
+        # (ServerHello + Certs + Verify) / ClientHello del perfil de la suite del último algoritmo
         amp_factor = 1.0
         if not df_filtered.empty:
-            last_algo = df_filtered.iloc[-1]['algorithm'].lower()
-            if "kyber" in last_algo or "mlkem" in last_algo:
-                amp_factor = 14.8 # Estimated
-            elif "x25519" in last_algo and "kyber" not in last_algo:
-                amp_factor = 9.5 # Estimated
+            last_suite = algorithms.suite_for_algorithm(df_filtered.iloc[-1]['algorithm'])
+            if last_suite is not None:
+                amp_factor = pqc_engine.get_suite_profile(last_suite.name)["amplification_factor"]
         
         c4.metric("Factor Amplificación", f"{amp_factor}x", delta="Riesgo DDoS", delta_color="inverse", help="Ratio Bytes Respuesta / Bytes Petición")
 
         # Desglose por Algoritmo
         st.markdown("### 📊 Desglose de Rendimiento por Algoritmo")
         if not df_filtered.empty:
-            # Mapeo de nombres para visualización
-            def map_algo_name(name):
-                name_lower = name.lower()
-                if "x25519_kyber768" in name_lower:
-                    return "Híbrido (X25519+Kyber768)"
-                elif "kyber768" in name_lower or "mlkem768" in name_lower:
-                    return "PQC Puro (ML-KEM-768)"
-                elif "x25519" in name_lower:
-                    return "Clásico (ECDH)"
-                return name
-
-            df_display = df_filtered.copy()
-            df_display['algorithm_label'] = df_display['algorithm'].apply(map_algo_name)
-
-            breakdown = df_display.groupby('algorithm_label').agg(
-                Muestras=('timestamp', 'count'),
-                Latencia_Media=('handshake_latency_ms', 'mean'),
-                Exito=('supported', lambda x: (x.sum() / len(x)) * 100)
-            ).reset_index()
-            breakdown.columns = ['Algoritmo', 'Muestras', 'Latencia Media (ms)', 'Éxito (%)']
-            breakdown['Latencia Media (ms)'] = breakdown['Latencia Media (ms)'].round(2)
-            breakdown['Éxito (%)'] = breakdown['Éxito (%)'].round(1)
+            breakdown = pd.DataFrame([
+                {
+                    'Algoritmo': label,
+                    'Muestras': group.count,
+                    'Latencia Media (ms)': round(group.mean_latency_ms, 2),
+                    'Éxito (%)': round(group.success_rate, 1)
+                }
+                for label, group in sorted(stats.grouped(map_algo_name, set(selected_algos)).items())
+            ])
             st.dataframe(breakdown, width="stretch", hide_index=True)
 
         st.markdown("### ⚡ Impacto de Latencia de Handshake")
         
         # Aplicar mapeo también al gráfico
         df_chart = df_filtered.copy()
-        df_chart['algorithm_label'] = df_chart['algorithm'].apply(map_algo_name)
+        df_chart['algorithm_label'] = df_chart['algorithm'].map({algo: map_algo_name(algo) for algo in selected_algos})
         
         fig_line = px.line(
             df_chart.sort_values('timestamp'), 
@@ -280,6 +377,27 @@ else:
         )
         st.plotly_chart(fig_line, key="line_chart", width="stretch")
 
+        # Desglose por fases (sondas con PQC_PROBE_TIMING=PHASES): a qué se va la latencia
+        if 'latency_network_ms' in df_chart.columns:
+            df_phases = df_chart.dropna(subset=['latency_network_ms'])
+            if not df_phases.empty:
+                st.markdown("### ⏱️ Desglose de Latencia por Fases")
+                phase_means = (
+                    df_phases.groupby('algorithm_label')[['latency_network_ms', 'latency_crypto_ms', 'latency_overhead_ms']]
+                    .mean()
+                    .rename(columns={'latency_network_ms': 'Red', 'latency_crypto_ms': 'Criptografía', 'latency_overhead_ms': 'Sobrecarga'})
+                    .reset_index()
+                    .melt(id_vars='algorithm_label', var_name='Fase', value_name='ms')
+                )
+                fig_phases = px.bar(
+                    phase_means, x='algorithm_label', y='ms', color='Fase', template="plotly_dark", height=300,
+                    labels={'algorithm_label': 'Algoritmo', 'ms': 'Latencia media (ms)'}
+                )
+                st.plotly_chart(fig_phases, key="phase_chart", width="stretch")
+                st.caption("Red: ClientHello → ServerHello (incluye el trabajo del servidor en ese RTT). "
+                           "Criptografía: keygen y procesado del vuelo del servidor en el cliente. "
+                           "Sobrecarga: docker exec, arranque de openssl, conexión TCP y cierre.")
+
     # --- TAB 2: AMENAZA HNDL (Harvest Now, Decrypt Later) ---
     with tab2:
         st.header("Amenaza HNDL: Cosechar Ahora, Descifrar Después")
@@ -318,50 +436,23 @@ else:
         st.header("Laboratorio de Anatomía de Cable")
         st.markdown("Simulación del impacto a nivel de cable de los tamaños de clave PQC en la fragmentación TCP/IP.")
         
-        scenario = st.radio("Seleccionar Escenario", ["Clásico (ECDH)", "Híbrido (X25519+Kyber768)", "PQC Puro", "KEMTLS (Optimizado)"], horizontal=True)
+        scenario = st.radio("Seleccionar Escenario", list(SCENARIO_SUITES) + ["KEMTLS (Optimizado)"], horizontal=True)
         
         if scenario == "Clásico (ECDH)":
-            client_hello_size = 282
-            server_hello_size = 3000 # Approx
-            # Breakdown
-            sh_part = 200
-            certs_part = 2500
-            sig_part = 300
-            
-            key_share_size = 32
             color = "#10b981" # Green
             frag_text = "ATÓMICO (1 Segmento)"
             risk_text = "Dentro de Ventana de Congestión"
             risk_color = "green"
-            segments = 2
         elif scenario == "Híbrido (X25519+Kyber768)":
-            client_hello_size = 1434
-            server_hello_size = 4500 # Approx
-            # Breakdown
-            sh_part = 1400
-            certs_part = 2500
-            sig_part = 600
-            
-            key_share_size = 1184 + 32
             color = "#8b5cf6" # Purple
             frag_text = "LÍMITE (1-2 Segmentos)"
             risk_text = "Riesgo de Amplificación Moderado"
             risk_color = "orange"
-            segments = 3
         elif scenario == "PQC Puro":
-            client_hello_size = 2500
-            server_hello_size = 15000 # Approx
-            # Breakdown
-            sh_part = 1500
-            certs_part = 10500 # The Elephant
-            sig_part = 3000
-            
-            key_share_size = 2300
             color = "#ef4444" # Red
             frag_text = "FRAGMENTADO (>2 Segmentos)"
             risk_text = "Límite de Amplificación Excedido (IW10)"
             risk_color = "red"
-            segments = 10
         else: # KEMTLS
             client_hello_size = 2600 # Slightly larger ClientHello (keys)
             server_hello_size = 4000 # Much smaller ServerFlight (No sigs, smaller certs)
@@ -377,6 +468,19 @@ else:
             risk_color = "blue"
             segments = 3
 
+        if scenario in SCENARIO_SUITES:
+            # Tamaños de la tabla de perfiles precalculada del motor (misma fuente que PHYSICS)
+            profile = pqc_engine.get_suite_profile(SCENARIO_SUITES[scenario])
+            client_hello_size = profile["client_payload_size"]
+            server_hello_size = profile["server_payload_size"]
+            # Breakdown
+            certs_part = profile["cert_chain_size"]
+            sig_part = profile["signature_size"]
+            sh_part = server_hello_size - certs_part - sig_part
+            
+            key_share_size = profile["key_share_size"]
+            segments = profile["server_segments"]
+
         c_wire_1, c_wire_2 = st.columns(2)
         
         with c_wire_1:
@@ -491,45 +595,25 @@ else:
                 st.success(f"✅ **{risk_text}**\n\nLa respuesta cabe en la ventana TCP inicial.")
 
             st.subheader("Probabilidad de Fallo Compuesto")
-            # Composite Failure Rate = P(Frag Loss) + P(Timeout)
-            # Classic: Low risk
-            # PQC: Exponential risk due to multiple fragments
-            if scenario == "Clásico (ECDH)":
-                fail_prob = 0.5 # %
-                fail_color = "green"
-            elif scenario == "Híbrido (X25519+Kyber768)":
-                fail_prob = 2.5 # %
-                fail_color = "orange"
-            elif scenario == "PQC Puro":
-                fail_prob = 15.0 # %
-                fail_color = "red"
-            else: # KEMTLS
-                fail_prob = 1.5 # %
-                fail_color = "blue"
-            
-            st.metric("Riesgo de Fallo (Red Inestable)", f"{fail_prob}%", delta="Exponencial", delta_color="inverse")
-            st.progress(fail_prob / 20.0) # Scale for visual
-            st.caption("Probabilidad combinada de pérdida de fragmentos y timeout (IW10).")
+            # Simulación con los tamaños del escenario: cada segmento extra es otra
+            # oportunidad de pérdida y, si cae sin ACKs duplicados detrás, un RTO
+            failure = simulate_failure(client_hello_size, server_hello_size)
+            fail_prob = round(failure["failure_pct"], 2)
+
+            st.metric("Riesgo de Fallo (Red Inestable)", f"{fail_prob}%", delta=f"P99 {failure['p99_ms']:.0f} ms", delta_color="inverse")
+            st.progress(min(fail_prob / 20.0, 1.0)) # Scale for visual
+            st.caption(f"Handshakes que TCP abandona o que superan {HANDSHAKE_DEADLINE_MS} ms con RTT {UNSTABLE_RTT_MS} ms y "
+                       f"{UNSTABLE_LOSS_RATE:.0%} de pérdida (IW10); {failure['timeout_pct']:.1f}% sufren al menos un RTO.")
 
             st.markdown("---")
             st.subheader("🔬 Validación con Tráfico Real (Lab)")
             
-            # Filter data for current scenario
+            # Agregados precalculados del escenario (sin reescanear el DataFrame)
             real_bytes = 0
-            if not df.empty:
-                if scenario == "Clásico (ECDH)":
-                    # Use exact match to avoid matching 'x25519_kyber768'
-                    subset = df[df['algorithm'] == "X25519"]
-                elif scenario == "Híbrido (X25519+Kyber768)":
-                    subset = df[df['algorithm'] == "x25519_kyber768"]
-                elif scenario == "PQC Puro":
-                    # Match 'kyber768' or 'mlkem768'
-                    subset = df[df['algorithm'].str.contains("kyber768|mlkem768", case=False, na=False)]
-                else:
-                    subset = pd.DataFrame() # KEMTLS not in real data
-                
-                if not subset.empty:
-                    real_bytes = int(subset['phase2_total_bytes'].mean())
+            scenario_label = SCENARIO_ALGO_LABELS.get(scenario) # KEMTLS not in real data
+            scenario_stats = stats.grouped(map_algo_name).get(scenario_label)
+            if scenario_stats and scenario_stats.count:
+                real_bytes = int(scenario_stats.mean_bytes)
             
             c_val_1, c_val_2 = st.columns(2)
             c_val_1.metric("Teórico (Server Flight)", f"{server_hello_size} B", help="Estimación basada en RFCs (Cadena Completa).")
@@ -552,6 +636,12 @@ else:
         st.header("Dimensionamiento de Infraestructura")
         st.markdown("Impacto en CPU y Throughput al migrar a firmas Dilithium.")
         
+        # Benchmark de carga (si se ha ejecutado): HS/s por core y latencias bajo carga
+        loadgen = load_generator.load_results()
+        loadgen_by_scenario = {label: loadgen.get(algo) or {} for label, algo in LOADGEN_SCENARIOS}
+        density = {label: result.get("hs_per_s_per_core") for label, result in loadgen_by_scenario.items()}
+        has_loadgen = all(density.values())
+        
         c_infra_1, c_infra_2 = st.columns(2)
         
         with c_infra_1:
@@ -566,18 +656,16 @@ else:
             # Real Latency Validation
             st.markdown("#### 🔬 Latencia Real (P99)")
             if not df.empty:
-                # Calculate P99 for each scenario from real data
+                # P99 por escenario desde los histogramas precalculados
+                groups = stats.grouped(map_algo_name)
                 real_p99_data = []
-                for s_label, s_code in [("Clásico", "X25519"), ("Híbrido", "x25519_kyber768"), ("PQC Puro", "kyber768")]:
-                    sub = df[df['algorithm'].str.contains(s_code, case=False, na=False)]
-                    if not sub.empty:
-                        p99 = sub['handshake_latency_ms'].quantile(0.99)
-                        real_p99_data.append({"Escenario": s_label, "P99 Real (ms)": round(p99, 1)})
-                    else:
-                        real_p99_data.append({"Escenario": s_label, "P99 Real (ms)": 0})
+                for (s_label, _), a_label in zip(LOADGEN_SCENARIOS, SCENARIO_ALGO_LABELS.values()):
+                    group = groups.get(a_label)
+                    p99 = group.quantile(0.99) if group else 0
+                    real_p99_data.append({"Escenario": s_label, "P99 Real (ms)": round(p99, 1)})
                 
                 st.dataframe(pd.DataFrame(real_p99_data), width="stretch", hide_index=True)
-                st.caption("Datos calculados en tiempo real desde `real_scan_results.json`.")
+                st.caption("Datos calculados en tiempo real desde `captures/results/`.")
             else:
                 st.info("Esperando datos de telemetría...")
 
@@ -596,17 +684,31 @@ else:
         with c_infra_2:
             st.subheader("Capacidad de Flota")
             
-            st.markdown("**Clásico**")
-            st.progress(1.0)
-            st.caption("Capacidad Throughput: 100% (Baseline)")
-            
-            st.markdown("**Híbrido**")
-            st.progress(0.92)
-            st.caption("Capacidad Throughput: 92% (+1 Servidores Req.)")
-            
-            st.markdown("**Puro (Dilithium)**")
-            st.progress(0.85)
-            st.caption("Capacidad Throughput: 85% (+2 Servidores Req.)")
+            if has_loadgen:
+                # Capacidad relativa = HS/s por core medidos frente al clásico
+                baseline = density["Clásico"]
+                for label, title in [("Clásico", "**Clásico**"), ("Híbrido", "**Híbrido**"), ("PQC Puro", "**Puro (Dilithium)**")]:
+                    ratio = min(density[label] / baseline, 1.0)
+                    st.markdown(title)
+                    st.progress(ratio)
+                    if label == "Clásico":
+                        st.caption("Capacidad Throughput: 100% (Baseline)")
+                    else:
+                        extra = load_generator.extra_servers(ratio)
+                        servers = f"+{extra} Servidores Req." if extra is not None else "sin handshakes completados"
+                        st.caption(f"Capacidad Throughput: {ratio:.0%} ({servers})")
+            else:
+                st.markdown("**Clásico**")
+                st.progress(1.0)
+                st.caption("Capacidad Throughput: 100% (Baseline)")
+                
+                st.markdown("**Híbrido**")
+                st.progress(0.92)
+                st.caption("Capacidad Throughput: 92% (+1 Servidores Req.)")
+                
+                st.markdown("**Puro (Dilithium)**")
+                st.progress(0.85)
+                st.caption("Capacidad Throughput: 85% (+2 Servidores Req.)")
             
             # Energy Cost
             st.markdown("### 🌱 Coste Energético (por 1M Conexiones)")
@@ -626,20 +728,32 @@ else:
         
         with c_metrics_1:
             st.subheader("Densidad de Conexiones")
-            # Classic: 2500
-            # Hybrid: 1200
-            # PQC: 450
-            st.metric("Clásico", "2,500 HS/s")
-            st.metric("Híbrido", "1,200 HS/s", delta="-52%", delta_color="inverse")
-            st.metric("PQC Puro", "450 HS/s", delta="-82%", delta_color="inverse")
-            st.caption("Handshakes/s por Core")
+            if has_loadgen:
+                baseline = density["Clásico"]
+                st.metric("Clásico", f"{baseline:,.0f} HS/s")
+                for label in ("Híbrido", "PQC Puro"):
+                    change = (density[label] / baseline - 1) * 100
+                    st.metric(label, f"{density[label]:,.0f} HS/s", delta=f"{change:+.0f}%", delta_color="inverse")
+                st.caption("Handshakes/s por Core (medido con `lab_controller.py loadgen`)")
+            else:
+                # Classic: 2500
+                # Hybrid: 1200
+                # PQC: 450
+                st.metric("Clásico", "2,500 HS/s")
+                st.metric("Híbrido", "1,200 HS/s", delta="-52%", delta_color="inverse")
+                st.metric("PQC Puro", "450 HS/s", delta="-82%", delta_color="inverse")
+                st.caption("Handshakes/s por Core (referencia: ejecuta `python lab_controller.py loadgen` para medirlo)")
             
         with c_metrics_2:
             st.subheader("Latencia de Cola (P99)")
             # P50 vs P99
+            tail_p50, tail_p99 = [25, 35, 65], [40, 60, 250]
+            if has_loadgen:
+                tail_p50 = [loadgen_by_scenario[label].get("p50_ms") or 0 for label, _ in LOADGEN_SCENARIOS]
+                tail_p99 = [loadgen_by_scenario[label].get("p99_ms") or 0 for label, _ in LOADGEN_SCENARIOS]
             fig_tail = go.Figure()
-            fig_tail.add_trace(go.Bar(name='P50 (Media)', x=['Clásico', 'Híbrido', 'PQC'], y=[25, 35, 65], marker_color='#3b82f6'))
-            fig_tail.add_trace(go.Bar(name='P99 (Pico)', x=['Clásico', 'Híbrido', 'PQC'], y=[40, 60, 250], marker_color='#ef4444'))
+            fig_tail.add_trace(go.Bar(name='P50 (Media)', x=['Clásico', 'Híbrido', 'PQC'], y=tail_p50, marker_color='#3b82f6'))
+            fig_tail.add_trace(go.Bar(name='P99 (Pico)', x=['Clásico', 'Híbrido', 'PQC'], y=tail_p99, marker_color='#ef4444'))
             fig_tail.update_layout(barmode='group', title="Estabilidad (Jitter)", height=250, template="plotly_dark")
             st.plotly_chart(fig_tail, width="stretch")
             st.caption("PQC sufre picos de latencia debido a retransmisiones TCP de paquetes grandes.")
@@ -672,13 +786,18 @@ else:
             
         with c_biz_2:
             st.markdown("**Tiempo de Recuperación de Sesión (UX)**")
-            # Session Resumption (0-RTT)
-            # Classic: Fast ticket
-            # PQC: Large ticket = slower transmission
-            st.metric("Clásico", "20 ms")
-            st.metric("Híbrido", "45 ms", delta="+125%", delta_color="inverse")
-            st.metric("PQC Puro", "120 ms", delta="+500%", delta_color="inverse")
-            st.caption("Impacto en reconexión móvil (Ticket Size).")
+            # Reanudación PSK (psk_dhe_ke): sin certificados ni firmas, pero el KEM se sigue intercambiando
+            recovery = simulate_session_recovery()
+            baseline = recovery["Clásico"]["resumed_ms"]
+            for label, values in recovery.items():
+                change = (values["resumed_ms"] / baseline - 1) * 100
+                st.metric(label, f"{values['resumed_ms']:.0f} ms",
+                          delta=f"{change:+.0f}%" if label != "Clásico" else None, delta_color="inverse",
+                          help=f"0-RTT: {values['early_data_ms']:.0f} ms | NewSessionTicket: {values['ticket_bytes']} B")
+            pure = recovery["PQC Puro"]
+            st.caption(f"Reconexión móvil (RTT {MOBILE_RTT_MS} ms, reanudación 1-RTT). Con {RESUMPTION_MIX:.0%} de reanudaciones "
+                       f"({EARLY_DATA_MIX:.0%} en 0-RTT), PQC Puro ahorra un {pure['cpu_saving']:.0%} de CPU y un "
+                       f"{pure['bytes_saving']:.0%} de bytes por conexión.")
 
     # --- TAB 5: FORENSIA CANAL LATERAL (Side-Channel) ---
     with tab5:
@@ -797,6 +916,9 @@ else:
             """
             components.html(html_code, height=420)
 
+if profiler is not None:
+    profiler.stop() # Antes de la espera del auto-refresco: solo se mide el render
+
 # Auto-refresh
 if refresh_rate and is_running:
     time.sleep(refresh_rate)
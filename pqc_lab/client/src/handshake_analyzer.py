@@ -0,0 +1,540 @@
+import argparse
+import json
+import os
+import statistics
+import struct
+from datetime import datetime
+
+import algorithms
+from pcap_reader import read_packets, decode_tcp, TCP_SYN, TCP_ACK, TCP_FIN, TCP_RST
+
+# Analizador offline de handshakes TLS 1.3 en capturas pcap/pcapng.
+# Reensambla los flujos TCP en streaming y extrae grupo negociado, tamaños de
+# key share, bytes de la cadena de certificados, segmentos y tiempos por vuelo.
+
+MEASURED_SIZES_FILE = "captures/measured_sizes.json"
+
+# Code points de grupos TLS: los del registro de algoritmos (IANA) más los
+# borradores pre-estándar de Kyber que aún aparecen en capturas OQS
+DRAFT_GROUPS = {
+    0x6399: "X25519Kyber768Draft00",
+    0x639A: "SecP256r1Kyber768Draft00",
+    0x023A: "kyber512",
+    0x023C: "kyber768",
+    0x023D: "kyber1024",
+    0x2F39: "x25519_kyber512",
+    0x2F3A: "p256_kyber512",
+    0x2F3C: "p384_kyber768"
+}
+TLS_GROUPS = {
+    **DRAFT_GROUPS,
+    **{kem.codepoint: kem.group for kem in algorithms.KEMS.values() if kem.codepoint is not None}
+}
+
+# ServerHello.random especial de un HelloRetryRequest (RFC 8446, 4.1.3)
+HRR_RANDOM = bytes.fromhex("CF21AD74E59A6111BE1D8C021E65B891C2A211167ABB8C5E079E09E2C8A8339C")
+
+TLS_CHANGE_CIPHER_SPEC = 20
+TLS_ALERT = 21
+TLS_HANDSHAKE = 22
+TLS_APPLICATION_DATA = 23
+
+HS_CLIENT_HELLO = 1
+HS_SERVER_HELLO = 2
+HS_CERTIFICATE = 11
+HS_SERVER_HELLO_DONE = 14
+
+EXT_PRE_SHARED_KEY = 41
+EXT_SUPPORTED_VERSIONS = 43
+EXT_KEY_SHARE = 51
+
+# Límites de memoria: bytes reensamblados por sentido, segmentos fuera de orden y flujos vivos
+MAX_STREAM_BYTES = 256 * 1024
+MAX_PENDING_SEGMENTS = 256
+MAX_FLOWS = 10_000
+FLOW_IDLE_TIMEOUT = 120 # s
+
+def group_name(code):
+    return TLS_GROUPS.get(code, f"0x{code:04x}")
+
+def algorithm_label(negotiated_group):
+    """
+    Nombre 'algorithm' que usan el controlador y el dashboard para un grupo.
+    """
+    kem = algorithms.find_kem(negotiated_group)
+    return kem.algorithm if kem else negotiated_group
+
+class StreamReassembler:
+    """
+    Reensamblado de un sentido de un flujo TCP: reordena, descarta retransmisiones
+    y guarda como máximo MAX_STREAM_BYTES (solo nos interesa el handshake).
+    """
+    def __init__(self):
+        self.next_seq = None
+        self.data = bytearray()
+        self.pending = {}
+        self.segments = [] # [(offset_inicio, offset_fin, timestamp, ref)] de cada segmento con datos nuevos
+        self.truncated = False
+
+    def syn(self, seq):
+        self.next_seq = (seq + 1) & 0xFFFFFFFF
+
+    def add(self, seq, payload, timestamp, ref=None):
+        if not payload or self.truncated:
+            return
+        if self.next_seq is None: # Flujo capturado a medias: empezar aquí
+            self.next_seq = seq
+        delta = ((seq - self.next_seq + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        if delta > 0:
+            if len(self.pending) < MAX_PENDING_SEGMENTS:
+                self.pending[seq] = (bytes(payload), timestamp, ref)
+            return
+        self._append(payload[-delta:] if delta < 0 else payload, timestamp, ref)
+        while self.next_seq in self.pending:
+            payload, timestamp, ref = self.pending.pop(self.next_seq)
+            self._append(payload, timestamp, ref)
+
+    def _append(self, payload, timestamp, ref):
+        if not payload:
+            return
+        room = MAX_STREAM_BYTES - len(self.data)
+        if len(payload) > room:
+            payload = payload[:room]
+            self.truncated = True
+        start = len(self.data)
+        self.data += payload
+        self.segments.append((start, len(self.data), timestamp, ref))
+        self.next_seq = (self.next_seq + len(payload)) & 0xFFFFFFFF
+
+    def timestamp_at(self, offset):
+        for start, end, timestamp, _ in self.segments:
+            if start <= offset < end:
+                return timestamp
+        return None
+
+    def count_segments(self, start, end):
+        return sum(1 for seg_start, seg_end, _, _ in self.segments if seg_start < end and seg_end > start)
+
+    def refs(self, start, end):
+        """
+        Referencias (p.ej. offsets en la captura) de los segmentos que cubren [start, end).
+        """
+        return [ref for seg_start, seg_end, _, ref in self.segments if seg_start < end and seg_end > start]
+
+class TlsRecord:
+    __slots__ = ("content_type", "start", "end", "body", "timestamp")
+
+    def __init__(self, content_type, start, end, body, timestamp):
+        self.content_type = content_type
+        self.start = start
+        self.end = end
+        self.body = body
+        self.timestamp = timestamp
+
+class TlsDirection:
+    """
+    Un sentido del flujo: reensamblado TCP + troceado en registros TLS y en
+    mensajes de handshake en claro.
+    """
+    def __init__(self):
+        self.stream = StreamReassembler()
+        self.position = 0
+        self.handshake_buffer = bytearray()
+        self.handshake_start = None
+        self.record_log = [] # [(content_type, tipo de handshake o -1, inicio, fin, timestamp)]
+
+    def records(self):
+        data = self.stream.data
+        while len(data) - self.position >= 5:
+            content_type = data[self.position]
+            length = struct.unpack_from("!H", data, self.position + 3)[0]
+            end = self.position + 5 + length
+            if len(data) < end:
+                break
+            record = TlsRecord(
+                content_type, self.position, end,
+                bytes(data[self.position + 5:end]),
+                self.stream.timestamp_at(end - 1)
+            )
+            self.position = end
+            handshake_type = record.body[0] if content_type == TLS_HANDSHAKE and record.body else -1
+            self.record_log.append((content_type, handshake_type, record.start, end, record.timestamp))
+            yield record
+
+    def handshake_messages(self, record):
+        """
+        Mensajes de handshake de un registro en claro (pueden partirse entre registros).
+        """
+        if not self.handshake_buffer:
+            self.handshake_start = record
+        self.handshake_buffer += record.body
+        while len(self.handshake_buffer) >= 4:
+            msg_type = self.handshake_buffer[0]
+            length = int.from_bytes(self.handshake_buffer[1:4], "big")
+            if len(self.handshake_buffer) < 4 + length:
+                break
+            body = bytes(self.handshake_buffer[4:4 + length])
+            del self.handshake_buffer[:4 + length]
+            yield msg_type, body, self.handshake_start
+            self.handshake_start = record
+
+def _parse_extensions(body, position):
+    extensions = {}
+    if position + 2 > len(body):
+        return extensions
+    end = position + 2 + struct.unpack_from("!H", body, position)[0]
+    position += 2
+    while position + 4 <= end:
+        ext_type, ext_len = struct.unpack_from("!HH", body, position)
+        extensions[ext_type] = body[position + 4:position + 4 + ext_len]
+        position += 4 + ext_len
+    return extensions
+
+def parse_client_hello(body):
+    position = 2 + 32 # legacy_version + random
+    position += 1 + body[position] # session_id
+    position += 2 + struct.unpack_from("!H", body, position)[0] # cipher_suites
+    position += 1 + body[position] # compression_methods
+    extensions = _parse_extensions(body, position)
+    key_shares = {}
+    data = extensions.get(EXT_KEY_SHARE, b"")
+    cursor = 2
+    while cursor + 4 <= len(data):
+        group, length = struct.unpack_from("!HH", data, cursor)
+        key_shares[group_name(group)] = length
+        cursor += 4 + length
+    return {"key_shares": key_shares}
+
+def parse_server_hello(body):
+    random = body[2:34]
+    position = 34
+    position += 1 + body[position] # session_id
+    cipher_suite = struct.unpack_from("!H", body, position)[0]
+    position += 3 # cipher_suite + compression_method
+    extensions = _parse_extensions(body, position)
+    version = "TLS 1.2"
+    if EXT_SUPPORTED_VERSIONS in extensions and extensions[EXT_SUPPORTED_VERSIONS][:2] == b"\x03\x04":
+        version = "TLS 1.3"
+    group, key_share_len = None, 0
+    key_share = extensions.get(EXT_KEY_SHARE, b"")
+    if len(key_share) >= 2:
+        group = group_name(struct.unpack_from("!H", key_share, 0)[0])
+        if len(key_share) >= 4: # En un HRR solo viene el grupo
+            key_share_len = struct.unpack_from("!H", key_share, 2)[0]
+    return {
+        "hrr": random == HRR_RANDOM,
+        "version": version,
+        "cipher_suite": f"0x{cipher_suite:04x}",
+        "group": group,
+        "key_share_len": key_share_len,
+        "resumed": EXT_PRE_SHARED_KEY in extensions # PSK aceptada: el vuelo no lleva Certificate ni CertificateVerify
+    }
+
+class HandshakeFlow:
+    """
+    Estado de un flujo TCP: quién es cliente/servidor, SYN/SYN-ACK y el
+    progreso del handshake TLS hasta el Finished del cliente.
+    """
+    def __init__(self, client):
+        self.client = client # (ip, puerto)
+        self.server = None
+        self.directions = {}
+        self.syn_ts = None
+        self.synack_ts = None
+        self.last_seen = None
+        self.client_hello = None
+        self.server_hello = None
+        self.server_hello_record = None
+        self.flight_records = []
+        self.certificate_bytes = None
+        self.hrr = False
+        self.alert = False
+        self.alert_ts = None
+        self.client_finished_ts = None
+        self.done = False
+
+    def direction(self, endpoint):
+        if endpoint not in self.directions:
+            self.directions[endpoint] = TlsDirection()
+        return self.directions[endpoint]
+
+    def process(self, endpoint):
+        """
+        Consume los registros TLS nuevos de un sentido. Devuelve True al completar el handshake.
+        """
+        direction = self.direction(endpoint)
+        from_client = endpoint == self.client
+        for record in direction.records():
+            if from_client:
+                if self._client_record(direction, record):
+                    return True
+            elif self._server_record(direction, record):
+                return True
+        return False
+
+    def _client_record(self, direction, record):
+        if record.content_type == TLS_HANDSHAKE and self.client_finished_ts is None:
+            for msg_type, body, first_record in direction.handshake_messages(record):
+                if msg_type == HS_CLIENT_HELLO:
+                    self.client_hello = dict(
+                        parse_client_hello(body),
+                        start=first_record.start,
+                        end=record.end,
+                        timestamp=direction.stream.timestamp_at(first_record.start),
+                        bytes=record.end - first_record.start,
+                        segments=direction.stream.count_segments(first_record.start, record.end)
+                    )
+                    self.server_hello = None # Segundo ClientHello tras un HRR
+                    self.flight_records = []
+            return False
+        if record.content_type == TLS_APPLICATION_DATA and self.server_hello:
+            # TLS 1.3: el primer registro cifrado del cliente es su Finished
+            self.client_finished_ts = record.timestamp
+            return True
+        return False
+
+    def _server_record(self, direction, record):
+        if record.content_type == TLS_ALERT and self.server_hello is None:
+            self.alert = True
+            self.alert_ts = record.timestamp
+            return True
+        if record.content_type == TLS_HANDSHAKE and (self.server_hello is None or self.server_hello["version"] == "TLS 1.2"):
+            for msg_type, body, first_record in direction.handshake_messages(record):
+                if msg_type == HS_SERVER_HELLO:
+                    server_hello = parse_server_hello(body)
+                    if server_hello["hrr"]:
+                        self.hrr = True
+                        continue
+                    self.server_hello = server_hello
+                    self.server_hello_record = first_record
+                    self.flight_records = []
+                elif msg_type == HS_CERTIFICATE and self.server_hello:
+                    self.certificate_bytes = len(body) # TLS 1.2: certificado en claro
+            if self.server_hello:
+                self.flight_records.append(record)
+                if self.server_hello["version"] == "TLS 1.2" and record.body[:1] == bytes([HS_SERVER_HELLO_DONE]):
+                    self.client_finished_ts = record.timestamp
+                    return True
+            return False
+        if self.server_hello and self.client_finished_ts is None:
+            self.flight_records.append(record)
+        return False
+
+    def summary(self):
+        """
+        Resumen del handshake (None si no llegó a verse ServerHello).
+        """
+        if not self.client_hello or not (self.server_hello or self.alert):
+            return None
+        client_hello = self.client_hello
+        server_hello = self.server_hello or {}
+        negotiated = server_hello.get("group")
+        server_stream = self.direction(self.server).stream if self.server else None
+
+        flight_bytes = flight_segments = encrypted_bytes = 0
+        flight_end_ts = None
+        if self.flight_records and server_stream:
+            start = self.server_hello_record.start
+            end = self.flight_records[-1].end
+            flight_bytes = end - start
+            flight_segments = server_stream.count_segments(start, end)
+            flight_end_ts = self.flight_records[-1].timestamp
+            encrypted_bytes = sum(r.end - r.start for r in self.flight_records if r.content_type == TLS_APPLICATION_DATA)
+
+        def elapsed_ms(start, end):
+            return round((end - start) * 1000, 3) if start is not None and end is not None else None
+
+        server_hello_ts = self.server_hello_record.timestamp if self.server_hello_record else None
+        return {
+            "client": f"{self.client[0]}:{self.client[1]}",
+            "server": f"{self.server[0]}:{self.server[1]}" if self.server else None,
+            "complete": self.client_finished_ts is not None,
+            "alert": self.alert,
+            "hrr": self.hrr,
+            "resumed": server_hello.get("resumed", False),
+            "tls_version": server_hello.get("version"),
+            "cipher_suite": server_hello.get("cipher_suite"),
+            "negotiated_group": negotiated,
+            "offered_groups": list(client_hello["key_shares"]),
+            "client_key_share_bytes": client_hello["key_shares"].get(negotiated, 0),
+            "client_key_shares_total_bytes": sum(client_hello["key_shares"].values()),
+            "server_key_share_bytes": server_hello.get("key_share_len", 0),
+            "client_hello_bytes": client_hello["bytes"],
+            "client_hello_segments": client_hello["segments"],
+            "server_flight_bytes": flight_bytes,
+            "server_flight_segments": flight_segments,
+            # TLS 1.3: EncryptedExtensions + Certificate + CertificateVerify + Finished cifrados
+            "encrypted_flight_bytes": encrypted_bytes,
+            "certificate_bytes": self.certificate_bytes,
+            "client_hello_ts": client_hello["timestamp"],
+            "tcp_connect_ms": elapsed_ms(self.syn_ts, self.synack_ts),
+            "server_hello_delay_ms": elapsed_ms(client_hello["timestamp"], server_hello_ts),
+            "server_flight_ms": elapsed_ms(server_hello_ts, flight_end_ts),
+            "handshake_ms": elapsed_ms(client_hello["timestamp"], self.client_finished_ts or self.alert_ts)
+        }
+
+class HandshakeTracker:
+    """
+    Tabla de flujos alimentada paquete a paquete (captura offline o en vivo).
+    `feed` devuelve los handshakes que se completan con ese paquete; `on_flow`
+    (opcional) recibe cada HandshakeFlow al terminar, con sus registros.
+    """
+    def __init__(self, on_flow=None):
+        self.flows = {}
+        self.on_flow = on_flow
+
+    def feed(self, timestamp, linktype, frame, ref=None):
+        segment = decode_tcp(linktype, frame)
+        if segment is None:
+            return []
+        src = (segment.src, segment.sport)
+        dst = (segment.dst, segment.dport)
+        key = (src, dst) if src < dst else (dst, src)
+        flow = self.flows.get(key)
+
+        if segment.flags & TCP_SYN:
+            if not segment.flags & TCP_ACK:
+                flow = self.flows[key] = HandshakeFlow(src) # Nueva conexión
+                flow.server = dst
+                flow.syn_ts = timestamp
+            elif flow is not None and flow.synack_ts is None:
+                flow.synack_ts = timestamp
+            if flow is not None:
+                flow.direction(src).stream.syn(segment.seq)
+        elif flow is None:
+            if not _starts_client_hello(segment.payload):
+                return []
+            flow = self.flows[key] = HandshakeFlow(src) # Flujo empezado antes de la captura
+            flow.server = dst
+
+        flow.last_seen = timestamp
+        completed = []
+        if segment.payload and not flow.done:
+            flow.direction(src).stream.add(segment.seq, segment.payload, timestamp, ref)
+            if flow.process(src):
+                flow.done = True
+                completed.append(flow.summary())
+                if self.on_flow:
+                    self.on_flow(flow)
+        if segment.flags & (TCP_FIN | TCP_RST):
+            completed.extend(self._close(key))
+        if len(self.flows) > MAX_FLOWS:
+            completed.extend(self.expire(timestamp - FLOW_IDLE_TIMEOUT))
+        return [summary for summary in completed if summary]
+
+    def _close(self, key):
+        flow = self.flows.pop(key, None)
+        if flow is None or flow.done:
+            return []
+        if self.on_flow:
+            self.on_flow(flow)
+        return [flow.summary()]
+
+    def expire(self, before=None):
+        """
+        Cierra los flujos inactivos desde `before` (todos si es None) devolviendo
+        los handshakes incompletos que tuvieran ServerHello.
+        """
+        stale = [key for key, flow in self.flows.items() if before is None or (flow.last_seen or 0) < before]
+        completed = []
+        for key in stale:
+            completed.extend(self._close(key))
+        return [summary for summary in completed if summary]
+
+def _starts_client_hello(payload):
+    return len(payload) >= 6 and payload[0] == TLS_HANDSHAKE and payload[1] == 3 and payload[5] == HS_CLIENT_HELLO
+
+def analyze_capture(path):
+    """
+    Itera los handshakes de una captura en streaming (memoria acotada por flujo).
+    """
+    tracker = HandshakeTracker()
+    for packet in read_packets(path):
+        yield from tracker.feed(packet.timestamp, packet.linktype, packet.data)
+    yield from tracker.expire()
+
+def to_record(handshake, capture=None):
+    """
+    Convierte un handshake en un registro con el esquema del controlador.
+    """
+    negotiated = handshake["negotiated_group"] or "Failed"
+    client_payload = handshake["client_hello_bytes"]
+    overhead_factor = client_payload / 432.0
+    timestamp = handshake["client_hello_ts"]
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat() if timestamp else datetime.now().isoformat(),
+        "algorithm": algorithm_label(negotiated),
+        "supported": handshake["negotiated_group"] is not None and not handshake["alert"],
+        "negotiated_details": f"Capturado (PCAP): {negotiated}",
+        "handshake_latency_ms": handshake["handshake_ms"] or 0,
+        "phase1_key_share_bytes": handshake["client_key_share_bytes"],
+        "phase2_total_bytes": client_payload,
+        "phase2_fragmented": handshake["client_hello_segments"] > 1,
+        "phase2_overhead_factor": round(overhead_factor, 2),
+        "phase3_throughput_req_s": int(1000 / overhead_factor) if overhead_factor > 0 else 0,
+        "source": "PCAP",
+        "capture": os.path.basename(capture) if capture else None,
+        **{key: value for key, value in handshake.items() if key not in ("client_hello_ts", "offered_groups")}
+    }
+
+def is_full_handshake(record):
+    return (record["supported"] and record.get("complete", True)
+            and not record.get("hrr") and not record.get("resumed") and not record.get("alert"))
+
+def summarize_sizes(records):
+    """
+    Medianas de los tamaños medidos por algoritmo y servidor ("ip:puerto"),
+    para sustituir las estimaciones del controlador (ver
+    lab_controller.load_measured_sizes). El vuelo del servidor depende de su
+    cadena de certificados, así que no se mezclan servidores distintos.
+    Solo cuentan handshakes completos de un vuelo: con alerta (grupo rechazado)
+    no hay vuelo del servidor, tras un HelloRetryRequest el ClientHello medido
+    es el segundo, y una reanudación PSK no lleva la cadena de certificados.
+    """
+    by_server = {}
+    for record in records:
+        if is_full_handshake(record):
+            by_server.setdefault(record["algorithm"], {}).setdefault(record.get("server") or "?", []).append(record)
+    return {
+        algorithm: {
+            server: {
+                "samples": len(rows),
+                "phase1_key_share_bytes": int(statistics.median(r["phase1_key_share_bytes"] for r in rows)),
+                "phase2_total_bytes": int(statistics.median(r["phase2_total_bytes"] for r in rows)),
+                "server_flight_bytes": int(statistics.median(r["server_flight_bytes"] for r in rows)),
+                "server_flight_segments": int(statistics.median(r["server_flight_segments"] for r in rows))
+            }
+            for server, rows in servers.items()
+        }
+        for algorithm, servers in by_server.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analizador offline de handshakes TLS 1.3 (pcap/pcapng)")
+    parser.add_argument("captures", nargs="+", help="Ficheros .pcap / .pcapng")
+    parser.add_argument("--output", help="Guardar los registros (esquema del controlador) en este JSON")
+    parser.add_argument("--sizes", default=MEASURED_SIZES_FILE, help="Tamaños medidos por algoritmo y servidor para el controlador")
+    args = parser.parse_args(argv)
+
+    records = []
+    print(f"{'Captura':<40} | {'Grupo':<22} | {'CH (B)':>7} | {'Vuelo S (B)':>11} | {'Seg':>4} | {'HS (ms)':>8}")
+    print("-" * 108)
+    for capture in args.captures:
+        for handshake in analyze_capture(capture):
+            record = to_record(handshake, capture)
+            records.append(record)
+            print(f"{os.path.basename(capture)[:40]:<40} | {str(handshake['negotiated_group']):<22} | "
+                  f"{handshake['client_hello_bytes']:>7} | {handshake['server_flight_bytes']:>11} | "
+                  f"{handshake['server_flight_segments']:>4} | {handshake['handshake_ms'] or 0:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(records, f, indent=4)
+    if args.sizes and records:
+        os.makedirs(os.path.dirname(args.sizes) or ".", exist_ok=True)
+        with open(args.sizes, 'w') as f:
+            json.dump(summarize_sizes(records), f, indent=4)
+        print(f"\nTamaños medidos guardados en {args.sizes}")
+
+if __name__ == "__main__":
+    main()
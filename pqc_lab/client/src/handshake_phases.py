@@ -0,0 +1,211 @@
+import asyncio
+import os
+import re
+import shlex
+import time
+
+# Sonda con desglose por fases: un `openssl s_client -msg` cuya salida se lee
+# línea a línea y se marca con perf_counter al llegar. Cada mensaje TLS que
+# imprime -msg ("<<< TLS 1.3, Handshake [length 007a], ServerHello") fecha una
+# fase, así que la latencia de una sonda se separa en arranque (docker exec),
+# conexión TCP, criptografía del cliente y viaje de ida y vuelta al servidor.
+#
+# s_client escribe con stdio: contra un pipe acumularía toda la salida en un
+# buffer y las marcas llegarían juntas al final. Se le da un terminal (pty
+# local, o `docker exec -t` dentro del contenedor) para que vuelque por líneas.
+
+START_MARK = "PQC_PHASES_START" # Lo imprime el shell justo antes de lanzar openssl
+MESSAGE_LINE = re.compile(r"^(>>>|<<<) [^,]+, Handshake \[length ([0-9a-fA-F]+)\], (\w+)")
+HEX_DUMP_LINE = re.compile(r"^\s+(?:[0-9a-fA-F]{2} )+")
+
+# Marcas: nombre -> (dirección, mensaje). La primera aparición fecha la fase;
+# con HelloRetryRequest hay dos ServerHello y cuenta el segundo (el RTT extra
+# queda en server_hello).
+MARKS = {
+    "client_hello": (">>>", "ClientHello"),
+    "server_hello": ("<<<", "ServerHello"),
+    "certificate": ("<<<", "Certificate"),
+    "server_finished": ("<<<", "Finished"),
+    "client_finished": (">>>", "Finished")
+}
+
+# Fases (columna -> (marca inicial, marca final)), en orden
+PHASES = {
+    "phase_exec_ms": ("spawn", "start"),                        # docker exec + arranque del shell
+    "phase_tcp_connect_ms": ("start", "connect"),               # arranque de openssl + SYN/SYN-ACK
+    "phase_client_hello_ms": ("connect", "client_hello"),       # keygen del cliente
+    "phase_server_hello_ms": ("client_hello", "server_hello"),  # 1 RTT + keygen/encaps del servidor
+    "phase_certificate_ms": ("server_hello", "certificate"),    # descifrado del vuelo del servidor
+    "phase_server_finished_ms": ("certificate", "server_finished"), # verificación de cadena y firma
+    "phase_client_finished_ms": ("server_finished", "client_finished"),
+    "phase_teardown_ms": ("client_finished", "end")             # cierre y fin del proceso
+}
+
+# Atribución: la red incluye el trabajo del servidor durante ese RTT (desde el
+# cliente no se puede separar); la criptografía es la del cliente. La conexión
+# TCP va a sobrecarga: s_client no imprime nada antes de conectar y en el
+# bridge del laboratorio su arranque (configuración, providers) pesa decenas
+# de ms frente a un SYN/SYN-ACK de microsegundos.
+#
+# Certificate y el Finished del servidor solo son criptografía si caben en la
+# ventana inicial del servidor. Con cadenas PQC grandes el vuelo pasa de IW10 y
+# el resto espera a los ACK del cliente: esas fases incluyen un RTT más y se
+# atribuyen a red (ver PhaseTrace.columns). El tamaño del vuelo se cuenta con
+# las longitudes que imprime -msg, sin cabeceras de registro ni de TCP (unas
+# decenas de bytes por mensaje), así que el umbral es aproximado.
+INITIAL_WINDOW_BYTES = 10 * 1460 # IW10 (RFC 6928) con MSS de Ethernet
+FLIGHT_PHASES = {"phase_certificate_ms": "certificate", "phase_server_finished_ms": "server_finished"}
+ATTRIBUTION = {
+    "latency_network_ms": ("phase_server_hello_ms",),
+    "latency_crypto_ms": ("phase_client_hello_ms", "phase_certificate_ms", "phase_server_finished_ms", "phase_client_finished_ms"),
+    "latency_overhead_ms": ("phase_exec_ms", "phase_tcp_connect_ms", "phase_teardown_ms")
+}
+
+def build_phase_command(group, target, prefix=()):
+    """
+    Comando de la sonda: `prefix` vacío ejecuta el openssl local; con
+    ("docker", "exec", contenedor) se añade -t para tener terminal dentro.
+    """
+    prefix = list(prefix)
+    if prefix[:2] == ["docker", "exec"]:
+        prefix.insert(2, "-t")
+    script = (f"echo {START_MARK}; echo Q | openssl s_client -connect {shlex.quote(target)} "
+              f"-groups {shlex.quote(group)} -tls1_3 -msg")
+    return [*prefix, "sh", "-c", script]
+
+class PhaseTrace:
+    """
+    Marcas de tiempo (ms desde el lanzamiento) de una sonda y su salida sin los volcados hexadecimales.
+    """
+    __slots__ = ("marks", "output", "errors", "returncode", "hello_retry", "server_bytes", "flight_bytes")
+
+    def __init__(self):
+        self.marks = {"spawn": 0.0}
+        self.output = []
+        self.errors = ""
+        self.returncode = None
+        self.hello_retry = False
+        self.server_bytes = 0 # Bytes del vuelo del servidor en curso (desde su ServerHello)
+        self.flight_bytes = {} # Marca -> bytes del vuelo del servidor al recibirla
+
+    def feed(self, line, elapsed_ms):
+        line = line.rstrip("\r\n")
+        if line == START_MARK:
+            self.marks.setdefault("start", elapsed_ms)
+            return
+        if HEX_DUMP_LINE.match(line):
+            return
+        self.output.append(line)
+        if line.startswith("CONNECTED("):
+            self.marks.setdefault("connect", elapsed_ms)
+            return
+        message = MESSAGE_LINE.match(line)
+        if not message:
+            return
+        direction, length, name = message.groups()
+        if direction == "<<<":
+            if name == "ServerHello":
+                self.server_bytes = 0 # Tras un HelloRetryRequest empieza otro vuelo
+            self.server_bytes += 4 + int(length, 16) # Cabecera del mensaje + cuerpo
+        for mark, (mark_direction, mark_name) in MARKS.items():
+            if (direction, name) != (mark_direction, mark_name):
+                continue
+            if mark == "client_hello" and mark in self.marks:
+                self.hello_retry = True
+            if mark == "server_hello" and self.hello_retry:
+                self.marks[mark] = elapsed_ms
+            elif mark not in self.marks:
+                self.marks[mark] = elapsed_ms
+                if direction == "<<<":
+                    self.flight_bytes[mark] = self.server_bytes
+
+    @property
+    def text(self):
+        return "\n".join(self.output)
+
+    @property
+    def total_ms(self):
+        return self.marks.get("end", 0.0)
+
+    def columns(self):
+        """
+        Duración de cada fase y su atribución (None si falta alguna marca, p.ej.
+        handshake fallido). Las fases de FLIGHT_PHASES que terminan más allá de
+        INITIAL_WINDOW_BYTES pasan de criptografía a red.
+        """
+        row = {}
+        for column, (first, last) in PHASES.items():
+            if first in self.marks and last in self.marks:
+                row[column] = round(self.marks[last] - self.marks[first], 3)
+            else:
+                row[column] = None
+        beyond_window = [phase for phase, mark in FLIGHT_PHASES.items()
+                         if self.flight_bytes.get(mark, 0) > INITIAL_WINDOW_BYTES]
+        attribution = {column: [phase for phase in phases if phase not in beyond_window]
+                       for column, phases in ATTRIBUTION.items()}
+        attribution["latency_network_ms"] += beyond_window
+        for column, phases in attribution.items():
+            values = [row[phase] for phase in phases]
+            row[column] = round(sum(values), 3) if None not in values else None
+        row["hello_retry"] = self.hello_retry
+        row["server_flight_bytes"] = self.flight_bytes.get("server_finished")
+        return row
+
+async def _open_reader(local_tty):
+    """
+    (stdout para el subproceso, lector asíncrono, fd a cerrar tras lanzarlo).
+    """
+    if not local_tty:
+        return asyncio.subprocess.PIPE, None, None
+    import pty # Solo Unix: el modo docker (-t) no lo necesita y el controlador también corre en Windows
+    master, slave = pty.openpty()
+    reader = asyncio.StreamReader()
+    loop = asyncio.get_running_loop()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(master, 'rb', 0))
+    return slave, reader, slave
+
+async def trace_handshake(group, target, prefix=(), timeout=None):
+    """
+    Lanza la sonda y fecha cada línea al llegar. Devuelve un PhaseTrace
+    (returncode del proceso; el éxito del handshake se juzga por la salida).
+    """
+    command = build_phase_command(group, target, prefix)
+    stdout, reader, slave = await _open_reader(local_tty=not prefix)
+    trace = PhaseTrace()
+    start = time.perf_counter()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=asyncio.subprocess.PIPE if prefix else stdout
+        )
+    finally:
+        if slave is not None:
+            os.close(slave)
+    reader = reader or proc.stdout
+
+    async def read_lines():
+        while True:
+            try:
+                line = await reader.readline()
+            except OSError:
+                return # EIO: el pty se cierra al terminar el proceso
+            if not line:
+                return
+            trace.feed(line.decode('utf-8', errors='ignore'), (time.perf_counter() - start) * 1000)
+
+    async def run():
+        errors = proc.stderr.read() if proc.stderr is not None else asyncio.sleep(0, b"")
+        _, error_output = await asyncio.gather(read_lines(), errors)
+        trace.returncode = await proc.wait()
+        trace.marks["end"] = (time.perf_counter() - start) * 1000
+        trace.errors = error_output.decode('utf-8', errors='ignore')
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return trace
@@ -1,98 +1,131 @@
-import subprocess
+import argparse
+import asyncio
 import json
 import time
 import re
 import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import pqc_engine
-from pqc_engine import CryptoSuite
+import algorithms
+from probe_agent import ProbeAgentPool
+from live_capture import LiveCapture, apply_capture
+import load_generator
+from results_store import ResultsStore
+from control_plane import ControlChannel, CONFIG_FILE
+from probe_cache import ProbeCache, PROBE_CACHE_FILE, client_build, server_fingerprint
+from metrics import Registry, MetricsExporter
+from profiling import Profiler
 
 # CONFIGURACIÓN DEL OBJETIVO
 TARGET_IP = "127.0.0.1" # O la IP de tu contenedor Docker
 TARGET_PORT = "4433"    # Puerto expuesto de Nginx PQC
 OPENSSL_BIN = "openssl" # Ruta a tu binario OQS-OpenSSL
 PCAP_FILE = "captures/handshake.pcap"
-REPORT_FILE = "captures/real_scan_results.json"
+RESULTS_DIR = "captures/results" # Almacén append-only (segmentos NDJSON), ver results_store.py
+DEBUG_DUMP_FILE = "captures/debug_data_dump.json"
+SAMPLE_INTERVAL_S = 5 # Pausa entre ciclos (un cambio de configuración la interrumpe)
+# Tamaños medidos en capturas reales (ver handshake_analyzer.py); sustituyen a las estimaciones
+MEASURED_SIZES_FILE = os.environ.get("PQC_MEASURED_SIZES", "captures/measured_sizes.json")
+# Servidor ("ip:puerto" tal como aparece en la captura) cuyos tamaños se usan; por defecto,
+# el de más muestras en el puerto de pqc_server (su IP en el bridge no se conoce de antemano)
+MEASURED_SIZES_SERVER = os.environ.get("PQC_MEASURED_SERVER")
 
-# Mapeo de nombres Legacy (Dashboard) -> Nombres Técnicos (OpenSSL/Docker)
-GROUP_MAPPING = {
-    "kyber768": "mlkem768",
-    "x25519_kyber768": "X25519MLKEM768",
-    "X25519": "X25519"
-}
+# Modelo de CPU del Motor de Física: "COST" (perfil calibrado, O(1)) o "WORKLOAD" (busy-loop real)
+CPU_MODEL = os.environ.get("PQC_CPU_MODEL", "COST")
+COST_JITTER = float(os.environ.get("PQC_COST_JITTER", "0.05"))
+COST_SEED = os.environ.get("PQC_COST_SEED")
+COST_MODEL = None # Se calibra una sola vez al arrancar (ver main)
 
-def measure_handshake_real(group_name):
+# Monte Carlo: nº de handshakes simulados por grupo y ciclo para estimar P50/P99 (0 = desactivado)
+PHYSICS_RTT_RANGE = (20, 40)
+MC_SAMPLES = int(os.environ.get("PQC_MC_SAMPLES", "0"))
+MC_EXECUTOR = None # Pool de procesos reutilizado entre ciclos
+
+# Sondas reales: concurrencia máxima, timeout por sonda y backoff (exponencial) entre reintentos
+PROBE_CONCURRENCY = int(os.environ.get("PQC_PROBE_CONCURRENCY", "4"))
+PROBE_REPETITIONS = int(os.environ.get("PQC_PROBE_REPETITIONS", "1"))
+PROBE_TIMEOUT = float(os.environ.get("PQC_PROBE_TIMEOUT", "8"))
+PROBE_RETRIES = 3
+PROBE_BACKOFF_S = 0.5
+# "AGENT": agentes persistentes dentro de pqc_client; "EXEC": un docker exec por handshake
+PROBE_BACKEND = os.environ.get("PQC_PROBE_BACKEND", "AGENT")
+PROBE_CONTAINER = "pqc_client"
+PROBE_SERVER = "pqc_server"
+PROBE_SERVER_PORT = "4433"
+HANDSHAKE_FAILURE_MARKERS = ("handshake failure", "no shared cipher") # Rechazo explícito del servidor
+# "WALL": una latencia extremo a extremo por sonda; "PHASES": s_client -msg con marcas por
+# mensaje TLS (handshake_phases.py) para separar red, criptografía y sobrecarga. Usa docker exec.
+PROBE_TIMING = os.environ.get("PQC_PROBE_TIMING", "WALL")
+# Caché de negociación (probe_cache.py): las sondas de latencia no la consultan pero la refrescan;
+# el subcomando `support` la usa para no repetir handshakes
+PROBE_CACHE_TTL_S = float(os.environ.get("PQC_PROBE_CACHE_TTL", "86400"))
+
+# Captura durante las sondas REAL: "OFF", "LIVE" (tcpdump sobre el bridge de pqc_lab_net)
+# o "RING" (ring PCAP_FILE* escrito p.ej. con `tcpdump -U -C 10 -W 5 -w captures/handshake.pcap`; se sigue
+# también el fichero en curso, así que -U hace falta para que cada paquete llegue al disco al capturarse)
+CAPTURE_MODE = os.environ.get("PQC_CAPTURE", "OFF")
+CAPTURE_INTERFACE = os.environ.get("PQC_CAPTURE_IFACE") # Por defecto se resuelve el bridge de la red
+CAPTURE_MATCH_TIMEOUT = 1.0 # s de espera máxima por ciclo a que la captura procese los flujos
+CAPTURE_SLACK_S = 0.5       # Margen de la ventana temporal sonda <-> flujo
+
+# Instrumentación (metrics.py): GET http://127.0.0.1:$PQC_METRICS_PORT/metrics y una
+# instantánea periódica en captures/controller_metrics.json
+METRICS = Registry()
+PROBE_LATENCY = METRICS.histogram("pqc_probe_latency_ms", "Latencia de handshake de cada sonda o simulación", ("algorithm", "source"))
+PROBE_PHASES = METRICS.histogram("pqc_probe_phase_ms", "Duración de cada fase del handshake (PQC_PROBE_TIMING=PHASES)", ("algorithm", "phase"))
+PROBES = METRICS.counter("pqc_probes_total", "Sondas por resultado: ok, unsupported o failed (sin respuesta de Docker)", ("algorithm", "outcome"))
+PROBE_RETRIES_TOTAL = METRICS.counter("pqc_probe_retries_total", "Reintentos de sonda por motivo", ("algorithm", "reason"))
+CYCLE_DURATION = METRICS.histogram("pqc_cycle_duration_ms", "Duración de un ciclo: sondas o simulación más escritura", ("mode",))
+STORE_WRITE = METRICS.histogram("pqc_store_write_ms", "Escritura de un ciclo en el almacén y en el volcado de depuración")
+STORE_ERRORS = METRICS.counter("pqc_store_write_errors_total", "Ciclos cuyos resultados no se pudieron escribir")
+IDLE_WAIT = METRICS.histogram("pqc_idle_wait_ms", "Espera entre ciclos (interval) o en pausa (paused)", ("state",))
+CONFIG_CHANGES = METRICS.counter("pqc_config_changes_total", "Cambios de configuración recibidos por el canal de control")
+DISCARDED_CYCLES = METRICS.counter("pqc_discarded_cycles_total", "Ciclos descartados porque la configuración cambió durante ellos")
+PAUSED = METRICS.gauge("pqc_paused", "1 si la simulación está en pausa")
+
+# Mapeo de nombres Legacy (Dashboard) -> Nombres Técnicos (OpenSSL/Docker), derivado del registro
+GROUP_MAPPING = algorithms.group_mapping()
+
+# Grupos sondeados/simulados en cada ciclo (cualquier KEM del registro con suite asociada)
+TARGET_ALGORITHMS = os.environ.get("PQC_TARGET_GROUPS", "X25519,x25519_kyber768,kyber768").split(",")
+
+def build_probe_command(group_name):
     """
-    Ejecuta un handshake real usando Docker (pqc_client -> pqc_server).
+    Comando docker exec para un handshake con el grupo indicado.
     """
-    print(f"[*] [DOCKER] Probando Grupo: {group_name}...")
-    
     # Resolver nombre técnico para el comando
     technical_name = GROUP_MAPPING.get(group_name, group_name)
     
     # Comando para ejecutar dentro del contenedor cliente
     # openssl s_client -connect pqc_server:4433 -groups ...
-    docker_cmd = [
-        "docker", "exec", "pqc_client", 
+    return [
+        "docker", "exec", PROBE_CONTAINER, 
         "openssl", "s_client",
-        "-connect", "pqc_server:4433",
+        "-connect", f"{PROBE_SERVER}:{PROBE_SERVER_PORT}",
         "-groups", technical_name, # Usar nombre exacto (case-sensitive para OQS a veces)
         "-tls1_3"
     ]
-    
-    start_time = time.perf_counter()
-    
-    # Retry Logic (Max 3 attempts)
-    max_retries = 3
-    result = None
-    
-    for attempt in range(max_retries):
-        try:
-            # Ejecutamos docker exec
-            result = subprocess.run(
-                docker_cmd, 
-                input=b"Q", 
-                capture_output=True, 
-                timeout=8 
-            )
-            
-            # Check if successful execution (return code 0)
-            # Note: OpenSSL s_client might return non-zero on some handshake failures, 
-            # but we check stdout later. Here we care if Docker itself failed.
-            if result.returncode == 0:
-                break # Success, exit loop
-            
-            # If we are here, it might be a transient error
-            time.sleep(1)
-            
-        except Exception as e:
-            if attempt == max_retries - 1:
-                # Last attempt failed, return None
-                return None
-            time.sleep(1)
-            
-    if not result:
-        return None
 
-    end_time = time.perf_counter()
-        
-    output = result.stdout.decode('utf-8', errors='ignore')
-    error_output = result.stderr.decode('utf-8', errors='ignore')
+def parse_probe_output(group_name, returncode, stdout, stderr, latency_ms):
+    """
+    Convierte la salida de un s_client en un registro de resultados (None si Docker falló).
+    """
+    output = stdout.decode('utf-8', errors='ignore')
+    error_output = stderr.decode('utf-8', errors='ignore')
     
     # Combinar outputs para debug si falla
     full_output = output + "\n[STDERR]\n" + error_output
     
     # Si Docker falla o el contenedor no existe, retornamos None para activar fallback
-    if result.returncode != 0 and "Container" in error_output:
+    if returncode != 0 and "Container" in error_output:
         return None
 
     # 3. Análisis Forense del Output
     match_key = re.search(r"Server Temp Key: ([\w_]+)", output)
     negotiated = match_key.group(1) if match_key else "Failed"
     
-    # Métricas Reales
-    latency_ms = (end_time - start_time) * 1000
     # NOTA: No restamos overhead para evitar valores cercanos a 0 en redes rápidas.
     # La latencia incluirá el tiempo de 'docker exec', lo cual es aceptable para 'End-to-End'.
     
@@ -101,51 +134,370 @@ def measure_handshake_real(group_name):
     if not success and "connect:errno" in full_output:
          return None # Fallback si no conecta
 
-    # Tamaños estimados (OQS standard)
-    client_payload = 0
-    group_lower = group_name.lower()
-    
-    if "x25519_kyber768" in group_lower:
-        # Hybrid: X25519(32) + Kyber768(1184) + Header(~200)
-        client_payload = 32 + 1184 + 200
-    elif "kyber768" in group_lower or "mlkem768" in group_lower:
-        # Pure: Kyber768(1184) + Header(~200)
-        client_payload = 1184 + 200
-    elif "dilithium" in group_lower or "mldsa" in group_lower:
-         client_payload = 2500 
+    return build_real_record(group_name, success, negotiated, latency_ms, "REAL_DOCKER", full_output[:500])
+
+_measured_sizes_cache = {"mtime": None, "sizes": {}}
+
+def load_measured_sizes():
+    """
+    Tamaños medidos por algoritmo (medianas del analizador de capturas).
+    Se relee solo cuando cambia el fichero.
+    """
+    try:
+        mtime = os.path.getmtime(MEASURED_SIZES_FILE)
+    except OSError:
+        return {}
+    if mtime != _measured_sizes_cache["mtime"]:
+        try:
+            with open(MEASURED_SIZES_FILE, 'r') as f:
+                _measured_sizes_cache["sizes"] = json.load(f)
+        except (OSError, ValueError):
+            _measured_sizes_cache["sizes"] = {}
+        _measured_sizes_cache["mtime"] = mtime
+    return _measured_sizes_cache["sizes"]
+
+def measured_sizes_for(group_name):
+    """
+    Tamaños medidos del grupo contra pqc_server (None si no hay). Otros
+    servidores de las capturas tienen otra cadena de certificados y otro vuelo.
+    """
+    servers = load_measured_sizes().get(group_name) or {}
+    if "samples" in servers:
+        return None # Formato antiguo: medianas de todos los servidores mezclados
+    if MEASURED_SIZES_SERVER:
+        return servers.get(MEASURED_SIZES_SERVER)
+    candidates = [entry for server, entry in servers.items() if server.rpartition(":")[2] == PROBE_SERVER_PORT]
+    return max(candidates, key=lambda entry: entry["samples"], default=None)
+
+def build_real_record(group_name, success, negotiated, latency_ms, source, raw_output_snippet=None):
+    """
+    Registro de un handshake real: tamaños medidos en capturas de pqc_server
+    si existen, si no los estimados del grupo.
+    """
+    measured = measured_sizes_for(group_name)
+    if measured:
+        client_payload = measured["phase2_total_bytes"]
+        key_share_bytes = measured["phase1_key_share_bytes"]
     else:
-        # Classic: X25519(32) + Header(~200)
-        client_payload = 32 + 200
-        
-    return {
+        # Tamaños estimados: key share del registro + cabeceras (~200 B)
+        kem = algorithms.find_kem(group_name)
+        key_share_bytes = kem.pk if kem else algorithms.get_kem("X25519").pk
+        client_payload = key_share_bytes + 200
+
+    record = {
         "timestamp": datetime.now().isoformat(),
         "algorithm": group_name,
         "supported": success,
         "negotiated_details": f"Negociado (Docker): {negotiated}",
         "handshake_latency_ms": round(latency_ms, 2),
-        "phase1_key_share_bytes": client_payload - 200,
+        "phase1_key_share_bytes": key_share_bytes,
         "phase2_total_bytes": client_payload,
         "phase2_fragmented": client_payload > 1460,
         "phase2_overhead_factor": round(client_payload / 432.0, 2),
-        "phase3_throughput_req_s": int(1000 / (client_payload / 432.0)) if client_payload > 0 else 0,
-        "source": "REAL_DOCKER",
-        "raw_output_snippet": full_output[:500] # Debug info (ampliado)
+        "phase3_throughput_req_s": int(1000 / (client_payload / 432.0)) if client_payload > 0 else 0
+    }
+    if measured:
+        record["server_flight_bytes"] = measured["server_flight_bytes"]
+        record["sizes_source"] = "MEASURED"
+    record["source"] = source
+    record["raw_output_snippet"] = raw_output_snippet # Debug info (ampliado)
+    return record
+
+async def probe_client_build():
+    """
+    Build de openssl en pqc_client sin bloquear el bucle de eventos (client_build lanza un proceso).
+    """
+    return await asyncio.to_thread(client_build, ("docker", "exec", PROBE_CONTAINER))
+
+async def remember_negotiation(cache, group_name, negotiated=None, rejected=False, fingerprint=None):
+    """
+    Deja en la caché de negociación lo que ha visto una sonda contra pqc_server,
+    solo si es una respuesta definitiva (como el escáner): grupo negociado o
+    alerta de handshake failure. Un timeout o una conexión caída no dicen nada
+    de las capacidades del servidor. Devuelve True si se guardó.
+    """
+    if negotiated in (None, "Failed") and not rejected:
+        return False
+    build = await probe_client_build()
+    if build == "unknown":
+        return False
+    technical_name = GROUP_MAPPING.get(group_name, group_name)
+    supported = negotiated not in (None, "Failed")
+    cache.put(PROBE_SERVER, PROBE_SERVER_PORT, technical_name, build, supported,
+              negotiated if supported else None, fingerprint)
+    return True
+
+async def remember_probe_output(cache, group_name, output):
+    """
+    remember_negotiation a partir de la salida completa (stdout + stderr) de un s_client.
+    """
+    negotiated = re.search(r"Server Temp Key: ([\w_]+)", output)
+    rejected = any(marker in output for marker in HANDSHAKE_FAILURE_MARKERS)
+    return await remember_negotiation(cache, group_name, negotiated.group(1) if negotiated else None,
+                                      rejected and negotiated is None, server_fingerprint(output))
+
+async def measure_handshake_real_async(group_name, semaphore=None, timeout=PROBE_TIMEOUT, cache=None):
+    """
+    Ejecuta un handshake real usando Docker (pqc_client -> pqc_server) sin bloquear
+    el bucle de eventos: el timeout es por sonda y el backoff entre reintentos
+    no ocupa hueco de concurrencia. Con `cache`, el resultado de la negociación
+    se guarda en ella (nunca se lee: esto es una medida de latencia).
+    """
+    print(f"[*] [DOCKER] Probando Grupo: {group_name}...")
+    docker_cmd = build_probe_command(group_name)
+    semaphore = semaphore or asyncio.Semaphore(1)
+    
+    # Retry Logic (Max PROBE_RETRIES attempts)
+    returncode, stdout, stderr = None, b"", b""
+    latency_ms = 0
+    
+    for attempt in range(PROBE_RETRIES):
+        try:
+            async with semaphore:
+                start_time = time.perf_counter()
+                proc = await asyncio.create_subprocess_exec(
+                    *docker_cmd,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(input=b"Q"), timeout)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    raise
+                latency_ms = (time.perf_counter() - start_time) * 1000
+                returncode = proc.returncode
+            
+            # Note: OpenSSL s_client might return non-zero on some handshake failures, 
+            # but we check stdout later. Here we care if Docker itself failed.
+            if returncode == 0:
+                break # Success, exit loop
+            reason = "exit_code"
+            
+        except Exception as e:
+            if attempt == PROBE_RETRIES - 1:
+                # Last attempt failed, return None
+                return None
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+        
+        # Backoff exponencial fuera del semáforo: las demás sondas siguen corriendo
+        if attempt < PROBE_RETRIES - 1:
+            PROBE_RETRIES_TOTAL.inc(algorithm=group_name, reason=reason)
+            await asyncio.sleep(PROBE_BACKOFF_S * (2 ** attempt))
+            
+    if returncode is None:
+        return None
+
+    record = parse_probe_output(group_name, returncode, stdout, stderr, latency_ms)
+    if record is not None and cache is not None:
+        # Las alertas TLS van a stderr
+        await remember_probe_output(cache, group_name, (stdout + b"\n" + stderr).decode('utf-8', errors='ignore'))
+    return record
+
+async def measure_handshake_phases_async(group_name, semaphore=None, timeout=PROBE_TIMEOUT, cache=None):
+    """
+    Como measure_handshake_real_async, pero la sonda fecha cada mensaje del
+    handshake y el registro lleva las columnas phase_*_ms y latency_*_ms.
+    """
+    import handshake_phases # Solo en modo PHASES
+    print(f"[*] [FASES] Probando Grupo: {group_name}...")
+    technical_name = GROUP_MAPPING.get(group_name, group_name)
+    semaphore = semaphore or asyncio.Semaphore(1)
+    trace = None
+
+    for attempt in range(PROBE_RETRIES):
+        try:
+            async with semaphore:
+                trace = await handshake_phases.trace_handshake(
+                    technical_name, f"{PROBE_SERVER}:{PROBE_SERVER_PORT}",
+                    prefix=("docker", "exec", PROBE_CONTAINER), timeout=timeout
+                )
+            if trace.returncode == 0:
+                break
+            reason = "exit_code"
+        except Exception as e:
+            if attempt == PROBE_RETRIES - 1:
+                return None
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+        if attempt < PROBE_RETRIES - 1:
+            PROBE_RETRIES_TOTAL.inc(algorithm=group_name, reason=reason)
+            await asyncio.sleep(PROBE_BACKOFF_S * (2 ** attempt))
+
+    if trace is None:
+        return None
+
+    output = trace.text
+    record = parse_probe_output(group_name, trace.returncode, output.encode(), trace.errors.encode(), trace.total_ms)
+    if record is None:
+        return None
+    record["source"] = "REAL_DOCKER_PHASES"
+    record.update(trace.columns())
+    if cache is not None:
+        await remember_probe_output(cache, group_name, output + "\n" + trace.errors)
+    return record
+
+def measure_handshake_real(group_name):
+    """
+    Ejecuta un handshake real usando Docker (pqc_client -> pqc_server).
+    """
+    return asyncio.run(measure_handshake_real_async(group_name))
+
+async def probe_groups_real(group_names, repetitions=1, concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT, cache=None):
+    """
+    Lanza todas las sondas (grupos x repeticiones) a la vez, limitadas por
+    `concurrency`. Devuelve [(grupo, registro o None)] en el orden de entrada.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    probes = [group_name for group_name in group_names for _ in range(repetitions)]
+    measure = measure_handshake_phases_async if PROBE_TIMING == "PHASES" else measure_handshake_real_async
+    results = await asyncio.gather(*(
+        measure(group_name, semaphore, timeout, cache) for group_name in probes
+    ))
+    return list(zip(probes, results))
+
+async def start_agent_pool(size=PROBE_CONCURRENCY):
+    """
+    Arranca los agentes persistentes en pqc_client (None si Docker no responde).
+    """
+    try:
+        return await ProbeAgentPool(size).start()
+    except Exception as e:
+        print(f"[!] Agente de sondeo no disponible ({e}). Usando docker exec por sonda.")
+        return None
+
+async def probe_groups_agent(pool, group_names, repetitions=1, timeout=PROBE_TIMEOUT, cache=None):
+    """
+    Igual que probe_groups_real pero a través de los agentes persistentes: un
+    lote por grupo y latencias medidas dentro del contenedor (sin docker exec).
+    """
+    async def run_batch(group_name):
+        print(f"[*] [AGENTE] Probando Grupo: {group_name} x{repetitions}...")
+        technical_name = GROUP_MAPPING.get(group_name, group_name)
+        try:
+            samples = await pool.probe(technical_name, repetitions, timeout=timeout)
+        except Exception:
+            return [(group_name, None)] * repetitions
+        if cache is not None and samples:
+            # El agente solo informa del grupo negociado: únicamente los positivos son definitivos
+            await remember_negotiation(cache, group_name, samples[-1]["negotiated"])
+        # Como en parse_probe_output: sin conexión la sonda falla (REAL_DOCKER_FAILED), no es un rechazo
+        return [
+            (group_name, build_real_record(
+                group_name, sample["success"], sample["negotiated"], sample["latency_ms"], "REAL_DOCKER_AGENT"
+            ) if sample["success"] or sample["connected"] else None)
+            for sample in samples
+        ]
+
+    batches = await asyncio.gather(*(run_batch(group_name) for group_name in group_names))
+    return [probe for batch in batches for probe in batch]
+
+def start_capture():
+    """
+    Arranca la captura en segundo plano (None si no está activada o no es posible).
+    """
+    if CAPTURE_MODE not in ("LIVE", "RING"):
+        return None
+    try:
+        if CAPTURE_MODE == "RING":
+            capture = LiveCapture(ring_pattern=PCAP_FILE + "*").start()
+        else:
+            capture = LiveCapture(interface=CAPTURE_INTERFACE).start()
+        print(f"[*] Captura {CAPTURE_MODE} activa ({capture.interface or capture.ring_pattern})")
+        return capture
+    except Exception as e:
+        print(f"[!] Captura no disponible ({e}). Se usan tamaños estimados.")
+        return None
+
+def enrich_with_capture(capture, probes, started_at, finished_at):
+    """
+    Casa cada sonda del ciclo con su flujo capturado y sustituye los tamaños
+    estimados por los medidos. La espera total está acotada por ciclo.
+    """
+    deadline = time.time() + CAPTURE_MATCH_TIMEOUT
+    matched = 0
+    for group_name, record in probes:
+        if record is None:
+            continue
+        handshake = capture.match(
+            GROUP_MAPPING.get(group_name, group_name),
+            started_at - CAPTURE_SLACK_S, finished_at + CAPTURE_SLACK_S,
+            timeout=max(0.0, deadline - time.time())
+        )
+        if handshake:
+            apply_capture(record, handshake)
+            matched += 1
+    return matched
+
+def build_failed_record(group_name):
+    # Si falla, registramos el error explícitamente
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "algorithm": group_name,
+        "supported": False,
+        "negotiated_details": "ERROR: Conexión Docker Fallida",
+        "handshake_latency_ms": 0,
+        "phase1_key_share_bytes": 0,
+        "phase2_total_bytes": 0,
+        "phase2_fragmented": False,
+        "phase2_overhead_factor": 0,
+        "phase3_throughput_req_s": 0,
+        "source": "REAL_DOCKER_FAILED"
     }
 
-    # except Exception as e:
-    #     # print(f"[!] Error Docker {group_name}: {e}")
-    #     return None
-    return None # Should be unreachable if logic is correct, but safe fallback
+def observe_probes(probes):
+    """
+    Lleva al registro de métricas el resultado de las sondas de un ciclo ([(grupo, registro o None)]).
+    """
+    for group_name, record in probes:
+        if record is None:
+            PROBES.inc(algorithm=group_name, outcome="failed")
+            continue
+        PROBES.inc(algorithm=group_name, outcome="ok" if record["supported"] else "unsupported")
+        PROBE_LATENCY.observe(record["handshake_latency_ms"], algorithm=group_name, source=record["source"])
+        for column, value in record.items():
+            # Columnas de handshake_phases.PHASES (solo en registros de PQC_PROBE_TIMING=PHASES)
+            if column.startswith("phase_") and column.endswith("_ms") and value is not None:
+                PROBE_PHASES.observe(value, algorithm=group_name, phase=column[len("phase_"):-len("_ms")])
+
+def wait_for_config(control, version, state, timeout=None):
+    """
+    control.wait contabilizado: tiempo de espera y cambios de configuración recibidos.
+    """
+    with IDLE_WAIT.time(state=state):
+        new_version, config = control.wait(version, timeout)
+    if new_version != version:
+        CONFIG_CHANGES.inc()
+    return new_version, config
 
 def measure_handshake_physics(group_name, suite):
     """
     Fallback al Motor de Física si no hay servidor real.
     """
     print(f"[*] [PHYSICS] Simulando Grupo: {group_name}...")
-    link_rtt = random.uniform(20, 40)
-    result = pqc_engine.run_network_simulation(suite, link_rtt)
+    global MC_EXECUTOR
+    
+    link_rtt = random.uniform(*PHYSICS_RTT_RANGE)
+    result = pqc_engine.run_network_simulation(suite, link_rtt, cost_model=COST_MODEL)
+    profile = pqc_engine.get_suite_profile(suite) # Tamaños precalculados por suite
+    
+    overhead_factor = profile["server_payload_size"] / 432.0
     
-    overhead_factor = result["metrics"]["server_payload_size"] / 432.0
+    distribution = {}
+    if MC_SAMPLES > 0:
+        # Distribución agregada (cuantiles) de MC_SAMPLES handshakes en todos los cores
+        if MC_EXECUTOR is None:
+            MC_EXECUTOR = ProcessPoolExecutor()
+        summary = pqc_engine.run_monte_carlo(
+            [suite], MC_SAMPLES, rtt_range=PHYSICS_RTT_RANGE,
+            cost_model=COST_MODEL, executor=MC_EXECUTOR
+        )[suite]
+        distribution = {
+            "mc_samples": summary["count"],
+            "latency_p50_ms": round(summary["quantiles"]["p50"], 2),
+            "latency_p99_ms": round(summary["quantiles"]["p99"], 2)
+        }
     
     return {
         "timestamp": datetime.now().isoformat(),
@@ -153,132 +505,280 @@ def measure_handshake_physics(group_name, suite):
         "supported": True,
         "negotiated_details": f"Simulado: {group_name}",
         "handshake_latency_ms": round(result["total_latency_ms"], 2),
-        "phase1_key_share_bytes": result["metrics"]["key_share_size"],
-        "phase2_total_bytes": result["metrics"]["client_payload_size"],
+        "phase1_key_share_bytes": profile["key_share_size"],
+        "phase2_total_bytes": profile["client_payload_size"],
         "phase2_fragmented": result["fragmentation_risk"],
         "phase2_overhead_factor": round(overhead_factor, 2),
         "phase3_throughput_req_s": int(1000 / overhead_factor) if overhead_factor > 0 else 0,
-        "source": "PHYSICS_ENGINE"
+        "source": "PHYSICS_ENGINE",
+        **distribution
     }
 
-def main():
+def shutdown(loop, agent_pool, capture, control, exporter):
+    """
+    Libera lo que main deja en marcha entre ciclos: agentes de sondeo, captura,
+    pool de Monte Carlo, canal de control y exportador de métricas.
+    """
+    global MC_EXECUTOR
+
+    pending = asyncio.all_tasks(loop)
+    for task in pending: # Sondas interrumpidas a medias (Ctrl-C dentro de run_until_complete)
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    if agent_pool is not None:
+        loop.run_until_complete(agent_pool.close())
+    loop.close()
+    if capture is not None:
+        capture.stop()
+    if MC_EXECUTOR is not None:
+        MC_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        MC_EXECUTOR = None
+    control.close()
+    exporter.close()
+
+def main(profile=False):
+    global COST_MODEL
+
     # Asegurar directorio
     os.makedirs("captures", exist_ok=True)
+
+    if CPU_MODEL == "COST":
+        # Calibración única (o carga del perfil en disco): coste O(1) por handshake simulado
+        COST_MODEL = pqc_engine.CostModel.load_or_calibrate(
+            pqc_engine.COST_PROFILE_FILE,
+            jitter=COST_JITTER,
+            seed=int(COST_SEED) if COST_SEED else None
+        )
+        print(f"[*] Modelo de costes CPU cargado: {pqc_engine.COST_PROFILE_FILE}")
     
-    # Grupos a probar
-    # NOTA: Usamos los nombres estándar de OQS para asegurar compatibilidad con la imagen Docker
-    TARGET_GROUPS = [
-        ("X25519", CryptoSuite.CLASSIC),          # Clásico
-        ("x25519_kyber768", CryptoSuite.HYBRID),  # Híbrido (Nombre Legacy para Dashboard)
-        ("kyber768", CryptoSuite.PURE)            # PQC Puro (Nombre Legacy para Dashboard)
-    ]
+    # Grupos a probar (nombre Legacy para el Dashboard, suite del registro para el Motor)
+    TARGET_GROUPS = []
+    for group_name in TARGET_ALGORITHMS:
+        suite = algorithms.suite_for_algorithm(group_name)
+        if suite is None:
+            print(f"[!] Grupo sin suite en el registro de algoritmos: {group_name}")
+            continue
+        TARGET_GROUPS.append((group_name, suite.name))
+    if not TARGET_GROUPS:
+        raise SystemExit(f"[!] Ningún grupo de PQC_TARGET_GROUPS ({','.join(TARGET_ALGORITHMS)}) está en el registro "
+                         f"de algoritmos: no hay nada que medir")
 
     print("--- INICIANDO CONTROLADOR DE LABORATORIO REAL (HÍBRIDO) ---")
     
-    CONFIG_FILE = "lab_config.json"
+    # Canal de control: los cambios del dashboard llegan por socket (sin sondear el fichero)
+    control = ControlChannel(CONFIG_FILE).start()
+    print(f"[*] Canal de control: {control.transport}")
+    version, config = control.snapshot()
+    
+    exporter = MetricsExporter(METRICS).start()
+    if exporter.server is not None:
+        print(f"[*] Métricas: http://{exporter.host}:{exporter.port}/metrics (instantánea en {exporter.snapshot_path})")
+    
+    # Perfilado opcional (PQC_PROFILE o --profile): una captura por ciclo en captures/profiles/
+    profiler = Profiler.from_env("lab_controller", profile)
+    if profiler is not None:
+        print(f"[*] Perfilado activo (CPU: {profiler.cpu}, memoria: {profiler.memory}) -> {profiler.output_dir}")
+    
+    # Bucle de eventos persistente: los agentes de sondeo viven entre ciclos
+    loop = asyncio.new_event_loop()
+    agent_pool = None
+    capture = None
+    
+    store = ResultsStore(RESULTS_DIR)
+    probe_cache = ProbeCache(ttl_s=PROBE_CACHE_TTL_S)
     
     # Inicialización de estado
     current_mode = "PHYSICS"
     is_paused = False
     last_mode = "PHYSICS"
     
-    while True:
-        # 1. Leer Configuración (Modo Estricto y Pausa)
-        # Intentar leer varias veces para evitar condiciones de carrera
-        for _ in range(5):
-            try:
-                if os.path.exists(CONFIG_FILE):
-                    with open(CONFIG_FILE, 'r') as f:
-                        content = f.read()
-                        if content.strip():
-                            config = json.loads(content)
-                            new_mode = config.get("mode")
-                            if new_mode in ["REAL", "PHYSICS"]:
-                                current_mode = new_mode
-                            is_paused = config.get("paused", is_paused)
-                            break 
-            except Exception:
-                time.sleep(0.1)
+    try:
+        while True:
+            # 1. Configuración publicada (Modo Estricto y Pausa): siempre completa, se publica con os.replace
+            if config.get("mode") in ["REAL", "PHYSICS"]:
+                current_mode = config["mode"]
+            is_paused = config.get("paused", is_paused)
         
-        # Detectar cambio de modo y reiniciar estado
-        if current_mode != last_mode:
-            print(f"[*] Cambio de modo detectado: {last_mode} -> {current_mode}. Reiniciando estado...")
-            results = [] # Limpiar memoria
-            last_mode = current_mode
-            # Opcional: Esperar un momento para asegurar que el dashboard haya limpiado el archivo
-            time.sleep(1) 
-            continue # Reiniciar bucle con nuevo modo limpio
+            # Detectar cambio de modo y reiniciar estado
+            if current_mode != last_mode:
+                print(f"[*] Cambio de modo detectado: {last_mode} -> {current_mode}. Reiniciando estado...")
+                last_mode = current_mode
         
-        if is_paused:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Simulación PAUSADA...")
-            time.sleep(2)
-            continue
+            PAUSED.set(1 if is_paused else 0)
+            if is_paused:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Simulación PAUSADA...")
+                version, config = wait_for_config(control, version, "paused") # Bloquea sin CPU hasta el siguiente cambio
+                continue
         
-        results = []
-        # Cargar histórico
-        if os.path.exists(REPORT_FILE):
-            try:
-                with open(REPORT_FILE, 'r') as f:
-                    content = f.read()
-                    if content:
-                        results = json.loads(content)
-            except: pass
-
-        # Ejecutar ronda de pruebas
-        active_scenarios = random.sample(TARGET_GROUPS, k=random.randint(1, len(TARGET_GROUPS)))
+            cycle_start = time.perf_counter()
+            if profiler is not None:
+                profiler.start(f"ciclo {current_mode}")
+            results = [] # Solo las filas nuevas de este ciclo
+
+            # Ejecutar ronda de pruebas
+            active_scenarios = random.sample(TARGET_GROUPS, k=random.randint(1, len(TARGET_GROUPS)))
         
-        for group_name, suite in active_scenarios:
-            data = None
-            
             if current_mode == "REAL":
-                # MODO REAL ESTRICTO: Solo Docker
-                data = measure_handshake_real(group_name)
-                if not data:
-                    # Si falla, registramos el error explícitamente
-                    data = {
-                        "timestamp": datetime.now().isoformat(),
-                        "algorithm": group_name,
-                        "supported": False,
-                        "negotiated_details": "ERROR: Conexión Docker Fallida",
-                        "handshake_latency_ms": 0,
-                        "phase1_key_share_bytes": 0,
-                        "phase2_total_bytes": 0,
-                        "phase2_fragmented": False,
-                        "phase2_overhead_factor": 0,
-                        "phase3_throughput_req_s": 0,
-                        "source": "REAL_DOCKER_FAILED"
-                    }
+                # MODO REAL ESTRICTO: Solo Docker (todas las sondas en paralelo)
+                group_names = [group_name for group_name, _ in active_scenarios]
+                # El desglose por fases necesita leer la salida de cada s_client: sin agentes
+                if PROBE_BACKEND == "AGENT" and PROBE_TIMING != "PHASES" and agent_pool is None:
+                    agent_pool = loop.run_until_complete(start_agent_pool())
+                if capture is None:
+                    capture = start_capture()
+                started_at = time.time()
+                if agent_pool is not None:
+                    probes = loop.run_until_complete(probe_groups_agent(agent_pool, group_names, PROBE_REPETITIONS, cache=probe_cache))
+                else:
+                    probes = loop.run_until_complete(probe_groups_real(group_names, repetitions=PROBE_REPETITIONS, cache=probe_cache))
+                probe_cache.save()
+                if capture is not None:
+                    if capture.error:
+                        print(f"[!] Captura detenida ({capture.error}). Se usan tamaños estimados.")
+                        capture.stop()
+                        capture = None
+                    else:
+                        matched = enrich_with_capture(capture, probes, started_at, time.time())
+                        print(f"[*] Captura: {matched}/{len(probes)} sondas con bytes medidos (descartados: {capture.dropped_packets})")
+                observe_probes(probes)
+                for group_name, data in probes:
+                    results.append(data or build_failed_record(group_name))
             else:
                 # MODO FÍSICA ESTRICTO: Solo Motor
-                data = measure_handshake_physics(group_name, suite)
-            
-            if data:
-                results.append(data)
-        
-        # Mantener solo los últimos 2000 registros
-        results = results[-2000:]
+                for group_name, suite in active_scenarios:
+                    data = measure_handshake_physics(group_name, suite)
+                    if data:
+                        observe_probes([(group_name, data)])
+                        results.append(data)
         
-        # Mantener solo los últimos 2000 registros
-        results = results[-2000:]
+            # Si la configuración cambió durante el ciclo (STOP, o START que ya vació el almacén),
+            # sus filas pertenecen a la ejecución anterior
+            if control.version != version:
+                print("[*] Configuración cambiada durante el ciclo: se descartan sus resultados")
+                DISCARDED_CYCLES.inc()
+                CONFIG_CHANGES.inc()
+                if profiler is not None:
+                    profiler.stop()
+                version, config = control.snapshot()
+                continue
         
-        # Guardar para que el Frontend lo lea
-        try:
-            with open(REPORT_FILE, 'w') as f:
-                json.dump(results, f, indent=4)
+            # Guardar para que el Frontend lo lea (append-only: coste O(filas nuevas))
+            total_records = 0
+            write_start = time.perf_counter()
+            try:
+                total_records = store.append(results)
                 
-            # DEBUG DUMP: Guardar copia cruda para el usuario
-            with open("captures/debug_data_dump.json", "w") as f:
-                json.dump({
-                    "timestamp": datetime.now().isoformat(),
-                    "total_records": len(results),
-                    "last_5_records": results[-5:]
-                }, f, indent=4)
+                # DEBUG DUMP: Guardar copia cruda para el usuario
+                tmp_dump = DEBUG_DUMP_FILE + ".tmp"
+                with open(tmp_dump, "w") as f:
+                    json.dump({
+                        "timestamp": datetime.now().isoformat(),
+                        "total_records": total_records,
+                        "last_5_records": results[-5:]
+                    }, f, indent=4)
+                os.replace(tmp_dump, DEBUG_DUMP_FILE)
                 
-        except Exception as e:
-            print(f"Error escribiendo JSON: {e}")
+            except Exception as e:
+                STORE_ERRORS.inc()
+                print(f"Error escribiendo resultados: {e}")
+            STORE_WRITE.observe((time.perf_counter() - write_start) * 1000)
+            CYCLE_DURATION.observe((time.perf_counter() - cycle_start) * 1000, mode=current_mode)
+            if profiler is not None:
+                profiler.stop()
             
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Ciclo completado. Registros: {len(results)}")
-        time.sleep(5) # Muestreo cada 5s
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Ciclo completado. Registros: {total_records}")
+            version, config = wait_for_config(control, version, "interval", timeout=SAMPLE_INTERVAL_S) # Muestreo cada 5s, o antes si cambia la configuración
+    finally:
+        # Ctrl-C o error: no dejar agentes `docker exec -i`, tcpdump ni procesos del pool vivos
+        shutdown(loop, agent_pool, capture, control, exporter)
+
+async def check_group_support(group_name, cache, refresh=False, timeout=PROBE_TIMEOUT):
+    """
+    Soporte de un grupo en pqc_server: de la caché si hay una entrada vigente,
+    si no con un handshake (que la actualiza). None si no hay respuesta
+    definitiva (Docker no responde, timeout, conexión caída).
+    """
+    technical_name = GROUP_MAPPING.get(group_name, group_name)
+    build = await probe_client_build()
+    entry = None if refresh else cache.get(PROBE_SERVER, PROBE_SERVER_PORT, technical_name, build)
+    if entry is not None:
+        return dict(entry, cached=True)
+    started = time.time()
+    if await measure_handshake_real_async(group_name, timeout=timeout, cache=cache) is None:
+        return None
+    build = await probe_client_build() # Puede resolverse ahora si antes Docker no respondía
+    entry = cache.peek(PROBE_SERVER, PROBE_SERVER_PORT, technical_name, build)
+    if entry is None or entry["checked_at"] < started:
+        return None
+    return dict(entry, cached=False)
+
+def run_support(args):
+    """
+    Subcomando `support`: qué grupos negocia pqc_server, sin repetir handshakes ya conocidos.
+    """
+    cache = ProbeCache(args.cache, ttl_s=args.ttl)
+    group_names = args.groups or TARGET_ALGORITHMS
+
+    async def check_all():
+        return await asyncio.gather(*(check_group_support(name, cache, args.refresh) for name in group_names))
+
+    entries = asyncio.run(check_all())
+    cache.save()
+    print(f"\n{'Grupo':<18} | {'Soportado':<9} | {'Negociado':<22} | {'Huella servidor':<16} | Origen")
+    print("-" * 85)
+    for name, entry in zip(group_names, entries):
+        if entry is None:
+            print(f"{name:<18} | {'?':<9} | {'(sin respuesta definitiva)':<22} |")
+            continue
+        origin = "caché" if entry["cached"] else "handshake"
+        print(f"{name:<18} | {'sí' if entry['supported'] else 'no':<9} | {entry['negotiated'] or '-':<22} | "
+              f"{entry['fingerprint'] or '-':<16} | {origin}")
+    print(f"\n[*] Caché {cache.path}: {cache.hits} aciertos, {cache.misses} fallos")
+
+def run_loadgen(args):
+    """
+    Subcomando `loadgen`: benchmark de handshakes/s por grupo contra pqc_server.
+    """
+    group_names = args.groups or TARGET_ALGORITHMS
+    groups = {name: GROUP_MAPPING.get(name, name) for name in group_names}
+    levels = [int(level) for level in args.levels.split(",")]
+    results = asyncio.run(load_generator.run_load_test(groups, levels, args.duration, args.timeout))
+    load_generator.save_results(results, args.output, levels=levels, duration_s=args.duration)
+
+    print(f"\n{'Grupo':<18} | {'Pico HS/s':>9} | {'c':>3} | {'CPU ms/HS':>9} | {'HS/s/core':>9} | {'P50':>6} | {'P99':>6}")
+    print("-" * 80)
+    for name, result in results.items():
+        print(f"{name:<18} | {result['peak_hs_per_s']:>9.1f} | {result['peak_concurrency']:>3} | "
+              f"{result['cpu_ms_per_handshake'] or 0:>9.3f} | {result['hs_per_s_per_core'] or 0:>9.1f} | "
+              f"{result['p50_ms'] or 0:>6.1f} | {result['p99_ms'] or 0:>6.1f}")
+    print(f"\n[OK] Resultados guardados en {args.output} (Pestaña 4 del dashboard)")
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Controlador del laboratorio PQC")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfilar cada ciclo en captures/profiles/ (como PQC_PROFILE; el modo cpu/mem/all se toma de ella)")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser("run", help="Bucle de sondas/simulación (por defecto)")
+    loadgen = subcommands.add_parser("loadgen", help="Benchmark de handshakes/s sostenidos contra pqc_server")
+    loadgen.add_argument("--groups", nargs="+", help=f"Grupos (por defecto: {', '.join(TARGET_ALGORITHMS)})")
+    loadgen.add_argument("--levels", default=",".join(str(c) for c in load_generator.DEFAULT_LEVELS), help="Rampa de concurrencia")
+    loadgen.add_argument("--duration", type=float, default=load_generator.DEFAULT_DURATION_S, help="Segundos por nivel")
+    loadgen.add_argument("--timeout", type=float, default=30, help="Timeout por lote (s)")
+    loadgen.add_argument("--output", default=load_generator.LOADGEN_FILE)
+    support = subcommands.add_parser("support", help="Grupos soportados por pqc_server (con caché de negociación)")
+    support.add_argument("--groups", nargs="+", help=f"Grupos (por defecto: {', '.join(TARGET_ALGORITHMS)})")
+    support.add_argument("--refresh", action="store_true", help="Ignorar la caché y repetir los handshakes")
+    support.add_argument("--ttl", type=float, default=PROBE_CACHE_TTL_S, help="Validez de una entrada (s)")
+    support.add_argument("--cache", default=PROBE_CACHE_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "loadgen":
+        run_loadgen(args)
+    elif args.command == "support":
+        run_support(args)
+    else:
+        main(profile=args.profile)
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+from pqc_engine import LatencyHistogram
+
+class AlgorithmStats:
+    """
+    Agregados de un algoritmo: muestras, éxitos y distribución de latencia
+    (histograma logarítmico: media exacta y cuantiles con ~1% de error).
+    """
+    def __init__(self):
+        self.count = 0
+        self.supported = 0
+        self.total_bytes = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, latencies_ms, supported, total_bytes):
+        latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+        self.count += int(latencies_ms.size)
+        self.supported += int(np.count_nonzero(supported))
+        self.total_bytes += int(np.sum(total_bytes))
+        self.latency.add(latencies_ms)
+
+    def merge(self, other):
+        self.count += other.count
+        self.supported += other.supported
+        self.total_bytes += other.total_bytes
+        self.latency.merge(other.latency)
+        return self
+
+    @property
+    def success_rate(self):
+        return self.supported / self.count * 100 if self.count else 0.0
+
+    @property
+    def mean_bytes(self):
+        return self.total_bytes / self.count if self.count else 0.0
+
+    @property
+    def mean_latency_ms(self):
+        return self.latency.mean
+
+    def quantile(self, q):
+        return self.latency.quantile(q)
+
+def _column(frame, name, default):
+    if name not in frame.columns:
+        return pd.Series(default, index=frame.index)
+    return frame[name].fillna(default)
+
+class StatsTable:
+    """
+    Estadísticas por algoritmo mantenidas de forma incremental: cada lote de
+    filas nuevas se agrega una sola vez y las pestañas solo combinan agregados.
+    Se descarta entera cuando cambia la versión de los datos (reset del almacén).
+    """
+    def __init__(self):
+        self.by_algorithm = {}
+
+    def update(self, frame):
+        if frame.empty or 'algorithm' not in frame.columns:
+            return
+        frame = frame[frame['algorithm'].notna()]
+        # Filas antiguas o parciales del almacén pueden no traer todas las columnas
+        latencies = _column(frame, 'handshake_latency_ms', 0).to_numpy(dtype=np.float64)
+        supported = _column(frame, 'supported', False).to_numpy(dtype=bool)
+        total_bytes = _column(frame, 'phase2_total_bytes', 0).to_numpy(dtype=np.int64)
+        algorithms = frame['algorithm'].to_numpy()
+        for algorithm in np.unique(algorithms):
+            mask = algorithms == algorithm
+            self.by_algorithm.setdefault(algorithm, AlgorithmStats()).add(latencies[mask], supported[mask], total_bytes[mask])
+
+    def combined(self, algorithms=None):
+        """
+        Agregado de varios algoritmos (todos si `algorithms` es None).
+        """
+        result = AlgorithmStats()
+        for algorithm, stats in self.by_algorithm.items():
+            if algorithms is None or algorithm in algorithms:
+                result.merge(stats)
+        return result
+
+    def grouped(self, key, algorithms=None):
+        """
+        Agregados por etiqueta: {key(algoritmo): AlgorithmStats}.
+        """
+        groups = {}
+        for algorithm, stats in self.by_algorithm.items():
+            if algorithms is None or algorithm in algorithms:
+                groups.setdefault(key(algorithm), AlgorithmStats()).merge(stats)
+        return groups
+
+def _padded(column, capacity):
+    """
+    La columna con hueco hasta `capacity` filas sin cambiar su dtype: reindex
+    rellenaría con NaN y convertiría int en float64 y bool en object.
+    """
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in "iub":
+        values = np.zeros(capacity, dtype=column.dtype)
+        values[:len(column)] = column.to_numpy()
+        return pd.Series(values, name=column.name)
+    return column.reindex(pd.RangeIndex(capacity))
+
+def _missing(column, count):
+    # Lo que pandas pondría en filas sin esa columna (NaN: int -> float64, bool -> object)
+    return column.iloc[:0].reindex(pd.RangeIndex(count))
+
+class FrameBuffer:
+    """
+    DataFrame acumulado con capacidad que se duplica al llenarse: añadir un
+    lote escribe en su sitio (coste O(filas nuevas) amortizado) en lugar de
+    copiar todo el histórico con pd.concat en cada rerun. Los dtypes son los
+    de pd.DataFrame(todas las filas), como en la carga completa.
+    """
+    def __init__(self, capacity=1024):
+        self.initial_capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.buffer = pd.DataFrame()
+        self.size = 0
+        self._frame = None
+
+    def append(self, rows):
+        count = len(rows)
+        if not count:
+            return
+        self._frame = None
+        end = self.size + count
+        if end > len(self.buffer):
+            # Crecimiento: única copia del histórico, cada vez que se duplica la capacidad
+            capacity = max(self.initial_capacity, 2 * len(self.buffer), end)
+            grown = pd.concat([self.buffer.iloc[:self.size], rows], ignore_index=True) if self.size else rows.reset_index(drop=True)
+            self.buffer = pd.DataFrame({column: _padded(grown[column], capacity) for column in grown.columns})
+            self.size = end
+            return
+        for column in rows.columns:
+            if column not in self.buffer.columns:
+                self.buffer[column] = _missing(rows[column], len(self.buffer))
+        for column in self.buffer.columns:
+            values = rows[column] if column in rows.columns else _missing(self.buffer[column], count)
+            current = self.buffer[column]
+            if values.dtype != current.dtype:
+                # Mismo dtype que daría pd.concat (p.ej. int + NaN -> float64): solo cuando cambia
+                dtype = pd.concat([current.iloc[:1], values.iloc[:1]], ignore_index=True).dtype
+                if dtype != current.dtype:
+                    self.buffer[column] = current.astype(dtype)
+            position = self.buffer.columns.get_loc(column)
+            try:
+                self.buffer.iloc[self.size:end, position] = values.to_numpy()
+            except (TypeError, ValueError):
+                # Tipos que no encajan pese al dtype común (p.ej. texto en una columna datetime)
+                self.buffer[column] = self.buffer[column].astype(object)
+                self.buffer.iloc[self.size:end, position] = values.to_numpy()
+        self.size = end
+
+    def frame(self):
+        """
+        Filas ocupadas como vista del búfer (sin copiar el histórico), la misma
+        hasta el siguiente append. Con Copy-on-Write (por defecto en pandas 3)
+        modificarla no toca el búfer; sin él, es de solo lectura.
+        """
+        if self._frame is None:
+            self._frame = self.buffer.iloc[:self.size]
+        return self._frame
@@ -0,0 +1,222 @@
+import glob
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+from pcap_reader import iter_packets, read_packets, PcapTail
+from handshake_analyzer import HandshakeTracker, FLOW_IDLE_TIMEOUT
+
+# Captura en vivo mientras corren las sondas: esnifa el bridge de pqc_lab_net
+# (tcpdump -w -) o lee un ring-buffer de pcaps rotados, y casa cada sonda con
+# su flujo para registrar los bytes/segmentos/tiempos reales del handshake.
+
+CAPTURE_NETWORK = "pqc_lab_net"
+CAPTURE_FILTER = "tcp port 4433"
+MAX_QUEUED_PACKETS = 8192 # Paquetes pendientes de parsear (si se llena se descartan, nunca se bloquea)
+MAX_HANDSHAKES = 1024     # Handshakes completados a la espera de casar con una sonda
+RING_POLL_INTERVAL = 0.5  # s
+
+def bridge_interface(network=CAPTURE_NETWORK):
+    """
+    Interfaz del bridge de una red Docker: `br-` + 12 primeros caracteres del ID
+    (o el nombre fijado con com.docker.network.bridge.name). Si no hay red con
+    ese nombre, se busca la que Compose creó con prefijo de proyecto
+    (`<proyecto>_pqc_lab_net`) por su etiqueta com.docker.compose.network.
+    """
+    try:
+        interface = _inspect_network(network)
+    except subprocess.CalledProcessError:
+        candidates = subprocess.run(
+            ["docker", "network", "ls", "-q", "--filter", f"label=com.docker.compose.network={network}"],
+            capture_output=True, text=True, timeout=10, check=True
+        ).stdout.split()
+        if len(candidates) != 1:
+            raise RuntimeError(f"Red Docker {network} no encontrada ({len(candidates)} candidatas por etiqueta); "
+                               f"fija PQC_CAPTURE_IFACE")
+        interface = _inspect_network(candidates[0])
+    return interface
+
+def _inspect_network(network):
+    output = subprocess.run(
+        ["docker", "network", "inspect", "-f",
+         '{{index .Options "com.docker.network.bridge.name"}} {{.Id}}', network],
+        capture_output=True, text=True, timeout=10, check=True
+    ).stdout.split()
+    if len(output) == 2 and output[0] != "<no":
+        return output[0]
+    return "br-" + output[-1][:12]
+
+class LiveCapture:
+    """
+    Dos hilos en segundo plano: el lector vacía la fuente de paquetes en una
+    cola acotada (descartando si se llena) y el analizador alimenta el
+    HandshakeTracker y deja los handshakes completos en un buffer acotado.
+    Las sondas no esperan nunca a la captura salvo en `match`.
+    """
+    def __init__(self, interface=None, ring_pattern=None, bpf_filter=CAPTURE_FILTER):
+        self.interface = interface
+        self.ring_pattern = ring_pattern
+        self.bpf_filter = bpf_filter
+        self.packets = queue.Queue(maxsize=MAX_QUEUED_PACKETS)
+        self.handshakes = deque(maxlen=MAX_HANDSHAKES)
+        self.condition = threading.Condition()
+        self.stopping = threading.Event()
+        self.proc = None
+        self.threads = []
+        self.dropped_packets = 0
+        self.seen_packets = 0
+        self.error = None
+
+    def start(self):
+        if self.ring_pattern:
+            source = self._read_ring
+        else:
+            self.interface = self.interface or bridge_interface()
+            self.proc = subprocess.Popen(
+                ["tcpdump", "-i", self.interface, "-U", "-s", "0", "-w", "-", self.bpf_filter],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            source = self._read_pipe
+        self.threads = [
+            threading.Thread(target=self._guard, args=(source,), name="capture-reader", daemon=True),
+            threading.Thread(target=self._guard, args=(self._analyze,), name="capture-analyzer", daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _guard(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = e # Se informa en el controlador; la captura nunca tumba las sondas
+        finally:
+            self.stopping.set()
+
+    def _enqueue(self, packet):
+        self.seen_packets += 1
+        try:
+            self.packets.put_nowait((packet.timestamp, packet.linktype, bytes(packet.data)))
+        except queue.Full:
+            self.dropped_packets += 1
+
+    def _read_pipe(self):
+        for packet in iter_packets(self.proc.stdout):
+            if self.stopping.is_set():
+                return
+            self._enqueue(packet)
+
+    def _read_ring(self):
+        """
+        Sigue los ficheros del ring en orden de modificación leyendo solo lo
+        añadido desde la pasada anterior, también el que tcpdump aún escribe
+        (con -C 10 un ciclo de sondas no llega a rotarlo). Un pcapng no se
+        puede seguir así: se lee entero cuando ya está rotado.
+        """
+        tails = {}
+        rotated = set() # (ruta, mtime) de pcapng ya leídos
+        while not self.stopping.is_set():
+            files = []
+            for path in glob.glob(self.ring_pattern):
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue # tcpdump lo ha rotado entre el glob y el stat
+            files.sort()
+            for position, (mtime, path) in enumerate(files):
+                tail = tails.setdefault(path, PcapTail(path))
+                try:
+                    packets = tail.read()
+                    if packets is None:
+                        packets = self._read_rotated(path, mtime, rotated, position == len(files) - 1)
+                    for packet in packets:
+                        self._enqueue(packet)
+                except FileNotFoundError:
+                    continue # Sobrescrito antes de abrirlo: sus paquetes ya no existen
+            # Olvidar ficheros que el ring ya ha borrado
+            present = {path for _, path in files}
+            tails = {path: tail for path, tail in tails.items() if path in present}
+            rotated = {key for key in rotated if key[0] in present}
+            self.stopping.wait(RING_POLL_INTERVAL)
+
+    @staticmethod
+    def _read_rotated(path, mtime, rotated, current):
+        if current or (path, mtime) in rotated:
+            return ()
+        rotated.add((path, mtime))
+        return read_packets(path)
+
+    def _analyze(self):
+        tracker = HandshakeTracker()
+        last_expire = time.time()
+        while not self.stopping.is_set():
+            try:
+                timestamp, linktype, frame = self.packets.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            completed = tracker.feed(timestamp, linktype, frame)
+            if time.time() - last_expire > FLOW_IDLE_TIMEOUT:
+                completed.extend(tracker.expire(timestamp - FLOW_IDLE_TIMEOUT))
+                last_expire = time.time()
+            if completed:
+                with self.condition:
+                    self.handshakes.extend(completed)
+                    self.condition.notify_all()
+
+    def match(self, group, started_at, finished_at, timeout=0.0):
+        """
+        Saca del buffer el primer handshake con `group` (nombre técnico; negociado
+        u ofrecido) cuyo ClientHello cae en [started_at, finished_at]. Espera hasta
+        `timeout` s a que la captura lo procese. Devuelve None si no aparece.
+        """
+        group = group.lower()
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                for handshake in self.handshakes:
+                    groups = [g.lower() for g in handshake["offered_groups"]]
+                    if handshake["negotiated_group"]:
+                        groups.append(handshake["negotiated_group"].lower())
+                    if group in groups and started_at <= handshake["client_hello_ts"] <= finished_at:
+                        self.handshakes.remove(handshake)
+                        return handshake
+                remaining = deadline - time.time()
+                if remaining <= 0 or self.stopping.is_set():
+                    return None
+                self.condition.wait(remaining)
+
+    def stop(self):
+        self.stopping.set()
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+def apply_capture(record, handshake):
+    """
+    Sustituye los tamaños del registro de una sonda por los medidos en su flujo.
+    """
+    client_payload = handshake["client_hello_bytes"]
+    overhead_factor = client_payload / 432.0
+    record.update({
+        "phase1_key_share_bytes": handshake["client_key_share_bytes"],
+        "phase2_total_bytes": client_payload,
+        "phase2_fragmented": handshake["client_hello_segments"] > 1,
+        "phase2_overhead_factor": round(overhead_factor, 2),
+        "phase3_throughput_req_s": int(1000 / overhead_factor) if overhead_factor > 0 else 0,
+        "client_hello_segments": handshake["client_hello_segments"],
+        "server_flight_bytes": handshake["server_flight_bytes"],
+        "server_flight_segments": handshake["server_flight_segments"],
+        "server_hello_delay_ms": handshake["server_hello_delay_ms"],
+        "server_flight_ms": handshake["server_flight_ms"],
+        "captured_handshake_ms": handshake["handshake_ms"],
+        "sizes_source": "CAPTURE"
+    })
+    return record
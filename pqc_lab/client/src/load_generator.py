@@ -0,0 +1,161 @@
+import asyncio
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+from pqc_engine import LatencyHistogram
+from probe_agent import ProbeAgentPool
+
+# Generador de carga: handshakes TLS 1.3 sostenidos contra pqc_server a
+# concurrencia creciente. Mide HS/s alcanzados, CPU del servidor por handshake
+# (cgroup del contenedor) y percentiles de latencia, para la pestaña 4.
+
+LOADGEN_FILE = "captures/loadgen_results.json"
+SERVER_CONTAINER = "pqc_server"
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+DEFAULT_DURATION_S = 10
+BATCH_SIZE = 10              # Handshakes por lote enviado a un agente
+SATURATION_GAIN = 1.05       # Se deja de subir si el throughput mejora menos de un 5%
+MAX_FAILURE_RATE = 0.2
+PROBE_BACKOFF_S = 0.5        # Espera base tras un lote fallido (se dobla en cada fallo seguido, como en lab_controller)
+MAX_BATCH_ERRORS = 3         # Lotes seguidos con excepción antes de dar el trabajador por perdido (pool caído)
+
+async def read_server_cpu_us(container=SERVER_CONTAINER):
+    """
+    CPU consumida por el contenedor del servidor (µs), desde su cgroup (v2 o v1).
+    None si no se puede leer.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "docker", "exec", container, "sh", "-c",
+        "cat /sys/fs/cgroup/cpu.stat 2>/dev/null || cat /sys/fs/cgroup/cpuacct/cpuacct.usage",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    stdout, _ = await proc.communicate()
+    text = stdout.decode('utf-8', errors='ignore')
+    for line in text.splitlines():
+        if line.startswith("usage_usec"):
+            return int(line.split()[1])
+    text = text.strip()
+    return int(text) // 1000 if text.isdigit() else None # cgroup v1: nanosegundos
+
+async def run_level(pool, group, concurrency, duration_s, timeout):
+    """
+    `concurrency` trabajadores lanzando lotes contra el servidor durante `duration_s`.
+    """
+    latency = LatencyHistogram()
+    counts = {"ok": 0, "failed": 0}
+    deadline = time.perf_counter() + duration_s
+
+    async def worker():
+        errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                samples = await pool.probe(group, BATCH_SIZE, timeout=timeout)
+            except Exception:
+                counts["failed"] += BATCH_SIZE
+                errors += 1
+                if errors >= MAX_BATCH_ERRORS:
+                    return # El agente no se recupera: el nivel termina con lo medido
+                await asyncio.sleep(min(PROBE_BACKOFF_S * (2 ** (errors - 1)), max(0.0, deadline - time.perf_counter())))
+                continue
+            errors = 0
+            ok = [sample["latency_ms"] for sample in samples if sample["success"]]
+            latency.add(ok)
+            counts["ok"] += len(ok)
+            counts["failed"] += len(samples) - len(ok)
+
+    cpu_before = await read_server_cpu_us()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    cpu_after = await read_server_cpu_us()
+
+    cpu_ms = None
+    if cpu_before is not None and cpu_after is not None and counts["ok"]:
+        cpu_ms = (cpu_after - cpu_before) / 1000 / counts["ok"]
+    quantiles = {key: round(value, 3) for key, value in latency.to_dict()["quantiles"].items()}
+    total = counts["ok"] + counts["failed"]
+    return {
+        "concurrency": concurrency,
+        "handshakes": counts["ok"],
+        "failures": counts["failed"],
+        "failure_rate": round(counts["failed"] / total, 4) if total else 0.0,
+        "duration_s": round(elapsed, 3),
+        "hs_per_s": round(counts["ok"] / elapsed, 2) if elapsed > 0 else 0.0,
+        "cpu_ms_per_handshake": round(cpu_ms, 4) if cpu_ms is not None else None,
+        "p50_ms": quantiles.get("p50"),
+        "p90_ms": quantiles.get("p90"),
+        "p99_ms": quantiles.get("p99")
+    }
+
+async def ramp_group(pool, group, levels, duration_s, timeout, progress=print):
+    """
+    Sube la concurrencia nivel a nivel hasta saturar (el throughput deja de
+    crecer) o hasta que fallen demasiados handshakes.
+    """
+    results = []
+    for concurrency in levels:
+        level = await run_level(pool, group, concurrency, duration_s, timeout)
+        results.append(level)
+        progress(f"   c={concurrency:<3} {level['hs_per_s']:>8.1f} HS/s | "
+                 f"CPU {level['cpu_ms_per_handshake'] or 0:.3f} ms/HS | P99 {level['p99_ms'] or 0:.1f} ms | "
+                 f"fallos {level['failure_rate']:.0%}")
+        if level["failure_rate"] > MAX_FAILURE_RATE:
+            break
+        if len(results) > 1 and level["hs_per_s"] < results[-2]["hs_per_s"] * SATURATION_GAIN:
+            break
+    return summarize(results)
+
+def summarize(levels):
+    peak = max(levels, key=lambda level: level["hs_per_s"])
+    cpu_samples = [level["cpu_ms_per_handshake"] for level in levels if level["cpu_ms_per_handshake"]]
+    cpu_ms = min(cpu_samples) if cpu_samples else None # La medida menos contaminada por el ralentí
+    return {
+        "levels": levels,
+        "peak_hs_per_s": peak["hs_per_s"],
+        "peak_concurrency": peak["concurrency"],
+        "cpu_ms_per_handshake": cpu_ms,
+        "hs_per_s_per_core": round(1000 / cpu_ms, 1) if cpu_ms else None,
+        "p50_ms": levels[0]["p50_ms"], # Sin contención
+        "p99_ms": peak["p99_ms"]       # En el punto de máximo throughput
+    }
+
+async def run_load_test(groups, levels=DEFAULT_LEVELS, duration_s=DEFAULT_DURATION_S, timeout=30, progress=print):
+    """
+    Ejecuta la rampa para cada grupo {nombre dashboard: nombre técnico} y devuelve los resultados.
+    """
+    pool = await ProbeAgentPool(max(levels)).start()
+    try:
+        results = {}
+        for name, technical_name in groups.items():
+            progress(f"[*] Carga sobre {SERVER_CONTAINER} con {technical_name}")
+            results[name] = dict(await ramp_group(pool, technical_name, levels, duration_s, timeout, progress), group=technical_name)
+        return results
+    finally:
+        await pool.close()
+
+def save_results(results, path=LOADGEN_FILE, **settings):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"timestamp": datetime.now().isoformat(), "settings": settings, "groups": results}, f, indent=4)
+    os.replace(tmp_path, path)
+
+def load_results(path=LOADGEN_FILE):
+    """
+    Resultados del último benchmark ({} si no se ha ejecutado).
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("groups", {})
+    except (OSError, ValueError):
+        return {}
+
+def extra_servers(capacity_ratio, fleet_size=10):
+    """
+    Servidores adicionales que necesita una flota de `fleet_size` para mantener
+    el throughput (None si la capacidad medida es nula: no hay flota que baste).
+    """
+    return max(0, math.ceil(fleet_size / capacity_ratio - 1e-9) - fleet_size) if capacity_ratio > 0 else None
@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pqc_engine import LatencyHistogram
+
+# Instrumentación del controlador: contadores, gauges e histogramas en memoria
+# que se publican en formato de texto de Prometheus (GET /metrics en un puerto
+# local) y como instantánea JSON periódica en captures/. Registrar una
+# observación es O(1) y no hace E/S: el coste lo pagan el hilo HTTP y el de
+# la instantánea.
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("PQC_METRICS_PORT", "47802")) # 0 = sin endpoint HTTP
+METRICS_SNAPSHOT_FILE = os.environ.get("PQC_METRICS_SNAPSHOT", "captures/controller_metrics.json")
+METRICS_SNAPSHOT_INTERVAL_S = float(os.environ.get("PQC_METRICS_INTERVAL", "15"))
+# Límites (ms) de los buckets acumulados que ve Prometheus; los cuantiles de la
+# instantánea salen del histograma logarítmico del motor (~1% de error)
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """
+    Base: una serie por combinación de valores de etiquetas.
+    """
+    kind = None
+
+    def __init__(self, name, help_text, labels=(), lock=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = lock or threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: etiquetas {sorted(labels)}, se esperaban {list(self.labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        return [{"labels": dict(zip(self.labels, key)), "value": value} for key, value in sorted(self.series.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = value
+
+class Histogram(Metric):
+    """
+    Buckets acumulados (exposición de Prometheus) + LatencyHistogram por serie
+    para los cuantiles de la instantánea.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS_MS, lock=None):
+        super().__init__(name, help_text, labels, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0,
+                                             "histogram": LatencyHistogram()}
+            # Bucket propio (no acumulado); se acumula al exponer
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["histogram"].add(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observa la duración (ms) del bloque, también si sale con excepción.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - start) * 1000, **labels)
+
+    def render(self):
+        lines = self.header()
+        for key, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+    def snapshot(self):
+        result = []
+        for key, series in sorted(self.series.items()):
+            summary = series["histogram"].to_dict()
+            summary.pop("histogram")
+            result.append({"labels": dict(zip(self.labels, key)), **summary})
+        return result
+
+class Registry:
+    """
+    Conjunto de métricas de un proceso. Un único lock: las observaciones son
+    cortas y así render/snapshot ven un estado coherente.
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels, self.lock))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels, self.lock))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS_MS):
+        return self._register(Histogram(name, help_text, labels, buckets, self.lock))
+
+    def render(self):
+        """
+        Formato de texto de Prometheus (0.0.4).
+        """
+        with self.lock:
+            lines = [line for metric in self.metrics.values() for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            metrics = {
+                name: {"type": metric.kind, "help": metric.help, "series": metric.snapshot()}
+                for name, metric in self.metrics.items()
+            }
+        return {"timestamp": time.time(), "uptime_s": round(time.time() - self.started_at, 3), "metrics": metrics}
+
+    def write_snapshot(self, path=METRICS_SNAPSHOT_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+class MetricsExporter:
+    """
+    Endpoint HTTP local (GET /metrics, GET /metrics.json) y volcado periódico
+    de la instantánea, cada uno en un hilo daemon.
+    """
+    def __init__(self, registry, host=METRICS_HOST, port=METRICS_PORT,
+                 snapshot_path=METRICS_SNAPSHOT_FILE, interval_s=METRICS_SNAPSHOT_INTERVAL_S):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.interval_s = interval_s
+        self.server = None
+        self.closed = threading.Event()
+
+    def start(self):
+        if self.port:
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+                self.server.daemon_threads = True
+                self.port = self.server.server_address[1]
+                threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+            except OSError as e:
+                print(f"[!] Endpoint de métricas no disponible en {self.host}:{self.port} ({e})")
+                self.server = None
+        if self.snapshot_path and self.interval_s > 0:
+            threading.Thread(target=self._write_loop, name="metrics-snapshot", daemon=True).start()
+        return self
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body, content_type = registry.render(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass # Un scrape cada pocos segundos no debe ensuciar la salida del controlador
+
+        return Handler
+
+    def _write_loop(self):
+        while not self.closed.wait(self.interval_s):
+            self.flush()
+
+    def flush(self):
+        if not self.snapshot_path:
+            return
+        try:
+            self.registry.write_snapshot(self.snapshot_path)
+        except OSError as e:
+            print(f"[!] No se pudo escribir la instantánea de métricas: {e}")
+
+    def close(self):
+        self.closed.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.flush()
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+
+from pcap_reader import read_packets, decode_tcp
+from handshake_analyzer import HandshakeTracker, TLS_HANDSHAKE, HS_SERVER_HELLO
+
+# Índice en disco de los registros TLS de una captura: se construye en la primera
+# lectura (un solo pase sobre el mmap) y las consultas posteriores van directas a
+# los offsets de los paquetes sin volver a parsear ni copiar la captura.
+
+INDEX_DIR = "captures/pcap_index"
+INDEX_VERSION = 1
+
+FLIGHT_NONE = 0
+FLIGHT_CLIENT_HELLO = 1
+FLIGHT_SERVER = 2
+
+FLOW_DTYPE = np.dtype([
+    ("client", "U64"), ("server", "U64"), ("group", "U32"),
+    ("hrr", "?"), ("complete", "?"),
+    ("first_record", "u4"), ("record_count", "u4")
+])
+RECORD_DTYPE = np.dtype([
+    ("flow", "u4"), ("from_client", "?"), ("content_type", "u1"), ("handshake_type", "i2"),
+    ("flight", "u1"), ("stream_offset", "u4"), ("length", "u4"), ("timestamp", "f8"),
+    ("first_packet", "u4"), ("packet_count", "u4")
+])
+PACKET_DTYPE = np.dtype([("offset", "u8"), ("length", "u4"), ("linktype", "u2")])
+
+def _flight(flow, from_client, start, end):
+    if from_client:
+        client_hello = flow.client_hello
+        if client_hello and start >= client_hello["start"] and end <= client_hello["end"]:
+            return FLIGHT_CLIENT_HELLO
+        return FLIGHT_NONE
+    if flow.server_hello_record is None:
+        return FLIGHT_NONE
+    flight_end = flow.flight_records[-1].end if flow.flight_records else flow.server_hello_record.end
+    if start >= flow.server_hello_record.start and end <= flight_end:
+        return FLIGHT_SERVER
+    return FLIGHT_NONE
+
+def build_index(path):
+    """
+    Recorre la captura una vez y devuelve (flows, records, packets) como arrays estructurados.
+    """
+    flows, records, packets = [], [], []
+
+    def on_flow(flow):
+        summary = flow.summary()
+        if summary is None:
+            return
+        flow_id = len(flows)
+        first_record = len(records)
+        for endpoint, direction in flow.directions.items():
+            from_client = endpoint == flow.client
+            for content_type, handshake_type, start, end, timestamp in direction.record_log:
+                refs = direction.stream.refs(start, end)
+                records.append((
+                    flow_id, from_client, content_type, handshake_type,
+                    _flight(flow, from_client, start, end), start, end - start,
+                    timestamp or 0.0, len(packets), len(refs)
+                ))
+                packets.extend(refs)
+        flows.append((
+            summary["client"], summary["server"] or "", summary["negotiated_group"] or "",
+            summary["hrr"], summary["complete"], first_record, len(records) - first_record
+        ))
+
+    tracker = HandshakeTracker(on_flow=on_flow)
+    for packet in read_packets(path):
+        tracker.feed(packet.timestamp, packet.linktype, packet.data, (packet.offset, len(packet.data), packet.linktype))
+    tracker.expire()
+    return (
+        np.array(flows, dtype=FLOW_DTYPE),
+        np.array(records, dtype=RECORD_DTYPE),
+        np.array(packets, dtype=PACKET_DTYPE)
+    )
+
+class CaptureIndex:
+    """
+    Índice de una captura: flujos (grupo negociado, HRR...), registros TLS del
+    handshake (tipo, vuelo, offset en el stream) y los paquetes que los contienen
+    (offset del frame en el fichero). Se invalida si cambia el tamaño o mtime.
+    """
+    def __init__(self, path, flows, records, packets):
+        self.path = path
+        self.flows = flows
+        self.records = records
+        self.packets = packets
+        self._file = None
+        self._mapped = None
+
+    @staticmethod
+    def index_path(path, index_dir=INDEX_DIR):
+        # Nombre legible + hash de la ruta absoluta: capturas homónimas de
+        # campañas distintas no comparten (ni se invalidan) el índice
+        digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:12]
+        return os.path.join(index_dir, f"{os.path.basename(path)}.{digest}.idx.npz")
+
+    @staticmethod
+    def _fingerprint(path):
+        stat = os.stat(path)
+        return {"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "capture": os.path.abspath(path)}
+
+    @classmethod
+    def open(cls, path, index_dir=INDEX_DIR, rebuild=False):
+        """
+        Carga el índice de disco o lo construye (y guarda) si falta o está obsoleto.
+        """
+        index_path = cls.index_path(path, index_dir)
+        fingerprint = cls._fingerprint(path)
+        if not rebuild and os.path.exists(index_path):
+            try:
+                with np.load(index_path, allow_pickle=False) as data:
+                    if json.loads(str(data["meta"])) == fingerprint:
+                        return cls(path, data["flows"], data["records"], data["packets"])
+            except (OSError, ValueError, KeyError):
+                pass # Índice corrupto o de otra versión: reconstruir
+        index = cls(path, *build_index(path))
+        index.save(index_dir, fingerprint)
+        return index
+
+    def save(self, index_dir=INDEX_DIR, fingerprint=None):
+        os.makedirs(index_dir, exist_ok=True)
+        index_path = self.index_path(self.path, index_dir)
+        tmp_path = f"{index_path}.tmp-{os.getpid()}.npz"
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps(fingerprint or self._fingerprint(self.path))),
+            flows=self.flows, records=self.records, packets=self.packets
+        )
+        os.replace(tmp_path, index_path)
+
+    # --- Consultas ---
+
+    def select(self, group=None, content_type=None, handshake_type=None, from_client=None, flight=None):
+        """
+        Índices de los registros que cumplen todos los filtros (máscaras vectorizadas).
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        if group is not None:
+            mask &= self.flows["group"][self.records["flow"]] == group
+        if content_type is not None:
+            mask &= self.records["content_type"] == content_type
+        if handshake_type is not None:
+            mask &= self.records["handshake_type"] == handshake_type
+        if from_client is not None:
+            mask &= self.records["from_client"] == from_client
+        if flight is not None:
+            mask &= self.records["flight"] == flight
+        return np.flatnonzero(mask)
+
+    def server_hello_flights(self, group):
+        """
+        Vuelos del servidor (ServerHello ... Finished) de los flujos que negociaron `group`.
+        """
+        server_hellos = self.select(group=group, content_type=TLS_HANDSHAKE, handshake_type=HS_SERVER_HELLO, from_client=False)
+        flights = []
+        for flow_id in np.unique(self.records["flow"][server_hellos]):
+            flow = self.flows[flow_id]
+            records = np.flatnonzero(
+                (self.records["flow"] == flow_id) & (self.records["flight"] == FLIGHT_SERVER)
+            )
+            flights.append({
+                "flow": int(flow_id),
+                "client": str(flow["client"]),
+                "server": str(flow["server"]),
+                "records": records,
+                "bytes": int(self.records["length"][records].sum()),
+                "packets": sorted({int(p) for r in records for p in self.packet_indices(r)})
+            })
+        return flights
+
+    def packet_indices(self, record):
+        first = int(self.records["first_packet"][record])
+        return range(first, first + int(self.records["packet_count"][record]))
+
+    def frame(self, packet):
+        """
+        Frame de un paquete como vista sobre el mmap de la captura (sin copia).
+        """
+        if self._mapped is None:
+            self._file = open(self.path, 'rb')
+            self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        entry = self.packets[packet]
+        offset = int(entry["offset"])
+        return int(entry["linktype"]), memoryview(self._mapped)[offset:offset + int(entry["length"])]
+
+    def payloads(self, record):
+        """
+        Payloads TCP (vistas) de los paquetes que transportan un registro.
+        """
+        views = []
+        for packet in self.packet_indices(record):
+            segment = decode_tcp(*self.frame(packet))
+            if segment is not None:
+                views.append(segment.payload)
+        return views
+
+    def close(self):
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except BufferError:
+                pass # Quedan vistas vivas: se libera con la última
+            self._file.close()
+            self._mapped = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de registros TLS de capturas pcap/pcapng")
+    parser.add_argument("captures", nargs="+")
+    parser.add_argument("--group", help="Listar los vuelos ServerHello de este grupo (p.ej. X25519MLKEM768)")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Ignorar el índice guardado")
+    args = parser.parse_args(argv)
+
+    for capture in args.captures:
+        with CaptureIndex.open(capture, args.index_dir, args.rebuild) as index:
+            groups = sorted({str(g) for g in index.flows["group"] if g})
+            print(f"{os.path.basename(capture)}: {len(index.flows)} flujos, {len(index.records)} registros TLS, grupos: {', '.join(groups) or '-'}")
+            if args.group:
+                for flight in index.server_hello_flights(args.group):
+                    print(f"   {flight['client']} -> {flight['server']}: {len(flight['records'])} registros, "
+                          f"{flight['bytes']} B, {len(flight['packets'])} paquetes")
+
+if __name__ == "__main__":
+    main()
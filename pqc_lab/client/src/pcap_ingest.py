@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from handshake_analyzer import analyze_capture, to_record
+from results_store import ResultsStore, RESULTS_DIR
+
+# Ingesta por lotes de campañas de capturas: reparte los ficheros entre un pool
+# de procesos, extrae un registro por handshake y los fusiona en el almacén de
+# resultados (el mismo que lee el dashboard). Se puede interrumpir y reanudar.
+
+MANIFEST_FILE = "captures/ingest_manifest.json"
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap")
+
+def find_captures(paths):
+    """
+    Ficheros de captura de las rutas dadas (directorios recursivamente), los más grandes primero
+    para que el pool no acabe esperando a un fichero enorme repartido al final.
+    """
+    captures = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                captures.extend(os.path.join(root, name) for name in names if name.lower().endswith(CAPTURE_EXTENSIONS))
+        else:
+            captures.append(path)
+    captures = sorted({os.path.abspath(c) for c in captures})
+    return sorted(captures, key=os.path.getsize, reverse=True)
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def ingest_capture(path):
+    """
+    Trabajo de un proceso del pool: todos los handshakes de una captura en el esquema del controlador.
+    """
+    records = []
+    for handshake in analyze_capture(path):
+        record = to_record(handshake, path)
+        record["capture_path"] = path
+        records.append(record)
+    return records
+
+class IngestManifest:
+    """
+    Estado de la ingesta: capturas ya fusionadas (con su tamaño/mtime), la
+    época del almacén y el último seq que cubre. Al reanudar, las filas del almacén
+    posteriores a ese seq (un fallo entre append y guardar el manifiesto)
+    marcan también sus capturas como hechas, así que nada se ingiere dos veces.
+    """
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.captures = {}
+        self.store_seq = 0
+        self.store_epoch = None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.captures = data.get("captures", {})
+            self.store_seq = data.get("store_seq", 0)
+            self.store_epoch = data.get("store_epoch")
+        except (OSError, ValueError):
+            pass
+
+    def reconcile(self, store):
+        epoch = store.epoch()
+        if self.store_epoch is None:
+            self.store_epoch = epoch # Manifiesto anterior a guardar la época
+        if epoch != self.store_epoch or store.last_seq() < self.store_seq:
+            # El almacén se reseteó (aunque ya haya vuelto a pasar del seq anterior):
+            # la ingesta empieza de cero y solo cuenta lo que haya en la época nueva
+            self.captures, self.store_seq, self.store_epoch = {}, 0, epoch
+        rows, last_seq = store.read_since(self.store_seq)
+        for row in rows:
+            path = row.get("capture_path")
+            if path and path not in self.captures and os.path.exists(path):
+                self.captures[path] = dict(fingerprint(path), handshakes=None)
+        self.store_seq = last_seq
+
+    def done(self, path):
+        entry = self.captures.get(path)
+        return entry is not None and entry["size"] == os.path.getsize(path) and entry["mtime_ns"] == os.stat(path).st_mtime_ns
+
+    def mark(self, path, handshakes, store_seq):
+        self.captures[path] = dict(fingerprint(path), handshakes=handshakes)
+        self.store_seq = store_seq
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({"store_epoch": self.store_epoch, "store_seq": self.store_seq, "captures": self.captures}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def ingest(paths, store=None, manifest=None, workers=None, progress=print):
+    """
+    Ingiere las capturas pendientes en paralelo. Devuelve el nº de handshakes añadidos.
+    """
+    store = store or ResultsStore(RESULTS_DIR)
+    manifest = manifest or IngestManifest()
+    manifest.reconcile(store)
+    captures = [path for path in find_captures(paths) if not manifest.done(path)]
+    total_bytes = sum(os.path.getsize(path) for path in captures)
+    if not captures:
+        progress("[*] Nada que ingerir: todas las capturas están en el almacén")
+        return 0
+
+    start = time.perf_counter()
+    done_bytes = added = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_capture, path): path for path in captures}
+        for completed, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                records = future.result()
+            except Exception as e:
+                progress(f"[!] {os.path.basename(path)}: {e}")
+                continue # Queda pendiente para la siguiente ejecución
+            # Solo el proceso principal escribe: un segmento por captura
+            last_seq = store.append(records)
+            manifest.mark(path, len(records), last_seq)
+            added += len(records)
+            done_bytes += os.path.getsize(path)
+            elapsed = time.perf_counter() - start
+            rate = done_bytes / elapsed if elapsed > 0 else 0
+            eta = (total_bytes - done_bytes) / rate if rate > 0 else 0
+            progress(f"[{completed}/{len(captures)}] {os.path.basename(path)}: {len(records)} handshakes | "
+                     f"{rate / 1e6:.1f} MB/s | ETA {eta:.0f}s")
+    return added
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta paralela de capturas pcap/pcapng en el almacén de resultados")
+    parser.add_argument("paths", nargs="+", help="Ficheros o directorios de capturas")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto, nº de núcleos)")
+    parser.add_argument("--store", default=RESULTS_DIR, help="Directorio del almacén de resultados")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Estado para reanudar la ingesta")
+    parser.add_argument("--restart", action="store_true",
+                        help="Vaciar el almacén (época nueva) y volver a ingerir todo; en el almacén compartido "
+                             "con el controlador exige --wipe-store")
+    parser.add_argument("--wipe-store", action="store_true",
+                        help="Confirmar que --restart borra TODAS las filas del almacén, también las del controlador")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.store)
+    manifest = IngestManifest(args.manifest)
+    if args.restart:
+        # El almacén es append-only: reingerir sin vaciarlo duplicaría cada handshake,
+        # y vaciarlo se lleva por delante lo que haya medido lab_controller
+        if os.path.abspath(args.store) == os.path.abspath(RESULTS_DIR) and not args.wipe_store:
+            raise SystemExit(f"[!] --restart vaciaría {args.store}, el almacén del controlador (todas sus filas, "
+                             f"no solo las ingeridas). Usa --store con un directorio propio o añade --wipe-store para confirmarlo")
+        # Con la época nueva, reconcile descarta también el manifiesto
+        store.reset()
+        print(f"[*] Almacén {args.store} vaciado (época nueva)")
+    added = ingest(args.paths, store, manifest, args.workers)
+    print(f"[OK] {added} handshakes añadidos a {args.store}")
+
+if __name__ == "__main__":
+    main()
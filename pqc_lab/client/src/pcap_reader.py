@@ -0,0 +1,286 @@
+import mmap
+import os
+import struct
+
+# Lector en streaming de capturas pcap / pcapng (sin cargar el fichero en memoria)
+# y decodificador mínimo Ethernet/IP/TCP. Se parsean las cabeceras con struct en
+# lugar de disecar cada paquete con scapy: solo necesitamos TCP y es ~50x más rápido.
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6), # pcap little endian, microsegundos
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), # pcap nanosegundos
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9)
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BOM = 0x1A2B3C4D
+
+# Link types soportados
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+class Packet:
+    """
+    Un paquete leído de la captura. `offset` es la posición del frame en el fichero.
+    """
+    __slots__ = ("timestamp", "linktype", "data", "offset")
+
+    def __init__(self, timestamp, linktype, data, offset):
+        self.timestamp = timestamp
+        self.linktype = linktype
+        self.data = data
+        self.offset = offset
+
+class TcpSegment:
+    __slots__ = ("src", "sport", "dst", "dport", "seq", "ack", "flags", "payload")
+
+    def __init__(self, src, sport, dst, dport, seq, ack, flags, payload):
+        self.src = src
+        self.sport = sport
+        self.dst = dst
+        self.dport = dport
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.payload = payload
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) < size:
+        return None
+    return data
+
+def _iter_pcap(f, header):
+    endian, resolution = PCAP_MAGICS[header[:4]]
+    rest = _read_exact(f, 20)
+    if rest is None:
+        return
+    linktype = struct.unpack(endian + "I", rest[16:20])[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    offset = 24
+    while True:
+        head = _read_exact(f, 16)
+        if head is None:
+            return
+        ts_sec, ts_frac, caplen, _ = record.unpack(head)
+        data = _read_exact(f, caplen)
+        if data is None:
+            return
+        yield Packet(ts_sec + ts_frac * resolution, linktype, data, offset + 16)
+        offset += 16 + caplen
+
+def _iter_pcapng(f, header):
+    endian = "<"
+    interfaces = [] # [(linktype, resolución del timestamp)]
+    offset = 0
+    block = header
+    while True:
+        if len(block) < 8:
+            rest = _read_exact(f, 8 - len(block))
+            if rest is None:
+                return
+            block = bytes(block) + bytes(rest)
+        block_type = struct.unpack(endian + "I", block[:4])[0]
+        if block_type == PCAPNG_SHB:
+            # El orden de bytes de la sección se decide por el byte-order magic
+            bom = _read_exact(f, 4)
+            if bom is None:
+                return
+            endian = "<" if struct.unpack("<I", bom)[0] == PCAPNG_BOM else ">"
+            block_len = struct.unpack(endian + "I", block[4:8])[0]
+            body = _read_exact(f, block_len - 12)
+            if body is None:
+                return
+            interfaces = []
+        else:
+            block_len = struct.unpack(endian + "I", block[4:8])[0]
+            if block_len < 12:
+                return # Bloque corrupto
+            body = _read_exact(f, block_len - 8)
+            if body is None:
+                return
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack(endian + "H", body[:2])[0]
+                interfaces.append([linktype, _pcapng_tsresol(body[8:-4], endian)])
+            elif block_type == PCAPNG_EPB:
+                interface_id, ts_high, ts_low, caplen, _ = struct.unpack(endian + "IIIII", body[:20])
+                linktype, resolution = interfaces[interface_id] if interface_id < len(interfaces) else (LINKTYPE_ETHERNET, 1e-6)
+                yield Packet(((ts_high << 32) | ts_low) * resolution, linktype, body[20:20 + caplen], offset + 28)
+            elif block_type == PCAPNG_SPB:
+                linktype, _ = interfaces[0] if interfaces else (LINKTYPE_ETHERNET, 1e-6)
+                original_len = struct.unpack(endian + "I", body[:4])[0]
+                yield Packet(None, linktype, body[4:4 + min(original_len, len(body) - 8)], offset + 12)
+        offset += block_len
+        block = _read_exact(f, 8)
+        if block is None:
+            return
+
+def _pcapng_tsresol(options, endian):
+    # Opción if_tsresol (código 9): potencia de 10 (o de 2 si el bit alto está activo)
+    position = 0
+    while position + 4 <= len(options):
+        code, length = struct.unpack(endian + "HH", options[position:position + 4])
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = options[position + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        position += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+def iter_packets(f):
+    """
+    Itera los paquetes de un fichero pcap o pcapng abierto en binario. Solo usa
+    read(), así que también sirve para tuberías (p.ej. `tcpdump -w -`).
+    """
+    header = _read_exact(f, 4)
+    if header is None:
+        return
+    header = bytes(header)
+    if header in PCAP_MAGICS:
+        yield from _iter_pcap(f, header)
+    elif struct.unpack("<I", header)[0] == PCAPNG_SHB:
+        yield from _iter_pcapng(f, header)
+    else:
+        raise ValueError("Formato de captura no reconocido (ni pcap ni pcapng)")
+
+class _MappedReader:
+    """
+    read() sobre un mmap que devuelve vistas (memoryview) en lugar de copias.
+    """
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def read(self, size):
+        data = self.view[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+def read_packets(path):
+    """
+    Itera los paquetes de un fichero mapeándolo en memoria: `Packet.data` es una
+    vista sobre el mmap (sin copiar el payload) válida mientras se itera.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield from iter_packets(_MappedReader(memoryview(mapped)))
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass # Aún quedan vistas vivas: el mmap se libera con la última
+
+class PcapTail:
+    """
+    Lectura incremental de un pcap que otro proceso sigue escribiendo (tcpdump
+    -U -w): cada `read()` devuelve los paquetes completos añadidos desde la
+    anterior y deja para la siguiente el registro que aún está a medias. Si el
+    fichero se reescribe (ring de tcpdump -W que vuelve a usar el nombre) se
+    empieza de cero. Solo pcap clásico: `read()` devuelve None con pcapng.
+    """
+    __slots__ = ("path", "identity", "offset", "record", "resolution", "linktype")
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = None
+        self.offset = 0
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            head = f.read(40) # Cabecera global + cabecera del primer registro
+            identity = (stat.st_dev, stat.st_ino, head)
+            if len(head) < 24:
+                return []
+            if identity != self.identity or size < self.offset:
+                if head[:4] not in PCAP_MAGICS:
+                    return None
+                endian, self.resolution = PCAP_MAGICS[head[:4]]
+                self.record = struct.Struct(endian + "IIII")
+                self.linktype = struct.unpack(endian + "I", head[20:24])[0] & 0x0FFFFFFF
+                self.identity = identity if len(head) == 40 else None # Sin primer registro aún no se distingue una reescritura
+                self.offset = 24
+            f.seek(self.offset)
+            data = memoryview(f.read(size - self.offset))
+        packets = []
+        position = 0
+        while position + 16 <= len(data):
+            ts_sec, ts_frac, caplen, _ = self.record.unpack_from(data, position)
+            end = position + 16 + caplen
+            if end > len(data):
+                break
+            packets.append(Packet(ts_sec + ts_frac * self.resolution, self.linktype, data[position + 16:end],
+                                  self.offset + position + 16))
+            position = end
+        self.offset += position
+        return packets
+
+def decode_tcp(linktype, frame):
+    """
+    Extrae el segmento TCP de un frame (None si no es TCP sobre IPv4/IPv6).
+    """
+    data = memoryview(frame)
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        ethertype = struct.unpack_from("!H", data, 12)[0]
+        position = 14
+        while ethertype in (0x8100, 0x88A8) and len(data) >= position + 4: # VLAN
+            ethertype = struct.unpack_from("!H", data, position + 2)[0]
+            position += 4
+        if ethertype not in (0x0800, 0x86DD):
+            return None
+        data = data[position:]
+    elif linktype == LINKTYPE_LINUX_SLL:
+        data = data[16:]
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        data = data[20:]
+    elif linktype == LINKTYPE_NULL:
+        data = data[4:]
+    elif linktype not in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return None
+
+    if len(data) < 20:
+        return None
+    version = data[0] >> 4
+    if version == 4:
+        header_len = (data[0] & 0x0F) * 4
+        total_len = struct.unpack_from("!H", data, 2)[0]
+        if data[9] != 6 or struct.unpack_from("!H", data, 6)[0] & 0x1FFF: # No TCP o fragmento IP
+            return None
+        src = ".".join(str(b) for b in data[12:16])
+        dst = ".".join(str(b) for b in data[16:20])
+        data = data[header_len:total_len if total_len else len(data)]
+    elif version == 6:
+        if len(data) < 40 or data[6] != 6: # Sin soporte de cabeceras de extensión
+            return None
+        payload_len = struct.unpack_from("!H", data, 4)[0]
+        src = bytes(data[8:24]).hex()
+        dst = bytes(data[24:40]).hex()
+        data = data[40:40 + payload_len]
+    else:
+        return None
+
+    if len(data) < 20:
+        return None
+    sport, dport, seq, ack, offset_flags = struct.unpack_from("!HHIIH", data, 0)
+    tcp_header_len = (offset_flags >> 12) * 4
+    return TcpSegment(src, sport, dst, dport, seq, ack, offset_flags & 0x3F, data[tcp_header_len:])
@@ -1,30 +1,41 @@
 import time
 import math
+import json
+import os
+import platform
+import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import MappingProxyType, SimpleNamespace
+
+import numpy as np
+
+import algorithms
 
 # --- CONSTANTS ---
 MAX_MSS = 1460
 IW10_LIMIT = 14600
+COST_PROFILE_FILE = "captures/cpu_cost_profile.json"
 
 class FIPS_SPECS:
-    class X25519:
-        pk = 32
-        sig = 64 # EdDSA signature size approx
-    
-    class ML_KEM_768:
-        pk = 1184
-        ct = 1088
-    
-    class ML_DSA_65:
-        pk = 1952
-        sig = 3293
-    
-    CERT_OVERHEAD = 800 # Metadata overhead per cert
+    # Legacy size table, kept for external callers: a view over the registry's lab suites
+    X25519 = SimpleNamespace(pk=algorithms.SUITES["CLASSIC"].kem.pk, sig=algorithms.SUITES["CLASSIC"].signature.sig)
+    ML_KEM_768 = SimpleNamespace(pk=algorithms.SUITES["PURE"].kem.pk, ct=algorithms.SUITES["PURE"].kem.ct)
+    ML_DSA_65 = SimpleNamespace(pk=algorithms.SUITES["PURE"].signature.pk, sig=algorithms.SUITES["PURE"].signature.sig)
+    CERT_OVERHEAD = algorithms.CERT_OVERHEAD
 
 class CryptoSuite:
+    # The three lab scenarios; any suite registered in algorithms.SUITES is accepted too
     CLASSIC = "CLASSIC"
     HYBRID = "HYBRID"
     PURE = "PURE"
 
+def suite_complexity(suite):
+    """
+    Relative CPU complexity per operation (units of compute_workload), from the
+    algorithm registry. Unknown suites fall back to PURE.
+    """
+    return algorithms.SUITES.get(suite, algorithms.SUITES[CryptoSuite.PURE]).complexity
+
 # --- CRYPTO ENGINE ---
 
 def compute_workload(complexity):
@@ -46,85 +57,174 @@ def compute_workload(complexity):
     end = time.perf_counter()
     return (end - start) * 1000 # Convert to ms
 
-def run_crypto_engine(suite):
-    keygen_time = 0
-    encaps_time = 0
-    verify_time = 0
-    
-    client_key_share_size = 0
-    server_key_share_size = 0
-    signature_size = 0
-    cert_chain_size = 0
-    
-    if suite == CryptoSuite.CLASSIC:
-        # X25519
-        keygen_time = compute_workload(0.5)
-        encaps_time = compute_workload(0.5)
-        verify_time = compute_workload(1.0)
-        
-        client_key_share_size = FIPS_SPECS.X25519.pk
-        server_key_share_size = FIPS_SPECS.X25519.pk
-        signature_size = FIPS_SPECS.X25519.sig
-        cert_chain_size = 2500
-        
-    elif suite == CryptoSuite.HYBRID:
-        # X25519 + ML-KEM-768
-        keygen_time = compute_workload(0.5 + 2.0)
-        encaps_time = compute_workload(0.5 + 2.0)
-        verify_time = compute_workload(1.0)
-        
-        client_key_share_size = FIPS_SPECS.X25519.pk + FIPS_SPECS.ML_KEM_768.pk
-        server_key_share_size = FIPS_SPECS.X25519.pk + FIPS_SPECS.ML_KEM_768.ct
-        signature_size = FIPS_SPECS.X25519.sig
-        cert_chain_size = 2500
-        
-    else: # PURE
-        # ML-KEM-768 + ML-DSA-65
-        keygen_time = compute_workload(2.0)
-        encaps_time = compute_workload(2.0)
-        verify_time = compute_workload(5.0)
-        
-        client_key_share_size = FIPS_SPECS.ML_KEM_768.pk
-        server_key_share_size = FIPS_SPECS.ML_KEM_768.ct
-        signature_size = FIPS_SPECS.ML_DSA_65.sig
-        
-        single_cert_size = FIPS_SPECS.ML_DSA_65.pk + FIPS_SPECS.ML_DSA_65.sig + FIPS_SPECS.CERT_OVERHEAD
-        cert_chain_size = single_cert_size * 3
+class CostModel:
+    """
+    Calibrated CPU cost model: per-operation costs (ms) for each CryptoSuite,
+    measured once with compute_workload and then returned in O(1).
+    Optional multiplicative gaussian jitter, reproducible through `seed`.
+    """
+    OPERATIONS = ("keygen", "encaps", "verify")
+
+    def __init__(self, costs, jitter=0.0, seed=None):
+        self.costs = costs # {suite: {op: ms}}
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def calibrate(cls, samples=5, jitter=0.0, seed=None):
+        costs = {suite: cls._measure(suite, samples) for suite in algorithms.SUITES}
+        return cls(costs, jitter=jitter, seed=seed)
+
+    @staticmethod
+    def _measure(suite, samples=5):
+        return {
+            op: statistics.median(compute_workload(complexity) for _ in range(samples))
+            for op, complexity in suite_complexity(suite).items()
+        }
+
+    @classmethod
+    def load(cls, path=COST_PROFILE_FILE, jitter=0.0, seed=None):
+        with open(path, 'r') as f:
+            profile = json.load(f)
+        # A profile measured on another host (or for another complexity table) is stale
+        if profile.get("host") != platform.node() or profile.get("complexity") != algorithms.complexity_table():
+            raise ValueError("Stale CPU cost profile")
+        return cls(profile["costs"], jitter=jitter, seed=seed)
+
+    def save(self, path=COST_PROFILE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "complexity": algorithms.complexity_table(),
+                "costs": self.costs
+            }, f, indent=4)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_or_calibrate(cls, path=COST_PROFILE_FILE, jitter=0.0, seed=None):
+        """
+        Loads the on-disk profile, calibrating (and persisting) it if it is
+        missing, unreadable or was measured on another host.
+        """
+        try:
+            return cls.load(path, jitter=jitter, seed=seed)
+        except (OSError, ValueError, KeyError):
+            model = cls.calibrate(jitter=jitter, seed=seed)
+            model.save(path)
+            return model
+
+    def sample(self, suite, op, size=None, rng=None):
+        """
+        Cost in ms of `op` for `suite`. Returns a float, or an array of `size`
+        independent samples (used by the batch paths). Jitter is drawn from
+        `rng` when given (the model itself stays shared and untouched).
+        """
+        if suite not in self.costs:
+            # Suite registered after calibration: measure it once on first use
+            self.costs[suite] = self._measure(suite)
+        base = self.costs[suite][op]
+        if not self.jitter:
+            return base if size is None else np.full(size, base)
+        rng = rng if rng is not None else self.rng
+        if size is None:
+            return max(base * (1 + self.jitter * rng.standard_normal()), 0.0)
+        return np.maximum(base * (1 + self.jitter * rng.standard_normal(size)), 0.0)
+
+# --- SIZE PROFILES ---
+
+def build_suite_profile(suite):
+    """
+    Byte sizes and TCP segmentation for a registered suite (see algorithms.py).
+    Pure: depends only on the suite, so it is computed once and cached.
+    """
+    spec = algorithms.SUITES.get(suite, algorithms.SUITES[CryptoSuite.PURE])
+    client_key_share_size = spec.kem.pk
+    server_key_share_size = spec.kem.ct
+    signature_size = spec.signature.sig
+    cert_chain_size = spec.cert_chain_size
         
     # Protocol Overhead
     client_payload = 200 + client_key_share_size
     server_payload = 250 + server_key_share_size + cert_chain_size + signature_size
     
+    # Segmentation
+    client_segments = math.ceil(client_payload / MAX_MSS)
+    server_segments = math.ceil(server_payload / MAX_MSS)
+    
+    # Congestion Window Analysis (RFC 6928)
+    exceeds_iw10 = server_payload > IW10_LIMIT
+    
+    return MappingProxyType({
+        "client_key_share_size": client_key_share_size,
+        "server_key_share_size": server_key_share_size,
+        "signature_size": signature_size,
+        "cert_chain_size": cert_chain_size,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "key_share_size": client_key_share_size, # For dashboard Phase 1
+        "client_segments": client_segments,
+        "server_segments": server_segments,
+        "exceeds_iw10": exceeds_iw10,
+        "fragmentation_risk": client_segments > 1,
+        "amplification_factor": round(server_payload / client_payload, 1)
+    })
+
+# Read-only view of the profile cache shared by the engine, the controller and the dashboard
+_SUITE_PROFILES = {suite: build_suite_profile(suite) for suite in algorithms.SUITES}
+SUITE_PROFILES = MappingProxyType(_SUITE_PROFILES)
+
+def get_suite_profile(suite):
+    profile = _SUITE_PROFILES.get(suite)
+    if profile is None:
+        if suite not in algorithms.SUITES:
+            # Unknown suites fall back to PURE, as the original if/elif chain did
+            return _SUITE_PROFILES[CryptoSuite.PURE]
+        profile = _SUITE_PROFILES[suite] = build_suite_profile(suite) # Registered after import
+    return profile
+
+# --- CRYPTO ENGINE (TIMING) ---
+
+def run_crypto_engine(suite, cost_model=None):
+    # CPU time: calibrated cost model (O(1)) or real CPU workload (busy loop)
+    if cost_model is not None:
+        keygen_time = cost_model.sample(suite, "keygen")
+        encaps_time = cost_model.sample(suite, "encaps")
+        verify_time = cost_model.sample(suite, "verify")
+    else:
+        complexity = suite_complexity(suite)
+        keygen_time = compute_workload(complexity["keygen"])
+        encaps_time = compute_workload(complexity["encaps"])
+        verify_time = compute_workload(complexity["verify"])
+    
+    profile = get_suite_profile(suite)
+    
     return {
         "keygen_time_ms": keygen_time,
         "encaps_time_ms": encaps_time,
         "verify_time_ms": verify_time,
-        "client_payload_size": client_payload,
-        "server_payload_size": server_payload,
-        "key_share_size": client_key_share_size # For dashboard Phase 1
+        "client_payload_size": profile["client_payload_size"],
+        "server_payload_size": profile["server_payload_size"],
+        "key_share_size": profile["key_share_size"] # For dashboard Phase 1
     }
 
 # --- NETWORK PHYSICS ENGINE ---
 
-def run_network_simulation(suite, rtt_ms, bandwidth_mbps=100):
-    crypto = run_crypto_engine(suite)
-    
-    # Segmentation
-    client_segments = math.ceil(crypto["client_payload_size"] / MAX_MSS)
-    server_segments = math.ceil(crypto["server_payload_size"] / MAX_MSS)
-    
-    # Congestion Window Analysis (RFC 6928)
-    exceeds_iw10 = crypto["server_payload_size"] > IW10_LIMIT
+def run_network_simulation(suite, rtt_ms, bandwidth_mbps=100, cost_model=None):
+    crypto = run_crypto_engine(suite, cost_model=cost_model)
+    profile = get_suite_profile(suite)
     
     # Deterministic RTT Calculation
     required_rtts = 1 # TCP Handshake
     
     # TLS Handshake usually 1-RTT, but if server flight > IW10, add 1 RTT (Stop-and-Wait)
-    if exceeds_iw10:
+    if profile["exceeds_iw10"]:
         required_rtts += 1
         
     # Transmission Time
-    total_bytes = crypto["client_payload_size"] + crypto["server_payload_size"]
+    total_bytes = profile["client_payload_size"] + profile["server_payload_size"]
     transmission_time_ms = (total_bytes * 8) / (bandwidth_mbps * 1_000_000) * 1000
     
     # Total Latency
@@ -138,13 +238,729 @@ def run_network_simulation(suite, rtt_ms, bandwidth_mbps=100):
         "metrics": crypto,
         "mtu": 1500,
         "mss": MAX_MSS,
+        "client_segments": profile["client_segments"],
+        "server_segments": profile["server_segments"],
+        "server_flight_bytes": profile["server_payload_size"],
+        "iw10_limit": IW10_LIMIT,
+        "exceeds_iw10": profile["exceeds_iw10"],
+        "required_rtts": required_rtts,
+        "total_latency_ms": total_latency_ms,
+        "fragmentation_risk": profile["fragmentation_risk"],
+        "amplification_factor": profile["amplification_factor"]
+    }
+
+def _suite_columns(flat_suites, cost_model=None, rng=None):
+    """
+    Per-row profile sizes and CPU time for an array of suites. Sizes come from
+    the precomputed profiles; only the timing is evaluated, once per distinct
+    suite (or per row when a CostModel draws jitter).
+    """
+    n = flat_suites.size
+    columns = {
+        key: np.empty(n, dtype=np.int64)
+        for key in ("client_payload_size", "server_payload_size", "key_share_size", "client_segments", "server_segments")
+    }
+    columns["cpu_time_ms"] = np.empty(n, dtype=np.float64)
+    for suite in set(flat_suites.tolist()):
+        mask = flat_suites == suite
+        profile = get_suite_profile(suite)
+        for key in ("client_payload_size", "server_payload_size", "key_share_size", "client_segments", "server_segments"):
+            columns[key][mask] = profile[key]
+        if cost_model is not None:
+            count = int(mask.sum())
+            columns["cpu_time_ms"][mask] = sum(cost_model.sample(suite, op, size=count, rng=rng) for op in CostModel.OPERATIONS)
+        else:
+            crypto = run_crypto_engine(suite)
+            columns["cpu_time_ms"][mask] = crypto["keygen_time_ms"] + crypto["encaps_time_ms"] + crypto["verify_time_ms"]
+    return columns
+
+def run_network_simulation_batch(suites, rtt_ms=None, bandwidth_mbps=100, cost_model=None, rng=None):
+    """
+    Vectorized version of run_network_simulation over arrays of scenarios.
+    Accepts arrays (or scalars, broadcast) of suites, RTTs and bandwidths, or a
+    DataFrame with 'suite', 'rtt_ms' and optionally 'bandwidth_mbps' columns.
+    Returns a dict of columnar NumPy arrays (pd.DataFrame(result) works directly).
+    Raises ValueError if no RTTs are given.
+    With a CostModel, CPU costs (and jitter, from `rng` if given) are drawn
+    per scenario in one pass.
+    """
+    if hasattr(suites, "columns"): # DataFrame input
+        frame = suites
+        suites = frame["suite"].to_numpy()
+        rtt_ms = frame["rtt_ms"].to_numpy()
+        if "bandwidth_mbps" in frame.columns:
+            bandwidth_mbps = frame["bandwidth_mbps"].to_numpy()
+    elif rtt_ms is None:
+        raise ValueError("rtt_ms is required unless suites is a DataFrame with an 'rtt_ms' column")
+
+    suites, rtt_ms, bandwidth_mbps = np.broadcast_arrays(
+        np.asarray(suites, dtype=object),
+        np.asarray(rtt_ms, dtype=np.float64),
+        np.asarray(bandwidth_mbps, dtype=np.float64)
+    )
+
+    flat_suites = suites.ravel()
+    columns = _suite_columns(flat_suites, cost_model, rng)
+    client_payload = columns["client_payload_size"]
+    server_payload = columns["server_payload_size"]
+    key_share = columns["key_share_size"]
+    client_segments = columns["client_segments"]
+    server_segments = columns["server_segments"]
+    cpu_time_ms = columns["cpu_time_ms"]
+
+    rtt = rtt_ms.ravel()
+    bandwidth = bandwidth_mbps.ravel()
+
+    # Congestion Window Analysis (RFC 6928)
+    exceeds_iw10 = server_payload > IW10_LIMIT
+    required_rtts = 1 + exceeds_iw10.astype(np.int64)
+
+    total_bytes = client_payload + server_payload
+    transmission_time_ms = (total_bytes * 8) / (bandwidth * 1_000_000) * 1000
+
+    total_latency_ms = rtt + (required_rtts * rtt) + cpu_time_ms + transmission_time_ms
+
+    return {
+        "suite": flat_suites,
+        "rtt_ms": rtt,
+        "bandwidth_mbps": bandwidth,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "key_share_size": key_share,
         "client_segments": client_segments,
         "server_segments": server_segments,
-        "server_flight_bytes": crypto["server_payload_size"],
-        "iw10_limit": IW10_LIMIT,
         "exceeds_iw10": exceeds_iw10,
         "required_rtts": required_rtts,
+        "cpu_time_ms": cpu_time_ms,
+        "transmission_time_ms": transmission_time_ms,
         "total_latency_ms": total_latency_ms,
         "fragmentation_risk": client_segments > 1,
-        "amplification_factor": round(crypto["server_payload_size"] / crypto["client_payload_size"], 1)
+        "amplification_factor": np.round(server_payload / client_payload, 1)
+    }
+
+# --- QUIC TRANSPORT MODEL ---
+
+QUIC_MIN_DATAGRAM = 1200          # Client Initial datagrams are padded to this (RFC 9000 14.1)
+QUIC_AMPLIFICATION_LIMIT = 3      # Bytes a server may send per byte received before validation (RFC 9000 8.1)
+QUIC_PACKET_OVERHEAD = 50         # Long header with 8-byte CIDs, CRYPTO frame header and AEAD tag
+QUIC_INITIAL_CWND_DATAGRAMS = 10  # RFC 9002 7.2
+QUIC_MAX_ROUNDS = 32
+
+def run_quic_simulation_batch(suites, rtt_ms=None, bandwidth_mbps=100, cost_model=None,
+                              max_datagram_size=QUIC_MIN_DATAGRAM, init_cwnd=QUIC_INITIAL_CWND_DATAGRAMS,
+                              retry=False):
+    """
+    QUIC counterpart of run_network_simulation_batch (same inputs, plus optional
+    'max_datagram_size', 'init_cwnd' and 'retry' columns). The server flight is
+    sent in rounds limited by the congestion window and, until the client's
+    first Handshake packet validates its address, by 3x the bytes received from
+    the client. A Retry costs one extra RTT up front but validates the address
+    immediately. There is no separate transport handshake: a 1-RTT exchange is
+    1 RTT, and each additional server round adds one.
+    """
+    if hasattr(suites, "columns"): # DataFrame input
+        frame = suites
+        suites = frame["suite"].to_numpy()
+        rtt_ms = frame["rtt_ms"].to_numpy()
+        if "bandwidth_mbps" in frame.columns:
+            bandwidth_mbps = frame["bandwidth_mbps"].to_numpy()
+        if "max_datagram_size" in frame.columns:
+            max_datagram_size = frame["max_datagram_size"].to_numpy()
+        if "init_cwnd" in frame.columns:
+            init_cwnd = frame["init_cwnd"].to_numpy()
+        if "retry" in frame.columns:
+            retry = frame["retry"].to_numpy()
+    elif rtt_ms is None:
+        raise ValueError("rtt_ms is required unless suites is a DataFrame with an 'rtt_ms' column")
+
+    suites, rtt, bandwidth, datagram_size, init_cwnd, retry = (
+        a.ravel() for a in np.broadcast_arrays(
+            np.asarray(suites, dtype=object), np.asarray(rtt_ms, dtype=np.float64),
+            np.asarray(bandwidth_mbps, dtype=np.float64), np.asarray(max_datagram_size, dtype=np.int64),
+            np.asarray(init_cwnd, dtype=np.int64), np.asarray(retry, dtype=bool)
+        )
+    )
+    if np.any(datagram_size <= QUIC_PACKET_OVERHEAD):
+        raise ValueError(f"max_datagram_size must exceed the {QUIC_PACKET_OVERHEAD}-byte packet overhead")
+    columns = _suite_columns(suites, cost_model)
+    client_payload = columns["client_payload_size"]
+    server_payload = columns["server_payload_size"]
+    frame_payload = datagram_size - QUIC_PACKET_OVERHEAD
+
+    # Client Initial flight: every datagram padded to the full size
+    client_datagrams = -(-client_payload // frame_payload)
+    client_bytes = client_datagrams * datagram_size * (1 + retry) # A Retry makes the client re-send it with the token
+
+    server_datagrams = -(-server_payload // frame_payload)
+    server_bytes = server_payload + server_datagrams * QUIC_PACKET_OVERHEAD
+    amplification_limit = QUIC_AMPLIFICATION_LIMIT * client_datagrams * datagram_size
+
+    # Server flight rounds (vectorized over rows still sending)
+    remaining = server_bytes.copy()
+    cwnd = init_cwnd * datagram_size
+    validated = retry.copy()
+    server_rounds = np.zeros(suites.size, dtype=np.int64)
+    blocked_rtts = np.zeros(suites.size, dtype=np.int64)
+    for _ in range(QUIC_MAX_ROUNDS):
+        rows = np.flatnonzero(remaining > 0)
+        if rows.size == 0:
+            break
+        window = np.minimum(cwnd[rows], remaining[rows])
+        limited = ~validated[rows] & (amplification_limit[rows] < window)
+        sent = np.where(limited, amplification_limit[rows], window)
+        blocked_rtts[rows] += limited
+        server_rounds[rows] += 1
+        remaining[rows] -= sent
+        cwnd[rows] += sent # Slow start: the window grows by the bytes acknowledged
+        validated[rows] = True # The client answers with Handshake packets
+
+    required_rtts = server_rounds + retry.astype(np.int64)
+    total_bytes = client_bytes + server_bytes
+    transmission_time_ms = (total_bytes * 8) / (bandwidth * 1_000_000) * 1000
+    total_latency_ms = required_rtts * rtt + columns["cpu_time_ms"] + transmission_time_ms
+
+    return {
+        "suite": suites,
+        "transport": np.full(suites.size, "QUIC", dtype=object),
+        "rtt_ms": rtt,
+        "bandwidth_mbps": bandwidth,
+        "max_datagram_size": datagram_size,
+        "init_cwnd": init_cwnd,
+        "retry": retry,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "key_share_size": columns["key_share_size"],
+        "client_datagrams": client_datagrams,
+        "server_datagrams": server_datagrams,
+        "client_bytes": client_bytes,
+        "server_bytes": server_bytes,
+        "amplification_limit_bytes": amplification_limit,
+        "amplification_blocked": blocked_rtts > 0,
+        "blocked_rtts": blocked_rtts,
+        "required_rtts": required_rtts,
+        "cpu_time_ms": columns["cpu_time_ms"],
+        "transmission_time_ms": transmission_time_ms,
+        "total_latency_ms": total_latency_ms,
+        "amplification_factor": np.round(server_bytes / client_bytes, 1)
+    }
+
+def run_quic_simulation(suite, rtt_ms, bandwidth_mbps=100, cost_model=None, max_datagram_size=QUIC_MIN_DATAGRAM,
+                        init_cwnd=QUIC_INITIAL_CWND_DATAGRAMS, retry=False):
+    """
+    Single-scenario QUIC result as plain Python values (one row of the batch model).
+    """
+    result = run_quic_simulation_batch(np.array([suite], dtype=object), rtt_ms, bandwidth_mbps, cost_model,
+                                       max_datagram_size=max_datagram_size, init_cwnd=init_cwnd, retry=retry)
+    return {key: value[0].item() if hasattr(value[0], "item") else value[0] for key, value in result.items()}
+
+# --- TCP FLIGHT SIMULATOR ---
+
+TCP_INITIAL_CWND = 10      # Segments (RFC 6928)
+TCP_SYN_RTO_MS = 1000      # Initial RTO before any RTT sample (RFC 6298)
+TCP_MIN_RTO_MS = 200       # Linux lower bound for the RTO
+TCP_MAX_RTO_MS = 60000     # Upper bound for the backed-off RTO (RFC 6298 2.5)
+TCP_MAX_TIMEOUTS = 15      # Linux tcp_retries2: consecutive RTOs before the connection is dropped
+TCP_SYN_RETRIES = 6        # Linux tcp_syn_retries: the connection fails after that
+TCP_DUPACK_THRESHOLD = 3   # Duplicate ACKs that trigger fast retransmit
+TCP_MAX_ROUNDS = 64        # Safety bound on rounds per flight
+
+def mss_for_mtu(mtu, ipv6=False):
+    # IPv4 + TCP headers are 40 bytes, IPv6 + TCP 60 (no options)
+    return mtu - (60 if ipv6 else 40)
+
+def _simulate_flight(rng, segments, init_cwnd, loss_rate, rtt_ms, rto_ms):
+    """
+    Round-by-round delivery of a flight of `segments` for every row at once.
+    Each round sends min(cwnd, remaining) segments; every segment is lost
+    independently (one batched RNG draw per round). A loss followed by enough
+    delivered segments is repaired by fast retransmit (cwnd halves, +1 RTT);
+    otherwise the sender waits for the RTO (backed off up to TCP_MAX_RTO_MS,
+    cwnd = 1). A round without a timeout restores the RTO; TCP_MAX_TIMEOUTS
+    consecutive timeouts drop the connection (the flight never completes).
+    Returns (time_ms, retransmissions, timeouts, completed).
+    """
+    n = segments.size
+    remaining = segments.astype(np.int64)
+    cwnd = init_cwnd.astype(np.int64)
+    ssthresh = np.full(n, np.iinfo(np.int64).max)
+    rto = rto_ms.astype(np.float64)
+    time_ms = np.zeros(n)
+    retransmissions = np.zeros(n, dtype=np.int64)
+    timeouts = np.zeros(n, dtype=np.int64)
+    consecutive = np.zeros(n, dtype=np.int64)
+    active = remaining > 0
+    gave_up = np.zeros(n, dtype=bool)
+    lossy = bool(np.any(loss_rate > 0))
+
+    for _ in range(TCP_MAX_ROUNDS):
+        rows = np.flatnonzero(active)
+        if rows.size == 0:
+            break
+        send = np.minimum(cwnd[rows], remaining[rows])
+        if lossy:
+            width = int(send.max())
+            lost = (rng.random((rows.size, width)) < loss_rate[rows, None]) & (np.arange(width) < send[:, None])
+            n_lost = lost.sum(axis=1)
+            first_loss = np.where(n_lost > 0, lost.argmax(axis=1), width)
+        else:
+            n_lost = np.zeros(rows.size, dtype=np.int64)
+            first_loss = send
+        delivered = send - n_lost
+        # Segments delivered after the first hole each produce a duplicate ACK
+        dupacks = send - first_loss - n_lost
+        clean = n_lost == 0
+        fast = ~clean & (dupacks >= TCP_DUPACK_THRESHOLD)
+        timeout = ~clean & ~fast
+
+        remaining[rows] -= delivered
+        retransmissions[rows] += n_lost
+        timeouts[rows] += timeout
+        time_ms[rows] += np.where(timeout, rto[rows], rtt_ms[rows])
+
+        current = cwnd[rows]
+        grown = np.where(current < ssthresh[rows], current + delivered, current + 1) # Slow start / avoidance
+        halved = np.maximum(current // 2, 2)
+        ssthresh[rows] = np.where(clean, ssthresh[rows], halved)
+        cwnd[rows] = np.where(clean, grown, np.where(fast, halved, 1))
+        rto[rows] = np.where(timeout, np.minimum(rto[rows] * 2, TCP_MAX_RTO_MS), rto_ms[rows])
+        consecutive[rows] = np.where(timeout, consecutive[rows] + 1, 0)
+        gave_up[rows] = consecutive[rows] >= TCP_MAX_TIMEOUTS
+        active[rows] = (remaining[rows] > 0) & ~gave_up[rows]
+
+    return time_ms, retransmissions, timeouts, ~active & ~gave_up
+
+def simulate_tcp_handshake(client_segments, server_segments, rtt_ms, loss_rate=0.0,
+                           init_cwnd=TCP_INITIAL_CWND, rto_min_ms=TCP_MIN_RTO_MS, rng=None):
+    """
+    Network time of TCP connect + TLS 1.3 handshake flights (arrays, broadcast).
+    SYN/SYN-ACK losses back off from TCP_SYN_RTO_MS; the ClientHello and server
+    flights go through _simulate_flight with RTO = max(rto_min, 3 * RTT) (RFC
+    6298 after one RTT sample). Without loss this is 1 RTT + 1 RTT per slow-start
+    round of the server flight: the flat "+1 RTT over IW10" of
+    run_network_simulation up to 3 * init_cwnd segments, and one more RTT per
+    further doubling (the flat rule never adds more than one). A loss rate of
+    1 is a certain failure.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    client_segments, server_segments, rtt_ms, loss_rate, init_cwnd = (
+        a.ravel() for a in np.broadcast_arrays(
+            np.asarray(client_segments, dtype=np.int64), np.asarray(server_segments, dtype=np.int64),
+            np.asarray(rtt_ms, dtype=np.float64), np.asarray(loss_rate, dtype=np.float64),
+            np.asarray(init_cwnd, dtype=np.int64)
+        )
+    )
+    if np.any((loss_rate < 0) | (loss_rate > 1)):
+        raise ValueError("loss_rate must be within [0, 1]")
+    # TCP 3-way handshake: SYN and SYN-ACK must both get through
+    syn_success = (1 - loss_rate) ** 2
+    syn_failures = np.where(
+        syn_success > 0,
+        rng.geometric(np.where(syn_success > 0, syn_success, 1.0)) - 1,
+        TCP_SYN_RETRIES + 1 # Nothing ever gets through: every retry is exhausted
+    )
+    syn_failed = syn_failures > TCP_SYN_RETRIES
+    syn_failures = np.minimum(syn_failures, TCP_SYN_RETRIES)
+    connect_ms = rtt_ms + TCP_SYN_RTO_MS * (2.0 ** syn_failures - 1)
+
+    rto_ms = np.maximum(rto_min_ms, 3 * rtt_ms)
+    client_ms, client_retx, client_timeouts, client_done = _simulate_flight(
+        rng, client_segments, init_cwnd, loss_rate, rtt_ms, rto_ms)
+    server_ms, server_retx, server_timeouts, server_done = _simulate_flight(
+        rng, server_segments, init_cwnd, loss_rate, rtt_ms, rto_ms)
+
+    # ClientHello (last window) up + first server window down share one RTT
+    tls_ms = client_ms + server_ms - rtt_ms
+    return {
+        "connect_ms": connect_ms,
+        "tls_ms": tls_ms,
+        "network_ms": connect_ms + tls_ms,
+        "syn_retries": syn_failures,
+        "retransmissions": client_retx + server_retx,
+        "timeouts": client_timeouts + server_timeouts,
+        "failed": syn_failed | ~client_done | ~server_done
+    }
+
+def run_tcp_simulation_batch(suites, rtt_ms=None, loss_rate=0.0, bandwidth_mbps=100, init_cwnd=TCP_INITIAL_CWND,
+                             mss=MAX_MSS, cost_model=None, rto_min_ms=TCP_MIN_RTO_MS, deadline_ms=None,
+                             rng=None, seed=None):
+    """
+    run_network_simulation_batch with the TCP flight simulator instead of the
+    flat IW10 rule: per-row loss rate, initial window and MSS (all broadcast,
+    or DataFrame columns of the same names). A handshake counts as failed if
+    TCP gives up, or if it takes longer than `deadline_ms` when one is given;
+    failed rows have no latency (NaN).
+    """
+    if hasattr(suites, "columns"): # DataFrame input
+        frame = suites
+        suites = frame["suite"].to_numpy()
+        rtt_ms = frame["rtt_ms"].to_numpy()
+        loss_rate = frame["loss_rate"].to_numpy() if "loss_rate" in frame.columns else loss_rate
+        bandwidth_mbps = frame["bandwidth_mbps"].to_numpy() if "bandwidth_mbps" in frame.columns else bandwidth_mbps
+        init_cwnd = frame["init_cwnd"].to_numpy() if "init_cwnd" in frame.columns else init_cwnd
+        mss = frame["mss"].to_numpy() if "mss" in frame.columns else mss
+    elif rtt_ms is None:
+        raise ValueError("rtt_ms is required unless suites is a DataFrame with an 'rtt_ms' column")
+
+    suites, rtt_ms, loss_rate, bandwidth_mbps, init_cwnd, mss = (
+        a.ravel() for a in np.broadcast_arrays(
+            np.asarray(suites, dtype=object), np.asarray(rtt_ms, dtype=np.float64),
+            np.asarray(loss_rate, dtype=np.float64), np.asarray(bandwidth_mbps, dtype=np.float64),
+            np.asarray(init_cwnd, dtype=np.int64), np.asarray(mss, dtype=np.int64)
+        )
+    )
+    columns = _suite_columns(suites, cost_model)
+    client_payload = columns["client_payload_size"]
+    server_payload = columns["server_payload_size"]
+    # Segment counts depend on the MSS of each row, not the profile's fixed 1460
+    client_segments = -(-client_payload // mss)
+    server_segments = -(-server_payload // mss)
+
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    network = simulate_tcp_handshake(client_segments, server_segments, rtt_ms, loss_rate, init_cwnd, rto_min_ms, rng)
+
+    total_bytes = client_payload + server_payload
+    transmission_time_ms = (total_bytes * 8) / (bandwidth_mbps * 1_000_000) * 1000
+    total_latency_ms = network["network_ms"] + columns["cpu_time_ms"] + transmission_time_ms
+    failed = network["failed"]
+    if deadline_ms is not None:
+        failed = failed | (total_latency_ms > deadline_ms)
+    total_latency_ms = np.where(failed, np.nan, total_latency_ms)
+
+    return {
+        "suite": suites,
+        "rtt_ms": rtt_ms,
+        "loss_rate": loss_rate,
+        "init_cwnd": init_cwnd,
+        "mss": mss,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "client_segments": client_segments,
+        "server_segments": server_segments,
+        "syn_retries": network["syn_retries"],
+        "retransmissions": network["retransmissions"],
+        "timeouts": network["timeouts"],
+        "cpu_time_ms": columns["cpu_time_ms"],
+        "transmission_time_ms": transmission_time_ms,
+        "total_latency_ms": total_latency_ms,
+        "failed": failed
+    }
+
+def summarize_tcp_simulation(result):
+    """
+    Per-suite failure rate and latency quantiles of a run_tcp_simulation_batch result.
+    """
+    summary = {}
+    for suite in set(result["suite"].tolist()):
+        mask = result["suite"] == suite
+        histogram = LatencyHistogram()
+        histogram.add(result["total_latency_ms"][mask & ~result["failed"]])
+        summary[suite] = dict(
+            histogram.to_dict(),
+            samples=int(mask.sum()),
+            failure_rate=float(result["failed"][mask].mean()),
+            timeout_rate=float((result["timeouts"][mask] > 0).mean()),
+            mean_retransmissions=float(result["retransmissions"][mask].mean())
+        )
+    return summary
+
+# --- SESSION RESUMPTION ---
+
+HANDSHAKE_FULL = "full"
+HANDSHAKE_RESUMED = "resumed"   # PSK, 1-RTT
+HANDSHAKE_EARLY_DATA = "0rtt"   # PSK with early data: the request leaves with the ClientHello
+PSK_DHE_KE = "psk_dhe_ke"       # Resumption with a fresh key exchange (what browsers offer)
+PSK_KE = "psk_ke"               # PSK only: no key shares, no forward secrecy
+
+TICKET_STATE_BYTES = 130        # Encrypted session state: resumption secret, cipher, ALPN, SNI, lifetimes
+TICKET_WRAP_BYTES = 64          # Key name + IV + HMAC around the state (stateless tickets)
+NEW_SESSION_TICKET_OVERHEAD = 33
+PSK_EXTENSION_OVERHEAD = 51     # pre_shared_key (identity, age, SHA-256 binder) + psk_key_exchange_modes
+TICKETS_PER_FULL_HANDSHAKE = 2  # OpenSSL default for TLS 1.3
+TICKETS_PER_RESUMPTION = 1
+
+def build_resumption_profile(suite, psk_mode=PSK_DHE_KE, ticket_embeds_cert=False):
+    """
+    Byte sizes of a resumed handshake for a registered suite. There is no
+    Certificate or CertificateVerify; with psk_dhe_ke the KEM key shares are
+    still exchanged. `ticket_embeds_cert` models servers that keep the peer's
+    leaf certificate in the ticket state (stateless tickets with client auth).
+    """
+    spec = algorithms.SUITES.get(suite, algorithms.SUITES[CryptoSuite.PURE])
+    dhe = psk_mode == PSK_DHE_KE
+    leaf_cert_size = spec.signature.pk + spec.signature.sig + algorithms.CERT_OVERHEAD
+    ticket_size = TICKET_WRAP_BYTES + TICKET_STATE_BYTES + (leaf_cert_size if ticket_embeds_cert else 0)
+
+    client_payload = 200 + PSK_EXTENSION_OVERHEAD + ticket_size + (spec.kem.pk if dhe else 0)
+    server_payload = 256 + (spec.kem.ct if dhe else 0)
+    return MappingProxyType({
+        "psk_mode": psk_mode,
+        "ticket_size": ticket_size,
+        "new_session_ticket_size": NEW_SESSION_TICKET_OVERHEAD + ticket_size,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "client_segments": math.ceil(client_payload / MAX_MSS),
+        "server_segments": math.ceil(server_payload / MAX_MSS),
+        "exceeds_iw10": server_payload > IW10_LIMIT
+    })
+
+_RESUMPTION_PROFILES = {}
+
+def get_resumption_profile(suite, psk_mode=PSK_DHE_KE, ticket_embeds_cert=False):
+    key = (suite, psk_mode, ticket_embeds_cert)
+    profile = _RESUMPTION_PROFILES.get(key)
+    if profile is None:
+        profile = _RESUMPTION_PROFILES[key] = build_resumption_profile(suite, psk_mode, ticket_embeds_cert)
+    return profile
+
+def _resumption_columns(flat_suites, psk_mode, ticket_embeds_cert, cost_model=None):
+    """
+    _suite_columns for resumed handshakes: no signature verification, and no
+    public-key operations at all in psk_ke mode.
+    """
+    n = flat_suites.size
+    columns = {
+        key: np.empty(n, dtype=np.int64)
+        for key in ("client_payload_size", "server_payload_size", "new_session_ticket_size")
+    }
+    columns["cpu_time_ms"] = np.zeros(n, dtype=np.float64)
+    for suite in set(flat_suites.tolist()):
+        mask = flat_suites == suite
+        profile = get_resumption_profile(suite, psk_mode, ticket_embeds_cert)
+        for key in ("client_payload_size", "server_payload_size", "new_session_ticket_size"):
+            columns[key][mask] = profile[key]
+        if psk_mode != PSK_DHE_KE:
+            continue
+        if cost_model is not None:
+            count = int(mask.sum())
+            columns["cpu_time_ms"][mask] = sum(cost_model.sample(suite, op, size=count) for op in ("keygen", "encaps"))
+        else:
+            complexity = suite_complexity(suite)
+            columns["cpu_time_ms"][mask] = compute_workload(complexity["keygen"]) + compute_workload(complexity["encaps"])
+    return columns
+
+def run_resumption_simulation_batch(suites, kinds=HANDSHAKE_RESUMED, rtt_ms=None, bandwidth_mbps=100, cost_model=None,
+                                    psk_mode=PSK_DHE_KE, ticket_embeds_cert=False):
+    """
+    Per-connection latency, CPU and bytes for a mix of full, resumed and 0-RTT
+    handshakes over TCP (`kinds` is broadcast like suites and RTTs). Latency is
+    the time until the client's request leaves: 1 RTT of TCP, plus the TLS
+    round trips (none with early data). Bytes include the NewSessionTickets
+    the server issues on every handshake. Also accepts a DataFrame with
+    'suite', 'rtt_ms' and optionally 'kind' and 'bandwidth_mbps' columns.
+    """
+    if hasattr(suites, "columns"): # DataFrame input
+        frame = suites
+        suites = frame["suite"].to_numpy()
+        rtt_ms = frame["rtt_ms"].to_numpy()
+        kinds = frame["kind"].to_numpy() if "kind" in frame.columns else kinds
+        bandwidth_mbps = frame["bandwidth_mbps"].to_numpy() if "bandwidth_mbps" in frame.columns else bandwidth_mbps
+    elif rtt_ms is None:
+        raise ValueError("rtt_ms is required unless suites is a DataFrame with an 'rtt_ms' column")
+
+    suites, kinds, rtt, bandwidth = (
+        a.ravel() for a in np.broadcast_arrays(
+            np.asarray(suites, dtype=object), np.asarray(kinds, dtype=object),
+            np.asarray(rtt_ms, dtype=np.float64), np.asarray(bandwidth_mbps, dtype=np.float64)
+        )
+    )
+    full = kinds == HANDSHAKE_FULL
+    early_data = kinds == HANDSHAKE_EARLY_DATA
+    full_columns = _suite_columns(suites[full], cost_model)
+    columns = _resumption_columns(suites, psk_mode, ticket_embeds_cert, cost_model)
+    client_payload = columns["client_payload_size"]
+    server_payload = columns["server_payload_size"]
+    cpu_time_ms = columns["cpu_time_ms"]
+    for key in ("client_payload_size", "server_payload_size", "cpu_time_ms"):
+        columns[key][full] = full_columns[key]
+    ticket_bytes = columns["new_session_ticket_size"] * np.where(full, TICKETS_PER_FULL_HANDSHAKE, TICKETS_PER_RESUMPTION)
+
+    tls_rtts = np.where(early_data, 0, 1 + (server_payload > IW10_LIMIT))
+    required_rtts = 1 + tls_rtts # TCP handshake + TLS
+    total_bytes = client_payload + server_payload + ticket_bytes
+    transmission_time_ms = ((client_payload + server_payload) * 8) / (bandwidth * 1_000_000) * 1000
+    total_latency_ms = required_rtts * rtt + cpu_time_ms + transmission_time_ms
+
+    return {
+        "suite": suites,
+        "kind": kinds,
+        "rtt_ms": rtt,
+        "client_payload_size": client_payload,
+        "server_payload_size": server_payload,
+        "ticket_bytes": ticket_bytes,
+        "total_bytes": total_bytes,
+        "required_rtts": required_rtts,
+        "cpu_time_ms": cpu_time_ms,
+        "transmission_time_ms": transmission_time_ms,
+        "total_latency_ms": total_latency_ms
     }
+
+def simulate_connection_mix(suites, connections, resumption_rate=0.0, early_data_rate=0.0, rtt_range=(20, 40),
+                            bandwidth_mbps=100, cost_model=None, psk_mode=PSK_DHE_KE, ticket_embeds_cert=False, seed=None):
+    """
+    Workload-level view of a connection mix: `resumption_rate` of the
+    connections resume a session, and `early_data_rate` of those send 0-RTT
+    data. Returns, per suite, the mix actually drawn, aggregate and
+    per-connection CPU and bytes, the resulting handshakes/s per core and
+    latency quantiles over all connections.
+    """
+    rng = np.random.default_rng(seed)
+    summary = {}
+    for suite in suites:
+        draw = rng.random(connections)
+        kinds = np.where(
+            draw >= resumption_rate, HANDSHAKE_FULL,
+            np.where(draw < resumption_rate * early_data_rate, HANDSHAKE_EARLY_DATA, HANDSHAKE_RESUMED)
+        ).astype(object)
+        rtt = rng.uniform(rtt_range[0], rtt_range[1], connections)
+        result = run_resumption_simulation_batch(
+            np.full(connections, suite, dtype=object), kinds, rtt, bandwidth_mbps, cost_model, psk_mode, ticket_embeds_cert
+        )
+        histogram = LatencyHistogram()
+        histogram.add(result["total_latency_ms"])
+        cpu_ms = float(result["cpu_time_ms"].sum())
+        summary[suite] = dict(
+            histogram.to_dict(),
+            connections=connections,
+            **{kind: int((kinds == kind).sum()) for kind in (HANDSHAKE_FULL, HANDSHAKE_RESUMED, HANDSHAKE_EARLY_DATA)},
+            cpu_ms_total=cpu_ms,
+            cpu_ms_per_connection=cpu_ms / connections,
+            hs_per_s_per_core=connections * 1000 / cpu_ms if cpu_ms > 0 else None,
+            bytes_total=int(result["total_bytes"].sum()),
+            bytes_per_connection=float(result["total_bytes"].mean()),
+            mean_latency_ms=float(result["total_latency_ms"].mean())
+        )
+    return summary
+
+# --- MONTE CARLO ENGINE ---
+
+class LatencyHistogram:
+    """
+    Mergeable log-bucket histogram (~1% relative error) for streaming quantiles.
+    Keeps only bucket counts, so millions of samples aggregate in constant memory.
+    """
+    BUCKETS_PER_DECADE = 100
+    MIN_VALUE = 0.01 # ms
+    MAX_VALUE = 1e6  # ms
+    EDGES = np.logspace(
+        math.log10(MIN_VALUE), math.log10(MAX_VALUE),
+        int(round(math.log10(MAX_VALUE / MIN_VALUE))) * BUCKETS_PER_DECADE + 1
+    )
+
+    def __init__(self):
+        # Bucket 0 = underflow (< MIN_VALUE), last bucket = overflow (>= MAX_VALUE)
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        buckets = np.searchsorted(self.EDGES, values, side="right")
+        self.counts += np.bincount(buckets, minlength=self.counts.size)
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        if bucket == 0:
+            return self.min
+        if bucket >= len(self.EDGES):
+            return self.max
+        # Geometric midpoint of the bucket, clamped to the observed range
+        value = math.sqrt(self.EDGES[bucket - 1] * self.EDGES[bucket])
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self, quantiles=(0.5, 0.9, 0.99, 0.999)):
+        occupied = np.nonzero(self.counts)[0]
+        edges = np.concatenate(([0.0], self.EDGES, [math.inf]))
+        return {
+            "count": self.count,
+            "mean_ms": self.mean,
+            "min_ms": self.min if self.count else 0.0,
+            "max_ms": self.max if self.count else 0.0,
+            "quantiles": {f"p{q * 100:g}": self.quantile(q) for q in quantiles},
+            "histogram": {
+                "lower_ms": edges[occupied].tolist(),
+                "upper_ms": edges[occupied + 1].tolist(),
+                "counts": self.counts[occupied].tolist()
+            }
+        }
+
+def _monte_carlo_chunk(suite, n, rtt_range, bandwidth_mbps, cost_model, seed_seq):
+    # Each chunk owns an RNG derived from the run seed: results do not depend
+    # on how chunks are scheduled across workers.
+    # The cost model is shared (threads, or the caller's object): never store the RNG on it.
+    rng = np.random.default_rng(seed_seq)
+    rtt = rng.uniform(rtt_range[0], rtt_range[1], n)
+    result = run_network_simulation_batch(suite, rtt, bandwidth_mbps, cost_model=cost_model, rng=rng)
+    histogram = LatencyHistogram()
+    histogram.add(result["total_latency_ms"])
+    return suite, histogram
+
+def iter_monte_carlo(suites, n, rtt_range=(20, 40), bandwidth_mbps=100, cost_model=None,
+                     seed=None, workers=None, chunk_size=100_000, executor=None):
+    """
+    Runs `n` simulated handshakes per suite on a process pool and yields
+    (completed_samples, {suite: LatencyHistogram}) as chunks finish, so callers
+    can report partial distributions while the run is still in progress.
+    """
+    if cost_model is None:
+        cost_model = CostModel.load_or_calibrate()
+    suites = list(suites)
+    tasks = []
+    for suite in suites:
+        for start in range(0, n, chunk_size):
+            tasks.append((suite, min(chunk_size, n - start)))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    histograms = {suite: LatencyHistogram() for suite in suites}
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [
+            executor.submit(_monte_carlo_chunk, suite, size, rtt_range, bandwidth_mbps, cost_model, seed_seq)
+            for (suite, size), seed_seq in zip(tasks, seeds)
+        ]
+        completed = 0
+        for future in as_completed(futures):
+            suite, histogram = future.result()
+            histograms[suite].merge(histogram)
+            completed += histogram.count
+            yield completed, histograms
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+def run_monte_carlo(suites, n, rtt_range=(20, 40), bandwidth_mbps=100, cost_model=None,
+                    seed=None, workers=None, chunk_size=100_000, executor=None):
+    """
+    Monte Carlo mode: aggregated latency distribution (quantiles + histogram)
+    of `n` handshakes per suite, with RTT drawn uniformly from `rtt_range`.
+    """
+    suites = list(suites)  # Consumed twice: a generator would leave nothing for iter_monte_carlo
+    histograms = {suite: LatencyHistogram() for suite in suites}
+    for _, histograms in iter_monte_carlo(suites, n, rtt_range, bandwidth_mbps, cost_model,
+                                          seed, workers, chunk_size, executor):
+        pass
+    return {suite: histogram.to_dict() for suite, histogram in histograms.items()}
@@ -0,0 +1,125 @@
+import asyncio
+import os
+
+# Agente de sondeo persistente dentro de pqc_client (ver scripts/probe_agent.sh)
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "probe_agent.sh")
+AGENT_CONTAINER = "pqc_client"
+AGENT_TARGET = "pqc_server:4433"
+AGENT_START_TIMEOUT = 10
+
+class ProbeAgent:
+    """
+    Un `docker exec -i` de larga duración que ejecuta el agente de sondeo y
+    recibe lotes "handshake con el grupo X, N veces" por su stdin.
+    """
+    def __init__(self, container=AGENT_CONTAINER, target=AGENT_TARGET, script_path=AGENT_SCRIPT):
+        self.container = container
+        self.target = target
+        self.script_path = script_path
+        self.proc = None
+
+    async def start(self):
+        with open(self.script_path, 'r') as f:
+            script = f.read()
+        self.proc = await asyncio.create_subprocess_exec(
+            "docker", "exec", "-i", self.container, "sh", "-c", script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        line = await asyncio.wait_for(self.proc.stdout.readline(), AGENT_START_TIMEOUT)
+        if line.strip() != b"READY":
+            await self.close()
+            raise RuntimeError(f"El agente de sondeo no arrancó en {self.container}")
+        return self
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    async def probe(self, group, count=1, timeout=None):
+        """
+        Ejecuta `count` handshakes con `group` (nombre técnico OpenSSL) y devuelve
+        una lista de dicts con la latencia medida dentro del contenedor.
+        """
+        if not self.alive:
+            raise RuntimeError("Agente de sondeo no disponible")
+        try:
+            return await self._run_batch(group, count, timeout)
+        except Exception:
+            # Un lote a medias deja líneas pendientes en el pipe: el agente ya no es fiable
+            self.proc.kill()
+            await self.proc.wait()
+            raise
+
+    async def _run_batch(self, group, count, timeout):
+        self.proc.stdin.write(f"PROBE {group} {count} {self.target}\n".encode())
+        await self.proc.stdin.drain()
+
+        results = []
+        while True:
+            line = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+            if not line:
+                raise RuntimeError("El agente de sondeo terminó inesperadamente")
+            fields = line.decode('utf-8', errors='ignore').split()
+            if fields[:1] == ["DONE"]:
+                return results
+            if fields[:1] == ["RESULT"] and len(fields) == 8:
+                _, name, index, returncode, elapsed_us, negotiated, ok, connected = fields
+                results.append({
+                    "group": name,
+                    "index": int(index),
+                    "returncode": int(returncode),
+                    "latency_ms": int(elapsed_us) / 1000,
+                    "negotiated": negotiated,
+                    "success": ok == "1",
+                    "connected": connected == "1"
+                })
+
+    async def close(self):
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.write(b"QUIT\n")
+            await self.proc.stdin.drain()
+            await asyncio.wait_for(self.proc.wait(), 2)
+        except Exception:
+            self.proc.kill()
+            await self.proc.wait()
+
+class ProbeAgentPool:
+    """
+    Varios agentes en paralelo: cada lote ocupa un agente libre, de modo que
+    la concurrencia la marca el tamaño del pool.
+    """
+    def __init__(self, size, **agent_kwargs):
+        self.size = size
+        self.agent_kwargs = agent_kwargs
+        self.agents = []
+        self.idle = None
+
+    async def start(self):
+        agents = [ProbeAgent(**self.agent_kwargs) for _ in range(self.size)]
+        started = await asyncio.gather(*(agent.start() for agent in agents), return_exceptions=True)
+        failures = [result for result in started if isinstance(result, Exception)]
+        if failures:
+            await asyncio.gather(*(agent.close() for agent in agents))
+            raise failures[0]
+        self.agents = agents
+        self.idle = asyncio.Queue()
+        for agent in self.agents:
+            self.idle.put_nowait(agent)
+        return self
+
+    async def probe(self, group, count=1, timeout=None):
+        agent = await self.idle.get()
+        try:
+            if not agent.alive:
+                await agent.start() # Relanzar un agente caído en un lote anterior
+            return await agent.probe(group, count, timeout)
+        finally:
+            self.idle.put_nowait(agent)
+
+    async def close(self):
+        await asyncio.gather(*(agent.close() for agent in self.agents))
+        self.agents = []
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+from collections import OrderedDict
+
+# Caché persistente de resultados de negociación: (objetivo, puerto, grupo,
+# build del cliente) -> soportado, grupo negociado, huella del servidor. Las
+# capacidades de un servidor cambian poco, así que una auditoría repetida se
+# salta los handshakes que ya conoce. Caducan por TTL y, por encima de
+# `max_entries`, se expulsan las menos usadas (LRU). Las sondas de latencia no
+# la consultan (medirían la caché), pero sí la refrescan.
+
+PROBE_CACHE_FILE = os.environ.get("PQC_PROBE_CACHE", "captures/probe_cache.json")
+DEFAULT_TTL_S = 24 * 3600
+DEFAULT_MAX_ENTRIES = 10_000
+CACHE_VERSION = 1
+
+_builds = {}
+
+def client_build(prefix=()):
+    """
+    Identificador del cliente que sondea (`openssl version`, opcionalmente vía
+    `docker exec ...`): un cambio de build de OQS invalida lo que se sabía.
+    """
+    prefix = tuple(prefix)
+    if prefix not in _builds:
+        try:
+            output = subprocess.run([*prefix, "openssl", "version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            output = ""
+        if not output.strip():
+            return "unknown" # Sin memorizar: con Docker caído se vuelve a intentar en la siguiente llamada
+        _builds[prefix] = output.strip()
+    return _builds[prefix]
+
+def server_fingerprint(output):
+    """
+    SHA-256 (16 hex) del certificado que muestra s_client, o del subject si no lo imprime.
+    """
+    match = re.search(r"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", output, re.S)
+    if match:
+        material = "".join(match.group(1).split())
+    else:
+        subject = re.search(r"^subject=(.+)$", output, re.M)
+        if not subject:
+            return None
+        material = subject.group(1).strip()
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+class ProbeCache:
+    """
+    Entradas en memoria en orden LRU; `save` fusiona con lo que haya en disco
+    (otro proceso puede haber escrito: gana la comprobación más reciente) y
+    publica con tmp + os.replace.
+    """
+    def __init__(self, path=PROBE_CACHE_FILE, ttl_s=DEFAULT_TTL_S, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.entries = OrderedDict(self._read())
+        self.hits = 0
+        self.misses = 0
+        self.dirty = 0
+
+    @staticmethod
+    def key(target, port, group, build):
+        return f"{target}|{port}|{group}|{build}"
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if data.get("version") != CACHE_VERSION:
+            return []
+        return [(entry["key"], entry) for entry in data.get("entries", [])]
+
+    def get(self, target, port, group, build):
+        """
+        Entrada vigente o None (ausente o caducada).
+        """
+        key = self.key(target, port, group, build)
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry["checked_at"] > self.ttl_s:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        entry["last_used"] = time.time()
+        self.hits += 1
+        self.dirty += 1 # El orden LRU también se persiste
+        return entry
+
+    def peek(self, target, port, group, build):
+        """
+        Entrada tal cual (aunque haya caducado), sin contar acierto ni tocar el orden LRU.
+        """
+        return self.entries.get(self.key(target, port, group, build))
+
+    def put(self, target, port, group, build, supported, negotiated=None, fingerprint=None, details=None):
+        key = self.key(target, port, group, build)
+        now = time.time()
+        self.entries[key] = {
+            "key": key, "target": target, "port": str(port), "group": group, "build": build,
+            "supported": supported, "negotiated": negotiated, "fingerprint": fingerprint,
+            "details": details, "checked_at": now, "last_used": now
+        }
+        self.entries.move_to_end(key)
+        self._evict()
+        self.dirty += 1
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.dirty:
+            return
+        for key, entry in self._read():
+            current = self.entries.get(key)
+            if current is None or entry["checked_at"] > current["checked_at"]:
+                self.entries[key] = entry
+        # Orden LRU global por último uso. Lo caducado no se borra aquí (otro
+        # lector puede usar un TTL más largo): acaba expulsado por LRU.
+        ordered = sorted(self.entries.values(), key=lambda entry: entry["last_used"])
+        self.entries = OrderedDict((entry["key"], entry) for entry in ordered)
+        self._evict()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": CACHE_VERSION, "entries": list(self.entries.values())}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = 0
@@ -0,0 +1,311 @@
+import argparse
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# Perfilado opcional (PQC_PROFILE o --profile) del controlador, el dashboard y
+# el motor. Cada captura (un ciclo del controlador, un rerun del dashboard)
+# combina tres fuentes:
+#   - cProfile: tiempo propio y acumulado por función (.pstats, para snakeviz)
+#   - un hilo que muestrea la pila del hilo perfilado cada PQC_PROFILE_INTERVAL_MS:
+#     pilas plegadas (.folded) para flamegraph.pl / speedscope / inferno
+#   - tracemalloc: asignaciones netas por línea durante la captura
+# y deja un resumen legible (.txt) con las funciones más caras. Todo va a
+# captures/profiles/; las capturas más antiguas se borran pasadas PROFILE_KEEP.
+# Los workers de ProcessPoolExecutor (Monte Carlo, barridos) no se ven desde aquí.
+
+PROFILE_DIR = "captures/profiles"
+PROFILE_MODE = os.environ.get("PQC_PROFILE", "").lower() # "", "cpu", "mem" o "all" (también "1")
+PROFILE_INTERVAL_MS = float(os.environ.get("PQC_PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.environ.get("PQC_PROFILE_KEEP", "50")) # Capturas que se conservan por nombre
+PROFILE_TOP = 15
+PROFILE_MODES = ("cpu", "mem", "all")
+
+def resolve_mode(flag=False):
+    """
+    Modo efectivo (None = desactivado). Un flag --profile sin modo activa el
+    perfilado con el modo de PQC_PROFILE, o completo si no lo fija. Un valor
+    desconocido avisa y desactiva: el perfilado nunca impide arrancar.
+    """
+    mode = (flag if isinstance(flag, str) else PROFILE_MODE).strip().lower()
+    if mode in ("", "0", "off", "false"):
+        mode = "all" if flag else None
+    elif mode in ("1", "on", "true"):
+        mode = "all"
+    elif mode not in PROFILE_MODES:
+        print(f"[!] Modo de perfilado desconocido: {mode} (usa {', '.join(PROFILE_MODES)}). Perfilado desactivado.")
+        mode = None
+    return mode
+
+def _frame_name(frame):
+    code = frame.f_code
+    # Sin espacios ni ';': son los separadores del formato plegado
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}".replace(";", ",").replace(" ", "_")
+
+class StackSampler:
+    """
+    Muestrea la pila de un hilo a intervalos fijos y cuenta pilas plegadas
+    ("raíz;...;hoja" -> muestras). Con un hilo ocupado en CPU el GIL limita la
+    frecuencia efectiva al intervalo de conmutación del intérprete (5 ms).
+    """
+    def __init__(self, thread_id, interval_s):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.stacks
+
+class Profiler:
+    """
+    Perfilador por capturas: `start()`/`stop()` (o `with profiler.capture():`)
+    alrededor de cada ciclo. Una captura que no llegó a `stop` (p.ej. un
+    st.rerun a mitad de script) se descarta al empezar la siguiente.
+
+    Se puede compartir entre hilos (las sesiones del dashboard): cProfile y
+    tracemalloc son de todo el proceso, así que hay una captura a la vez y un
+    `start` desde otro hilo mientras la captura en curso sigue viva se salta.
+    """
+    def __init__(self, name, mode="all", output_dir=PROFILE_DIR, interval_ms=PROFILE_INTERVAL_MS,
+                 keep=PROFILE_KEEP, top=PROFILE_TOP, log=print):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfilado desconocido: {mode} (usa {', '.join(PROFILE_MODES)})")
+        self.name = name
+        self.cpu = mode in ("cpu", "all")
+        self.memory = mode in ("mem", "all")
+        self.output_dir = output_dir
+        self.interval_s = interval_ms / 1000
+        self.keep = keep
+        self.top = top
+        self.log = log
+        self.sequence = self._last_sequence() # Una ejecución nueva no pisa capturas anteriores
+        self.total_stacks = Counter() # Pilas de toda la sesión: los ciclos cortos dan pocas muestras cada uno
+        self.skipped = 0 # Capturas saltadas por coincidir con la de otro hilo
+        self._lock = threading.Lock()
+        self._active = None
+
+    @classmethod
+    def from_env(cls, name, flag=False, **kwargs):
+        """
+        Perfilador si está activado por flag o PQC_PROFILE, None si no.
+        """
+        mode = resolve_mode(flag)
+        return cls(name, mode, **kwargs) if mode else None
+
+    def start(self, label="capture"):
+        """
+        Abre una captura en el hilo actual. False si otro hilo tiene una en curso.
+        """
+        with self._lock:
+            if self._active is not None:
+                owner = self._active[0]
+                if owner is not threading.current_thread() and owner.is_alive():
+                    self.skipped += 1
+                    return False
+                self._discard() # Del mismo hilo, o de un hilo que terminó sin llegar a stop
+            self._begin(label)
+        return True
+
+    def _begin(self, label):
+        profile = sampler = memory_start = None
+        # Orden: el hilo de muestreo antes de la foto de memoria (sus asignaciones
+        # no cuentan) y cProfile al final (no mide a tracemalloc)
+        if self.cpu:
+            sampler = StackSampler(threading.get_ident(), self.interval_s).start()
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            memory_start = tracemalloc.take_snapshot()
+        if self.cpu:
+            profile = cProfile.Profile()
+            profile.enable()
+        self._active = (threading.current_thread(), label, time.perf_counter(), profile, sampler, memory_start)
+
+    def _discard(self):
+        _, _, _, profile, sampler, _ = self._active
+        if profile is not None:
+            profile.disable()
+            sampler.stop()
+        self._active = None
+
+    def stop(self):
+        """
+        Cierra la captura del hilo actual, escribe sus ficheros y devuelve la
+        ruta del resumen (None si este hilo no tenía captura).
+        """
+        with self._lock:
+            if self._active is None or self._active[0] is not threading.current_thread():
+                return None
+            _, label, started, profile, sampler, memory_start = self._active
+            self._active = None
+            if profile is not None:
+                profile.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stacks = sampler.stop() if sampler is not None else Counter()
+            allocations = self._allocations(memory_start) if memory_start is not None else []
+            self.sequence += 1
+            sequence = self.sequence
+            self.total_stacks.update(stacks)
+            total_stacks = Counter(self.total_stacks)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.name}-{sequence:05d}")
+        stats = None
+        if profile is not None:
+            profile.dump_stats(base + ".pstats")
+            stats = pstats.Stats(profile)
+            self._write_folded(base + ".folded", stacks)
+            self._write_folded(os.path.join(self.output_dir, f"{self.name}-total.folded"), total_stacks)
+        header = (f"== {self.name} {label} #{sequence} ({datetime.now().isoformat(timespec='seconds')}): "
+                  f"{elapsed_ms:.1f} ms, {sum(stacks.values())} muestras de pila ==")
+        summary = summarize(stats, allocations, self.top)
+        with open(base + ".txt", 'w') as f:
+            f.write(header + "\n\n" + summary)
+        self._prune()
+        if self.log is not None:
+            if stats is not None:
+                hottest = ", ".join(f"{name} {tottime:.1f} ms" for name, _, tottime, _ in top_functions(stats, "tottime", 3))
+            else:
+                hottest = ", ".join(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno} "
+                                    f"{stat.size_diff / 1024:+.1f} KiB" for stat in allocations[:3])
+            self.log(f"[*] Perfil {label} #{sequence}: {elapsed_ms:.1f} ms | {hottest} -> {base}.txt")
+        return base + ".txt"
+
+    def capture(self, label="capture"):
+        return _Capture(self, label)
+
+    def _last_sequence(self):
+        sequences = [
+            int(os.path.basename(path)[len(self.name) + 1:-len(".txt")])
+            for path in glob.glob(os.path.join(self.output_dir, f"{self.name}-[0-9]*.txt"))
+        ]
+        return max(sequences, default=0)
+
+    def _allocations(self, memory_start):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        current = tracemalloc.take_snapshot().filter_traces(ignore)
+        differences = current.compare_to(memory_start.filter_traces(ignore), "lineno")
+        return [stat for stat in differences if stat.size_diff > 0][:self.top]
+
+    @staticmethod
+    def _write_folded(path, stacks):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, path)
+
+    def _prune(self):
+        captures = sorted(glob.glob(os.path.join(self.output_dir, f"{self.name}-[0-9]*.txt")))
+        for summary_path in captures[:-self.keep] if self.keep else []:
+            base = summary_path[:-len(".txt")]
+            for extension in (".txt", ".pstats", ".folded"):
+                try:
+                    os.remove(base + extension)
+                except FileNotFoundError:
+                    pass
+
+class _Capture:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+
+    def __enter__(self):
+        self.profiler.start(self.label)
+        return self.profiler
+
+    def __exit__(self, *exc_info):
+        self.profiler.stop()
+        return False
+
+def top_functions(stats, key="tottime", limit=PROFILE_TOP):
+    """
+    [(función, llamadas, tottime ms, cumtime ms)] ordenado por `key` ("tottime" o "cumtime").
+    """
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        name = f"{os.path.basename(filename)}:{line}({function})" if line else function
+        rows.append((name, calls, tottime * 1000, cumtime * 1000))
+    index = 2 if key == "tottime" else 3
+    return sorted(rows, key=lambda row: row[index], reverse=True)[:limit]
+
+def summarize(stats, allocations, limit=PROFILE_TOP):
+    """
+    Resumen en texto: funciones por tiempo propio y acumulado, y asignaciones netas por línea.
+    """
+    lines = []
+    if stats is not None:
+        for key, title in (("tottime", "Tiempo propio (tottime)"), ("cumtime", "Tiempo acumulado (cumtime)")):
+            lines.append(f"{title}:")
+            lines.append(f"{'llamadas':>10} {'propio ms':>10} {'acum. ms':>10}  función")
+            for name, calls, tottime, cumtime in top_functions(stats, key, limit):
+                lines.append(f"{calls:>10} {tottime:>10.2f} {cumtime:>10.2f}  {name}")
+            lines.append("")
+    if allocations:
+        lines.append("Asignaciones netas (tracemalloc):")
+        lines.append(f"{'KiB':>10} {'bloques':>8}  línea")
+        for stat in allocations:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:>+10.1f} {stat.count_diff:>+8}  {os.path.basename(frame.filename)}:{frame.lineno}")
+        lines.append("")
+    return "\n".join(lines)
+
+def profile_engine(suites, cpu_model, repeat, mode, output_dir):
+    """
+    Captura de referencia del motor físico: un handshake simulado por suite y
+    repetición con el modelo de CPU indicado (WORKLOAD ejecuta compute_workload).
+    """
+    import pqc_engine
+
+    cost_model = pqc_engine.CostModel.load_or_calibrate() if cpu_model == "COST" else None
+    profiler = Profiler("engine", mode, output_dir)
+    with profiler.capture(f"{cpu_model} x{repeat}"):
+        for _ in range(repeat):
+            for suite in suites:
+                pqc_engine.run_network_simulation(suite, 30, cost_model=cost_model)
+    return profiler
+
+def main(argv=None):
+    import algorithms
+
+    parser = argparse.ArgumentParser(description="Perfil de referencia del motor físico (ver PQC_PROFILE para el controlador y el dashboard)")
+    parser.add_argument("--suite", nargs="+", default=list(algorithms.SUITES))
+    parser.add_argument("--cpu-model", choices=["COST", "WORKLOAD"], default="WORKLOAD")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mode", choices=PROFILE_MODES, default="all")
+    parser.add_argument("--output-dir", default=PROFILE_DIR)
+    args = parser.parse_args(argv)
+
+    profile_engine(args.suite, args.cpu_model, args.repeat, args.mode, args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Almacén de resultados append-only: segmentos NDJSON inmutables
+RESULTS_DIR = "captures/results"
+SEGMENT_SUFFIX = ".ndjson"
+EPOCH_FILE = "EPOCH"
+LOCK_FILE = ".lock"       # Serializa a los escritores (controlador, pcap_ingest, reset del dashboard)
+COMPACT_THRESHOLD = 32    # Segmentos por debajo de MAX_SEGMENT_ROWS antes de compactar
+MAX_SEGMENT_ROWS = 50_000 # Tamaño máximo de un segmento compactado (rotación)
+
+class ResultsStore:
+    """
+    Cada append publica un segmento nuevo `<primer_seq>-<ultimo_seq>.ndjson`
+    escribiendo un temporal y renombrándolo (os.replace es atómico), así que
+    los lectores nunca ven ficheros a medias y el coste de escritura es
+    O(filas nuevas). La compactación fusiona segmentos pequeños consecutivos;
+    un segmento cuyo rango está contenido en otro se ignora al leer.
+    Los escritores de varios procesos se serializan con un lock de fichero:
+    sin él dos appends calcularían el mismo rango de seq y uno pisaría al otro.
+    """
+    def __init__(self, root=RESULTS_DIR):
+        self.root = root
+
+    # --- Escritura ---
+
+    def append(self, rows):
+        """
+        Añade filas (dicts) asignándoles un `seq` creciente. Devuelve el último seq.
+        """
+        if not rows:
+            return self.last_seq()
+        with self._locked():
+            first_seq = self.last_seq() + 1
+            rows = [dict(row, seq=first_seq + i) for i, row in enumerate(rows)]
+            last_seq = first_seq + len(rows) - 1
+            self._publish(rows, first_seq, last_seq)
+            # Solo cuentan los segmentos por llenar: los completos no se vuelven a
+            # fusionar y, si contaran, cada append reescribiría el último parcial
+            small = [s for s in self.segments() if s[1] - s[0] + 1 < MAX_SEGMENT_ROWS]
+            if len(small) > COMPACT_THRESHOLD:
+                self._compact()
+        return last_seq
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILE), 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _publish(self, rows, first_seq, last_seq):
+        tmp_path = os.path.join(self.root, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        with open(tmp_path, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":")))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.root, f"{first_seq:012d}-{last_seq:012d}{SEGMENT_SUFFIX}"))
+
+    def compact(self):
+        """
+        Fusiona segmentos pequeños consecutivos en segmentos de hasta MAX_SEGMENT_ROWS filas.
+        """
+        with self._locked():
+            self._compact()
+
+    def _compact(self):
+        epoch = self.epoch()
+        run = []
+        for segment in self.segments():
+            first_seq, last_seq, _ = segment
+            size = last_seq - first_seq + 1
+            run_size = (run[-1][1] - run[0][0] + 1) if run else 0
+            if size >= MAX_SEGMENT_ROWS or run_size + size > MAX_SEGMENT_ROWS:
+                self._merge(run, epoch)
+                run = []
+            if size < MAX_SEGMENT_ROWS:
+                run.append(segment)
+        self._merge(run, epoch)
+
+    def _merge(self, run, epoch):
+        if len(run) < 2:
+            return
+        rows = []
+        try:
+            for _, _, path in run:
+                rows.extend(self._read_segment(path))
+        except FileNotFoundError:
+            return # Un reset ha borrado el origen
+        # Un reset entre la lectura y la publicación resucitaría filas borradas
+        if self.epoch() != epoch:
+            return
+        # Publicar primero el segmento fusionado y después borrar los originales:
+        # en ningún momento desaparecen filas para un lector concurrente.
+        self._publish(rows, run[0][0], run[-1][1])
+        for _, _, path in run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def reset(self):
+        """
+        Borra todos los segmentos y cambia la época (los lectores incrementales se reinician).
+        """
+        with self._locked():
+            for first_seq, last_seq, path in self._list_segments():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            tmp_path = os.path.join(self.root, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+            with open(tmp_path, 'w') as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(tmp_path, os.path.join(self.root, EPOCH_FILE))
+
+    # --- Lectura ---
+
+    def epoch(self):
+        try:
+            with open(os.path.join(self.root, EPOCH_FILE), 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def _list_segments(self):
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                first_seq, last_seq = (int(part) for part in name[:-len(SEGMENT_SUFFIX)].split("-"))
+            except ValueError:
+                continue
+            segments.append((first_seq, last_seq, os.path.join(self.root, name)))
+        return segments
+
+    def segments(self):
+        """
+        Segmentos visibles ordenados por seq, descartando los que ya cubre una compactación.
+        """
+        visible = []
+        # Los más amplios primero: un rango contenido en otro ya visible se descarta
+        for segment in sorted(self._list_segments(), key=lambda s: (s[0], -s[1])):
+            if visible and segment[1] <= visible[-1][1]:
+                continue
+            visible.append(segment)
+        return visible
+
+    def last_seq(self):
+        segments = self._list_segments()
+        return max(last_seq for _, last_seq, _ in segments) if segments else 0
+
+    def _read_segment(self, path):
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def read_since(self, after_seq=0):
+        """
+        Filas con seq > after_seq. Devuelve (filas, último seq leído).
+        """
+        for _ in range(3):
+            rows = []
+            try:
+                for first_seq, last_seq, path in self.segments():
+                    if last_seq <= after_seq:
+                        continue
+                    rows.extend(row for row in self._read_segment(path) if row.get("seq", 0) > after_seq)
+            except FileNotFoundError:
+                continue # Compactación concurrente: volver a listar
+            return rows, (rows[-1]["seq"] if rows else after_seq)
+        return [], after_seq
+
+    def read_all(self):
+        return self.read_since(0)[0]
+
+class IncrementalReader:
+    """
+    Lector incremental: recuerda la época y el último seq leído, de modo que
+    cada consulta solo abre los segmentos nuevos y parsea las filas nuevas.
+    Un reset del almacén (época distinta o seq hacia atrás) reinicia el lector.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.epoch = None
+        self.last_seq = 0
+
+    def poll(self):
+        """
+        Devuelve (filas nuevas, reset). Si reset es True, las filas sustituyen
+        a todo lo leído antes en lugar de añadirse.
+        """
+        epoch = self.store.epoch()
+        reset = epoch != self.epoch or self.store.last_seq() < self.last_seq
+        if reset:
+            self.epoch = epoch
+            self.last_seq = 0
+        rows, self.last_seq = self.store.read_since(self.last_seq)
+        return rows, reset
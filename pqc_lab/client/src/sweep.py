@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import itertools
+import json
+import numbers
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import pqc_engine
+import algorithms
+
+# Barridos de escenarios del motor físico: una rejilla declarativa de parámetros
+# (suite, RTT, ancho de banda, MSS...) se expande en puntos, los que no están en
+# la caché se calculan en un pool de procesos y cada resultado se guarda en un
+# almacén en disco direccionado por contenido (hash de parámetros + versión del
+# motor + costes de CPU). Repetir o ampliar un barrido solo calcula lo que falta.
+
+SWEEP_CACHE_DIR = "captures/sweep_cache"
+SWEEP_FORMAT = 1
+POINTS_PER_TASK = 256 # Los puntos son baratos: se reparten por lotes para amortizar el IPC
+
+# Parámetros de cada modelo con sus valores por defecto. Un punto se completa
+# con ellos antes de calcular su clave, así que omitir un parámetro o darle su
+# valor por defecto comparte entrada de caché.
+MODELS = {
+    # run_network_simulation: IW10 determinista
+    "network": {"suite": None, "rtt_ms": None, "bandwidth_mbps": 100},
+    # Simulador TCP con pérdidas: `samples` handshakes por punto
+    "tcp": {"suite": None, "rtt_ms": None, "bandwidth_mbps": 100, "mss": pqc_engine.MAX_MSS,
+            "loss_rate": 0.0, "init_cwnd": pqc_engine.TCP_INITIAL_CWND, "deadline_ms": None, "samples": 1000},
+    # Modelo QUIC con límite de anti-amplificación
+    "quic": {"suite": None, "rtt_ms": None, "bandwidth_mbps": 100,
+             "max_datagram_size": pqc_engine.QUIC_MIN_DATAGRAM, "init_cwnd": pqc_engine.QUIC_INITIAL_CWND_DATAGRAMS,
+             "retry": False}
+}
+
+def _source_digest(*modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Versión del motor: cualquier cambio en el código del motor o en el registro de
+# algoritmos invalida la caché sin tener que acordarse de subir un número
+ENGINE_VERSION = _source_digest(pqc_engine, algorithms)
+
+def normalize_value(value):
+    """
+    Un solo tipo por valor numérico: 50, 50.0 y np.float64(50) son el mismo
+    punto (la rejilla JSON da enteros, --rtt da floats).
+    """
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return value
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def expand_grid(grid, model="network"):
+    """
+    Producto cartesiano de la rejilla {parámetro: valor o lista de valores},
+    completando cada punto con los valores por defecto del modelo y
+    normalizando los numéricos (normalize_value).
+    """
+    defaults = MODELS[model]
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos para el modelo {model}: {', '.join(sorted(unknown))}")
+    names = list(defaults)
+    axes = [grid.get(name, defaults[name]) for name in names]
+    axes = [list(axis) if isinstance(axis, (list, tuple)) else [axis] for axis in axes]
+    missing = [name for name, axis in zip(names, axes) if axis == [None] and defaults[name] is None and name != "deadline_ms"]
+    if missing:
+        raise ValueError(f"Faltan parámetros obligatorios: {', '.join(missing)}")
+    return [{name: normalize_value(value) for name, value in zip(names, values)} for values in itertools.product(*axes)]
+
+def point_key(model, point, cost_model):
+    """
+    Dirección del resultado: hash de modelo, parámetros, versión del motor y
+    costes de CPU de la suite (dependen del host en que se calibraron).
+    """
+    payload = {
+        "format": SWEEP_FORMAT,
+        "engine": ENGINE_VERSION,
+        "model": model,
+        "point": {name: normalize_value(value) for name, value in point.items()},
+        "costs": cost_model.costs.get(point["suite"]) if cost_model is not None else None
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class SweepCache:
+    """
+    Almacén direccionado por contenido: `<dir>/<2 primeros hex>/<hash>.json`.
+    Cada entrada se publica con tmp + os.replace, así que un barrido
+    interrumpido nunca deja entradas a medias y reescribir una es inocuo.
+    """
+    def __init__(self, root=SWEEP_CACHE_DIR):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'r') as f:
+                return json.load(f)["result"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, model, point, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({"engine": ENGINE_VERSION, "model": model, "point": point, "result": result}, f)
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        """
+        Todas las entradas de la versión actual del motor (para consultar sin recalcular).
+        """
+        if not os.path.isdir(self.root):
+            return
+        for shard in sorted(os.listdir(self.root)):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in sorted(os.listdir(shard_dir)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(shard_dir, name), 'r') as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if entry.get("engine") == ENGINE_VERSION:
+                    yield entry
+
+# --- Evaluación de puntos (en los procesos del pool) ---
+
+def _scalar(value):
+    return value.item() if hasattr(value, "item") else value
+
+def _evaluate(model, point, key, cost_model):
+    if model == "network":
+        result = pqc_engine.run_network_simulation(point["suite"], point["rtt_ms"], point["bandwidth_mbps"], cost_model=cost_model)
+        metrics = result.pop("metrics")
+        result.pop("suite")
+        result["cpu_time_ms"] = metrics["keygen_time_ms"] + metrics["encaps_time_ms"] + metrics["verify_time_ms"]
+        return {name: _scalar(value) for name, value in result.items()}
+    if model == "tcp":
+        # Semilla derivada de la clave: recalcular un punto da exactamente lo que hay en caché
+        result = pqc_engine.run_tcp_simulation_batch(
+            np.full(point["samples"], point["suite"], dtype=object), point["rtt_ms"], point["loss_rate"],
+            point["bandwidth_mbps"], point["init_cwnd"], point["mss"], cost_model,
+            deadline_ms=point["deadline_ms"], seed=int(key[:16], 16)
+        )
+        summary = pqc_engine.summarize_tcp_simulation(result)[point["suite"]]
+        return {
+            "client_segments": int(result["client_segments"][0]),
+            "server_segments": int(result["server_segments"][0]),
+            "failure_rate": summary["failure_rate"],
+            "timeout_rate": summary["timeout_rate"],
+            "mean_retransmissions": summary["mean_retransmissions"],
+            "mean_latency_ms": summary.get("mean_ms"),
+            "p50_ms": summary["quantiles"].get("p50"),
+            "p99_ms": summary["quantiles"].get("p99")
+        }
+    result = pqc_engine.run_quic_simulation(point["suite"], point["rtt_ms"], point["bandwidth_mbps"], cost_model,
+                                            max_datagram_size=point["max_datagram_size"], init_cwnd=point["init_cwnd"],
+                                            retry=point["retry"])
+    for name in ("suite", "rtt_ms", "bandwidth_mbps", "max_datagram_size", "init_cwnd", "retry"):
+        result.pop(name)
+    return result
+
+def _evaluate_chunk(model, tasks, cost_model):
+    return [(key, point, _evaluate(model, point, key, cost_model)) for key, point in tasks]
+
+def run_sweep(grid, model="network", cost_model=None, cache_dir=SWEEP_CACHE_DIR, workers=None,
+              refresh=False, progress=print):
+    """
+    Ejecuta la rejilla y devuelve un DataFrame (una fila por punto: parámetros +
+    resultados + `cached`). Solo se calculan los puntos ausentes de la caché.
+    """
+    if cost_model is None:
+        cost_model = pqc_engine.CostModel.load_or_calibrate()
+    cache = SweepCache(cache_dir)
+    points = expand_grid(grid, model)
+    rows = [None] * len(points)
+    index = {} # Clave -> posiciones: una rejilla puede repetir un punto (p.ej. --rtt 50 50)
+    pending = []
+    for i, point in enumerate(points):
+        key = point_key(model, point, cost_model)
+        if key in index:
+            index[key].append(i)
+            continue
+        index[key] = [i]
+        result = None if refresh else cache.get(key)
+        if result is None:
+            pending.append((key, point))
+        else:
+            rows[i] = dict(point, **result, cached=True)
+    for positions in index.values():
+        for i in positions[1:]:
+            rows[i] = rows[positions[0]]
+    progress(f"[*] Barrido {model}: {len(points)} puntos, {len(index) - len(pending)} en caché, {len(pending)} por calcular")
+
+    if pending:
+        start = time.perf_counter()
+        chunks = [pending[i:i + POINTS_PER_TASK] for i in range(0, len(pending), POINTS_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_evaluate_chunk, model, chunk, cost_model) for chunk in chunks]
+            done = 0
+            for future in as_completed(futures):
+                # Solo el proceso principal escribe en la caché
+                for key, point, result in future.result():
+                    cache.put(key, model, point, result)
+                    for i in index[key]:
+                        rows[i] = dict(point, **result, cached=False)
+                done += 1
+                if done % max(1, len(chunks) // 10) == 0 or done == len(chunks):
+                    elapsed = time.perf_counter() - start
+                    progress(f"   {done}/{len(chunks)} lotes | {sum(len(c) for c in chunks[:done]) / elapsed:,.0f} puntos/s")
+    return pd.DataFrame(rows)
+
+def load_cached(model=None, cache_dir=SWEEP_CACHE_DIR, **filters):
+    """
+    Resultados ya calculados (versión actual del motor) como DataFrame, sin
+    calcular nada: lo que consulta el dashboard. `filters` fija parámetros
+    (p.ej. suite="PURE") y admite listas de valores.
+    """
+    rows = []
+    for entry in SweepCache(cache_dir).entries():
+        if model is not None and entry["model"] != model:
+            continue
+        point = entry["point"]
+        if all(point.get(name) in (value if isinstance(value, (list, tuple)) else [value]) for name, value in filters.items()):
+            rows.append(dict(point, **entry["result"], model=entry["model"]))
+    return pd.DataFrame(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido de escenarios del motor físico con caché en disco")
+    parser.add_argument("--model", choices=sorted(MODELS), default="network")
+    parser.add_argument("--grid", help="Rejilla JSON {parámetro: [valores]} (los flags siguientes la completan)")
+    parser.add_argument("--suite", nargs="+", help="Suites del registro (por defecto, todas)")
+    parser.add_argument("--rtt", nargs="+", type=float, help="RTT en ms")
+    parser.add_argument("--bandwidth", nargs="+", type=float, help="Ancho de banda en Mbps")
+    parser.add_argument("--mss", nargs="+", type=int, help="MSS en bytes (modelo tcp)")
+    parser.add_argument("--loss", nargs="+", type=float, help="Tasa de pérdida (modelo tcp)")
+    parser.add_argument("--datagram", nargs="+", type=int, help="Tamaño máximo de datagrama (modelo quic)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=SWEEP_CACHE_DIR)
+    parser.add_argument("--refresh", action="store_true", help="Recalcular aunque el punto esté en caché")
+    parser.add_argument("--output", help="Guardar el resultado (.csv o .json)")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+    for name, values in [("suite", args.suite), ("rtt_ms", args.rtt), ("bandwidth_mbps", args.bandwidth),
+                         ("mss", args.mss), ("loss_rate", args.loss), ("max_datagram_size", args.datagram)]:
+        if values:
+            grid[name] = values
+    grid.setdefault("suite", list(algorithms.SUITES))
+
+    df = run_sweep(grid, args.model, cache_dir=args.cache_dir, workers=args.workers, refresh=args.refresh)
+    if args.output:
+        if args.output.endswith(".json"):
+            df.to_json(args.output, orient="records", indent=2)
+        else:
+            df.to_csv(args.output, index=False)
+        print(f"[OK] {len(df)} puntos guardados en {args.output}")
+    else:
+        print(df.to_string(max_rows=40))
+
+if __name__ == "__main__":
+    main()
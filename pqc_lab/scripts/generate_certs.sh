@@ -1,9 +1,21 @@
-import subprocess
+import argparse
+import asyncio
 import sys
 import re
 import json
+import os
+import time
 import datetime
 
+# Caché de negociación compartida con el controlador (client/src/probe_cache.py);
+# si el script se ejecuta suelto, sin el resto del repo, se escanea sin caché
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client", "src"))
+try:
+    from probe_cache import ProbeCache, DEFAULT_TTL_S, client_build, server_fingerprint
+except ImportError:
+    ProbeCache = None
+    DEFAULT_TTL_S = 24 * 3600
+
 # Host definido en docker-compose
 TARGET_HOST = "pqc_lab_server"
 TARGET_PORT = "443"
@@ -20,79 +32,280 @@ KEM_ALGORITHMS = [
     "bikel1"            # Otro PQC (Code-based)
 ]
 
-def check_kem_support(algo):
+# Escaneo de flota: sondas en paralelo con límites globales y por host
+REPORT_PATH = "/captures/scan_results.json"
+PROGRESS_PATH = "/captures/scan_results.ndjson" # Una línea por sonda: permite reanudar
+FINISHED_SUFFIX = ".done" # El progreso de un escaneo terminado se aparta aquí: no se reanuda
+CACHE_PATH = "/captures/probe_cache.json"
+PROBE_TIMEOUT = 5
+DEFAULT_CONCURRENCY = 64 # Sondas simultáneas en total
+DEFAULT_PER_HOST = 2     # Sondas simultáneas contra un mismo host
+DEFAULT_HOST_RATE = 10.0 # Handshakes/s máximos contra un mismo host
+
+def parse_scan_output(algo, stdout, stderr):
     """
-    Intenta conectar usando un grupo KEM específico mediante openssl s_client.
+    Interpreta la salida de s_client: (soportado, detalles, grupo negociado).
+    """
+    output = stdout.decode('utf-8', errors='ignore')
+    error_out = stderr.decode('utf-8', errors='ignore')
+
+    # Análisis de la salida
+    # Buscamos "Server Temp Key: <ALGO>" lo que indica negociación exitosa
+    match = re.search(r"Server Temp Key: ([\w_]+)", output)
+
+    if match:
+        negotiated = match.group(1)
+        # Verificamos si lo negociado coincide (o contiene) lo que pedimos
+        if algo.lower() in negotiated.lower() or negotiated.lower() in algo.lower():
+            return True, negotiated, negotiated
+        return False, f"Negociado otro: {negotiated}", negotiated
+
+    if "handshake failure" in error_out or "no shared cipher" in error_out:
+        return False, "Handshake Failure (No soportado por el servidor)", None
+
+    return False, "Conexión fallida (Sin datos de KEM en output)", None
+
+async def probe_kem(host, port, algo, timeout=PROBE_TIMEOUT):
+    """
+    Intenta conectar usando un grupo KEM específico mediante openssl s_client (sin bloquear el bucle).
     """
     cmd = [
         OPENSSL_BIN, "s_client",
-        "-connect", f"{TARGET_HOST}:{TARGET_PORT}",
+        "-connect", f"{host}:{port}",
         "-groups", algo,
         "-tls1_3"
     ]
-    
-    # Ejecutamos s_client y cerramos stdin inmediatamente para terminar la conexión tras el handshake
+    start = time.perf_counter()
     try:
-        result = subprocess.run(
-            cmd,
-            input=b"Q", # Enviamos 'Q' para cerrar la conexión limpiamente tras el handshake
-            capture_output=True,
-            timeout=5
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
         )
-        
-        output = result.stdout.decode('utf-8', errors='ignore')
-        error_out = result.stderr.decode('utf-8', errors='ignore')
-        
-        # Análisis de la salida
-        # Buscamos "Server Temp Key: <ALGO>" lo que indica negociación exitosa
-        match = re.search(r"Server Temp Key: ([\w_]+)", output)
-        
-        if match:
-            negotiated = match.group(1)
-            # Verificamos si lo negociado coincide (o contiene) lo que pedimos
-            if algo.lower() in negotiated.lower() or negotiated.lower() in algo.lower():
-                return True, negotiated
-            return False, f"Negociado otro: {negotiated}"
-        
-        if "handshake failure" in error_out or "no shared cipher" in error_out:
-            return False, "Handshake Failure (No soportado por el servidor)"
-            
-        return False, "Conexión fallida (Sin datos de KEM en output)"
-
-    except subprocess.TimeoutExpired:
-        return False, "Timeout (Servidor no responde)"
-    except Exception as e:
-        return False, str(e)
-
-def main():
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"--- Iniciando Escaneo PQC contra {TARGET_HOST}:{TARGET_PORT} [{timestamp}] ---")
-    print(f"{'Algoritmo (KEM)':<25} | {'Estado':<10} | {'Detalles'}")
-    print("-" * 65)
-    
-    results = {
-        "target": TARGET_HOST,
-        "timestamp": timestamp,
-        "scans": {}
+    except OSError as e:
+        return {"supported": False, "details": str(e), "negotiated": None, "fingerprint": None, "latency_ms": None}
+    try:
+        # Enviamos 'Q' para cerrar la conexión limpiamente tras el handshake
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input=b"Q"), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {"supported": False, "details": "Timeout (Servidor no responde)", "negotiated": None, "fingerprint": None, "latency_ms": None}
+    supported, details, negotiated = parse_scan_output(algo, stdout, stderr)
+    output = stdout.decode('utf-8', errors='ignore')
+    return {
+        "supported": supported,
+        "details": details,
+        "negotiated": negotiated,
+        "fingerprint": server_fingerprint(output) if ProbeCache is not None else None,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2)
     }
 
-    for algo in KEM_ALGORITHMS:
-        supported, details = check_kem_support(algo)
-        status = "✅ OK" if supported else "❌ FAIL"
-        print(f"{algo:<25} | {status:<10} | {details}")
-        results["scans"][algo] = {
-            "supported": supported,
-            "details": details
-        }
+def check_kem_support(algo, host=TARGET_HOST, port=TARGET_PORT):
+    """
+    Sonda aislada (síncrona) de un grupo contra un host.
+    """
+    result = asyncio.run(probe_kem(host, port, algo))
+    return result["supported"], result["details"]
+
+class HostLimiter:
+    """
+    Por host: como mucho `per_host` sondas a la vez y un arranque cada 1/`rate` s,
+    para no disparar protecciones anti-DoS ni falsear latencias del objetivo.
+    """
+    def __init__(self, per_host=DEFAULT_PER_HOST, rate=DEFAULT_HOST_RATE):
+        self.per_host = per_host
+        self.interval = 1.0 / rate if rate else 0.0
+        self.semaphores = {}
+        self.next_start = {}
+
+    async def acquire(self, host):
+        semaphore = self.semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        await semaphore.acquire()
+        now = time.monotonic()
+        start = max(now, self.next_start.get(host, now))
+        self.next_start[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def release(self, host):
+        self.semaphores[host].release()
+
+def parse_target(target):
+    host, _, port = target.strip().rpartition(":")
+    if not host or not port.isdigit():
+        return target.strip(), TARGET_PORT # Sin puerto explícito
+    return host.strip("[]"), port
+
+def load_targets(args):
+    targets = list(args.targets)
+    if args.targets_file:
+        with open(args.targets_file, 'r') as f:
+            targets.extend(line.split("#")[0].strip() for line in f)
+    targets = [parse_target(t) for t in targets if t and t.strip()]
+    return list(dict.fromkeys(targets)) or [(TARGET_HOST, TARGET_PORT)]
+
+def is_definitive(result):
+    """
+    Respuesta que dice algo de las capacidades del servidor: grupo negociado o
+    Handshake Failure. Un timeout o una conexión fallida se vuelven a sondear.
+    """
+    return bool(result.get("negotiated") or (result.get("details") or "").startswith("Handshake Failure"))
+
+def load_progress(path):
+    """
+    Sondas ya hechas en una ejecución anterior: {(host, puerto, grupo): resultado}
+    (la última fila de cada sonda, definitiva o no).
+    """
+    done = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue # Última línea truncada por la interrupción
+                done[(row["host"], row["port"], row["group"])] = row
+    except OSError:
+        pass
+    return done
+
+async def scan(targets, groups, progress_path, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST,
+               rate=DEFAULT_HOST_RATE, timeout=PROBE_TIMEOUT, restart=False, cache=None):
+    """
+    Escanea targets × grupos con un pool de `concurrency` trabajadores. Cada
+    resultado se añade en cuanto llega al fichero de progreso; al reanudar,
+    las sondas con respuesta definitiva en él no se repiten (timeouts y
+    conexiones fallidas sí). Con `cache`, los pares
+    objetivo/grupo con una respuesta vigente no se vuelven a sondear.
+    """
+    build = client_build() if cache is not None else None
+    if restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done = load_progress(progress_path)
+    # Orden grupo-mayor: trabajos consecutivos van a hosts distintos y el límite por host no frena al pool
+    jobs = [
+        (host, port, algo) for algo in groups for host, port in targets
+        if (host, port, algo) not in done or not is_definitive(done[(host, port, algo)])
+    ]
+    print(f"[*] {len(targets)} objetivos x {len(groups)} grupos: {len(targets) * len(groups) - len(jobs)} ya hechos, "
+          f"{len(jobs)} pendientes")
+
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    limiter = HostLimiter(per_host, rate)
+    os.makedirs(os.path.dirname(progress_path) or ".", exist_ok=True)
+    start = time.perf_counter()
+    completed = 0
+
+    with open(progress_path, 'a') as out:
+        async def worker():
+            nonlocal completed
+            while True:
+                try:
+                    host, port, algo = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                entry = cache.get(host, port, algo, build) if cache is not None else None
+                if entry is not None:
+                    result = {"supported": entry["supported"], "details": entry["details"], "negotiated": entry["negotiated"],
+                              "fingerprint": entry["fingerprint"], "latency_ms": None, "cached": True}
+                else:
+                    await limiter.acquire(host)
+                    try:
+                        result = await probe_kem(host, port, algo, timeout)
+                    finally:
+                        limiter.release(host)
+                    # Solo respuestas definitivas: un timeout no dice nada de las capacidades del servidor
+                    if cache is not None and is_definitive(result):
+                        cache.put(host, port, algo, build, result["supported"], result["negotiated"],
+                                  result["fingerprint"], result["details"])
+                        if cache.dirty >= 100:
+                            cache.save()
+                row = dict(host=host, port=port, group=algo, timestamp=datetime.datetime.now().isoformat(), **result)
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+                done[(host, port, algo)] = row
+                completed += 1
+                status = "✅ OK" if result["supported"] else "❌ FAIL"
+                cached = " (caché)" if result.get("cached") else ""
+                print(f"{host + ':' + port:<30} | {algo:<25} | {status:<10} | {result['details']}{cached}")
+                if completed % 100 == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"[*] {completed}/{len(jobs)} sondas | {completed / elapsed:.1f} sondas/s")
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, len(jobs)) or 1)))
+        finally:
+            if cache is not None:
+                cache.save()
+                print(f"[*] Caché {cache.path}: {cache.hits} aciertos, {cache.misses} fallos")
+    return done
+
+def build_report(targets, groups, done, timestamp):
+    report = {"timestamp": timestamp, "targets": {}}
+    for host, port in targets:
+        scans = {}
+        for algo in groups:
+            row = done.get((host, port, algo))
+            if row:
+                scans[algo] = {"supported": row["supported"], "details": row["details"], "negotiated": row.get("negotiated")}
+        report["targets"][f"{host}:{port}"] = scans
+    if len(targets) == 1:
+        # Formato original de un solo objetivo
+        report["target"] = targets[0][0]
+        report["scans"] = report["targets"][f"{targets[0][0]}:{targets[0][1]}"]
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escáner de soporte de KEM PQC (openssl s_client) sobre una flota de servidores")
+    parser.add_argument("targets", nargs="*", help=f"host[:puerto] (por defecto {TARGET_HOST}:{TARGET_PORT})")
+    parser.add_argument("--targets-file", help="Fichero con un host[:puerto] por línea")
+    parser.add_argument("--groups", nargs="+", default=KEM_ALGORITHMS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="Sondas simultáneas por host")
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE, help="Handshakes/s máximos por host (0 = sin límite)")
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT)
+    parser.add_argument("--progress", default=PROGRESS_PATH,
+                        help=f"Resultados incrementales (NDJSON) para reanudar un escaneo interrumpido "
+                             f"(al terminar se mueve a <progress>{FINISHED_SUFFIX})")
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Descartar el progreso anterior")
+    parser.add_argument("--cache", default=CACHE_PATH, help="Caché de negociación (objetivo, puerto, grupo, build)")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL_S, help="Validez de una entrada de la caché (s)")
+    parser.add_argument("--no-cache", action="store_true", help="Sondear siempre (p.ej. para medir latencias)")
+    args = parser.parse_args(argv)
+    cache = None if args.no_cache or ProbeCache is None else ProbeCache(args.cache, ttl_s=args.ttl)
+
+    targets = load_targets(args)
+    timestamp = datetime.datetime.now().isoformat()
+    print(f"--- Iniciando Escaneo PQC contra {len(targets)} objetivo(s) [{timestamp}] ---")
+    print(f"{'Objetivo':<30} | {'Algoritmo (KEM)':<25} | {'Estado':<10} | {'Detalles'}")
+    print("-" * 95)
+
+    try:
+        done = asyncio.run(scan(targets, args.groups, args.progress, args.concurrency, args.per_host,
+                                args.rate, args.timeout, args.restart, cache))
+    except KeyboardInterrupt:
+        print(f"\n[!] Escaneo interrumpido: el progreso está en {args.progress} (vuelve a ejecutar para reanudar)")
+        sys.exit(130)
 
     # Exportar resultados para el informe
-    report_path = "/captures/scan_results.json"
     try:
-        with open(report_path, "w") as f:
-            json.dump(results, f, indent=4)
-        print(f"\nResultados guardados en {report_path}")
+        tmp_path = args.output + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(build_report(targets, args.groups, done, timestamp), f, indent=4)
+        os.replace(tmp_path, args.output)
+        print(f"\nResultados guardados en {args.output}")
     except IOError as e:
         print(f"\nError guardando reporte: {e}")
+        return # El progreso se conserva: la siguiente ejecución rehace el informe sin repetir sondas
+
+    # Escaneo completo: solo se reanuda uno interrumpido. Una auditoría posterior
+    # vuelve a sondear todo (salvo lo vigente en la caché de negociación)
+    try:
+        os.replace(args.progress, args.progress + FINISHED_SUFFIX)
+    except OSError as e:
+        print(f"[!] No se pudo cerrar el progreso {args.progress}: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
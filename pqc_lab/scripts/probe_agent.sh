@@ -0,0 +1,58 @@
+#!/bin/sh
+# Agente de sondeo persistente para el contenedor pqc_client.
+# Se lanza una sola vez con `docker exec -i pqc_client sh -c "<este script>"`
+# y recibe órdenes por stdin, de modo que cada handshake no paga el coste
+# de arrancar un `docker exec` nuevo.
+#
+# Cada lote es UN solo proceso curl (OQS-OpenSSL) que repite el handshake en
+# proceso: una URL por repetición, `Connection: close` para que cada una abra
+# conexión nueva y --no-sessionid para que ninguna se reanude con un ticket.
+# La latencia la mide libcurl (time_appconnect - time_connect): solo el
+# handshake TLS, sin el arranque de procesos ni el connect TCP.
+#
+# Protocolo (una orden por línea):
+#   PROBE <grupo> <repeticiones> <host:puerto>
+#   QUIT
+# Respuestas:
+#   READY
+#   RESULT <grupo> <indice> <codigo_salida> <latencia_us> <grupo_negociado> <ok 0|1> <conectado 0|1>
+#   DONE <grupo>
+
+# Límites por handshake, por debajo del timeout de lectura del controlador
+# (PQC_PROBE_TIMEOUT, 8 s): un servidor colgado falla ese handshake y no el lote
+CONNECT_TIMEOUT_S=3
+MAX_TIME_S=5
+
+echo "READY"
+
+while read -r cmd group count target; do
+    case "$cmd" in
+        PROBE)
+            set --
+            i=0
+            while [ "$i" -lt "$count" ]; do
+                set -- "$@" -o /dev/null "https://$target/"
+                i=$((i + 1))
+            done
+
+            # Con un solo grupo ofrecido, un handshake completado lo ha negociado
+            # por fuerza. Sin time_connect (DNS, conexión rechazada o sin respuesta)
+            # no hay handshake que juzgar, sea cual sea el código de salida
+            curl -sk --tlsv1.3 --no-sessionid --curves "$group" -H "Connection: close" \
+                --connect-timeout "$CONNECT_TIMEOUT_S" --max-time "$MAX_TIME_S" \
+                -w '%{exitcode} %{time_connect} %{time_appconnect} %{time_total}\n' "$@" 2>/dev/null |
+            awk -v group="$group" '{
+                ok = ($1 == 0 && $3 > 0) ? 1 : 0
+                elapsed = ok ? $3 - $2 : $4 - $2
+                if (elapsed < 0) elapsed = 0
+                printf "RESULT %s %d %d %d %s %d %d\n", group, NR - 1, $1, elapsed * 1000000 + 0.5,
+                    ok ? group : "Failed", ok, ($2 > 0) ? 1 : 0
+                fflush()
+            }'
+            echo "DONE $group"
+            ;;
+        QUIT)
+            exit 0
+            ;;
+    esac
+done